@@ -2,28 +2,86 @@ from __future__ import annotations
 
 import os
 import json
-import requests
+import asyncio
+import mimetypes
+import threading
+from contextlib import aclosing, asynccontextmanager
 from pathlib import Path
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, List, Optional
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
 
+from portal_core import history_store, upload_stream
+from portal_core.blob_store import BlobStore, blob_ext
+from portal_core.burned_archive import BurnedArchive
+from portal_core.chat_idempotency import IdempotencyCache, IdempotencyConflict, payload_fingerprint
+from portal_core.derivatives import DerivativePipeline, is_image_ext
+from portal_core.director_client import DirectorBusy, DirectorClient, DirectorError
+from portal_core.health_prober import HealthProber
+from portal_core.history_cache import HistoryCache
+from portal_core.history_events import HistoryBroadcaster
+from portal_core.history_search import HistorySearchIndex
+from portal_core.history_writer import HistoryWriter
+from portal_core.nas_replicator import NasReplicator
+from portal_core.static_assets import IMMUTABLE, StaticAssets, file_response
+from portal_core.upload_sessions import (
+    UploadChecksumMismatch,
+    UploadOffsetMismatch,
+    UploadSessionBusy,
+    UploadSessionIncomplete,
+    UploadSessionNotFound,
+    UploadSessionStore,
+)
+
 
 # 부감독 뇌 서버 URL (8897)
 DIRECTOR_CORE_URL = os.getenv(
     "DIRECTOR_CORE_URL",
     "http://127.0.0.1:8897",  # 기본값: 라즈베리 로컬에서 director_server_v1
 )
-UPLOAD_ROOT = Path("/mnt/sowon_cloud/chat_uploads").resolve()
+# director 로 동시에 나가는 채팅 요청 수 (넘치면 대기, 오래 못 들어가면 503)
+DIRECTOR_MAX_CONCURRENCY = int(os.getenv("DIRECTOR_MAX_CONCURRENCY", "4"))
+_director = DirectorClient(DIRECTOR_CORE_URL, max_concurrency=DIRECTOR_MAX_CONCURRENCY)
+# /health 는 이 간격(초)으로 백그라운드에서 찍어 둔 스냅샷을 돌려준다.
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+# 같은 idempotency 키(Idempotency-Key 헤더 / client_message_id)의 채팅 요청을 합치고, 끝난 결과는 이 시간(초) 동안 replay
+CHAT_IDEMPOTENCY_TTL = float(os.getenv("CHAT_IDEMPOTENCY_TTL", "600"))
+_chat_idempotency = IdempotencyCache(ttl=CHAT_IDEMPOTENCY_TTL)
+
+# 업로드는 로컬 디스크(UPLOAD_LOCAL_ROOT)에 받고 바로 응답, NAS(UPLOAD_NAS_ROOT)로는 뒤에서 복제한다.
+# 읽을 때는 로컬 → NAS 순서 (복제 전 / 예전 업로드). NAS 는 import 때 건드리지 않는다.
+UPLOAD_ROOT = Path(os.getenv("UPLOAD_LOCAL_ROOT", "uploads")).resolve()
 UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+UPLOAD_NAS_ROOT = Path(os.getenv("UPLOAD_NAS_ROOT", "/mnt/sowon_cloud/chat_uploads"))
+_replicator = NasReplicator(UPLOAD_ROOT, UPLOAD_NAS_ROOT)
+# 받는 중인 업로드 임시 파일 자리 (UPLOAD_ROOT 와 같은 파일시스템이어야 rename 이 원자적)
+UPLOAD_STAGING_DIR = UPLOAD_ROOT / ".incoming"
+# 파일 하나당 최대 크기 (바이트, 기본 2GB). 넘으면 받는 도중 멈추고 413.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+# 실제 바이트는 UPLOAD_ROOT/blobs/<sha256 앞 2글자>/<sha256><확장자>, 프로필별 이름 → blob 목록은 <profile>/.manifest.jsonl
+_blob_store = BlobStore(UPLOAD_ROOT, fallback_roots=[UPLOAD_NAS_ROOT], replicator=_replicator)
+# 이어 올리기 세션 (.incoming/sessions/): 권장 PUT 조각 크기, 마지막으로 받은 지 이 시간(초) 지나면 정리
+UPLOAD_SESSION_CHUNK = int(os.getenv("UPLOAD_SESSION_CHUNK", str(8 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", str(7 * 24 * 3600)))
+_upload_sessions = UploadSessionStore(UPLOAD_STAGING_DIR, UPLOAD_MAX_BYTES, client_chunk=UPLOAD_SESSION_CHUNK)
+# 이미지 blob 의 썸네일 / 모델용 JPEG 은 UPLOAD_ROOT/derived/ 에 별도 프로세스가 만든다 (Pillow 없으면 원본으로 대신)
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "1"))
+_derivatives = DerivativePipeline(UPLOAD_ROOT, max_workers=THUMB_WORKERS)
+# portal/ 정적 파일: 지문 이름 + 미리 압축 + ETag (/static, /portal 같이)
+_static_assets = StaticAssets(Path("portal"), prefixes=("/static", "/portal"))
 
 
 class ChatMessage(BaseModel):
     role: str
     content: str
+    # 없으면 마지막 user 메시지에 client_message_id 를 붙여서 보낸다 (뇌 서버 맥락 중복 방지)
+    id: Optional[str] = None
 
 
 class AttachmentMeta(BaseModel):
@@ -34,16 +92,35 @@ class AttachmentMeta(BaseModel):
     # 포털 서버(app.py)에서 전달해주는 실제 서버 로컬 경로
     # 예: /home/sowon/spacetiming-studio/uploads/local_default/IMG_3001.jpeg
     server_path: Optional[str] = None
+    # 이미지면 /api/upload 가 주는 파생본 URL (말풍선 썸네일 / 모델에 넘길 축소 JPEG)
+    thumb_url: Optional[str] = None
+    model_url: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     attachments: Optional[List[AttachmentMeta]] = None
     upload_profile: Optional[str] = "local_default"
+    # 보낸 기기의 로컬 메시지 id. 히스토리에 같이 기록해서, 푸시로 되돌아온 자기 발화를 구분한다.
+    client_message_id: Optional[str] = None
+    # 그 기기가 마지막으로 받은 뇌 서버 맥락 seq. 있으면 messages 는 그 뒤 새 메시지만.
+    base_seq: Optional[int] = None
+    # 뇌 서버 맥락 세션 (channel, user_id, upload_profile). 없으면 포털 기본 세션.
+    channel: Optional[str] = None
+    user_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     reply: str
+    # 뇌 서버가 이번 턴(응답 포함)까지 합친 맥락 seq → 다음 요청의 base_seq
+    seq: Optional[int] = None
+
+
+def _safe_profile(profile: Optional[str]) -> str:
+    safe_profile = profile or "local_default"
+    # 너무 긴 문자/공백은 간단히 정리
+    safe_profile = safe_profile.strip() or "local_default"
+    return safe_profile.replace("..", "_").replace("/", "_")
 
 
 def get_upload_dir(profile: str) -> Path:
@@ -51,12 +128,9 @@ def get_upload_dir(profile: str) -> Path:
     업로드 프로필 이름에 따라 실제 저장 디렉토리를 결정한다.
     - 기본값: uploads/<profile>/
     - 디렉토리가 없으면 생성한다.
+    - 파일 바이트는 이제 blobs/ 에 있고, 여기엔 이름 → blob 목록(.manifest.jsonl)만 쌓인다.
     """
-    safe_profile = profile or "local_default"
-    # 너무 긴 문자/공백은 간단히 정리
-    safe_profile = safe_profile.strip() or "local_default"
-    safe_profile = safe_profile.replace("..", "_").replace("/", "_")
-    target = UPLOAD_ROOT / safe_profile
+    target = UPLOAD_ROOT / _safe_profile(profile)
     target.mkdir(parents=True, exist_ok=True)
     return target
 
@@ -67,6 +141,7 @@ class HistoryItem(BaseModel):
     content: str
     timestamp: str
     attachments: Optional[list[dict]] = None
+    client_id: Optional[str] = None
 
 
 HISTORY_FILES = [
@@ -80,134 +155,167 @@ HISTORY_WRITE_FILE.parent.mkdir(parents=True, exist_ok=True)
 BURNED_HISTORY_FILES = [
     "akashic/burned_room_2025-11-28.jsonl",
 ]
+# 불탄방 아카이브 컴파일본 (tools/compile_burned_archive.py, 없거나 낡았으면 startup 때 자동 생성)
+BURNED_COMPILED_FILE = Path("akashic") / "burned_room.compiled.json"
 
+# 불탄방은 런타임에 안 바뀌므로 startup 때 한 번만 로드해서 계속 들고 있는다.
+_burned_archive = BurnedArchive(BURNED_HISTORY_FILES, BURNED_COMPILED_FILE)
 
-def _load_history(limit: int = 400) -> List[HistoryItem]:
-    items_by_key: dict[str, HistoryItem] = {}
-
-    for path in HISTORY_FILES:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        data = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    role = data.get("role") or "assistant"
-                    text = data.get("text") or ""
-                    ts = data.get("timestamp") or ""
-                    msg_id = data.get("id") or ts or ""
-
-                    # 첨부 정보가 있으면 그대로 보존 (attachments 또는 files 키)
-                    attachments = None
-                    raw_att = data.get("attachments") or data.get("files")
-                    if isinstance(raw_att, list):
-                        attachments = raw_att
-
-                    # sowon.chat / sowon.chat.mac 에서 동일 발화가 중복되는 걸 막기 위한 키
-                    key = f"{msg_id}|{role}|{text}"
-                    items_by_key[key] = HistoryItem(
-                        id=msg_id or key,
-                        role=role,
-                        content=text,
-                        timestamp=ts,
-                        attachments=attachments,
-                    )
-        except FileNotFoundError:
-            continue
-
-    # 포털 히스토리 정리
-    portal_items_sorted: list[HistoryItem] = []
-    if items_by_key:
-      # id 기준으로 오래된 것 → 최신 순 정렬
-      portal_items_sorted = sorted(items_by_key.values(), key=lambda x: x.id)
-
-    # 불탄방(옛 대화 요약) 히스토리 로드
-    burned_items: list[HistoryItem] = []
-    for path in BURNED_HISTORY_FILES:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                idx = 0
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        data = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-
-                    text = data.get("text") or data.get("content") or ""
-                    if not text:
-                        continue
-
-                    role = data.get("role") or "assistant"
-                    ts = data.get("timestamp") or ""
-                    msg_id = data.get("id") or f"burned_{idx:04d}"
-
-                    burned_items.append(
-                        HistoryItem(
-                            id=msg_id,
-                            role=role,
-                            content=text,
-                            timestamp=ts,
-                            attachments=None,
-                        )
-                    )
-                    idx += 1
-        except FileNotFoundError:
-            continue
-        except Exception:
-            # 불탄방 히스토리 로딩 실패는 전체 히스토리를 막지 않는다.
-            continue
 
-    # 포털/불탄방 둘 다 완전히 비어 있으면 빈 리스트 반환
-    if not portal_items_sorted and not burned_items:
-        return []
+# 병합/dedup 된 타임라인을 프로세스 안에 들고 있는 캐시 (startup 때 백그라운드로 데움)
+_history_cache = HistoryCache(HISTORY_FILES, _burned_archive)
 
-    # 불탄방 + 포털 히스토리를 한 타임라인으로 합친 후, 뒤에서 limit 개만 남긴다.
-    merged: list[HistoryItem] = []
-    if burned_items:
-        # 불탄방은 파일 순서를 그대로 유지 (옛 기록이 앞쪽)
-        merged.extend(burned_items)
-    if portal_items_sorted:
-        # 포털 히스토리는 정렬된 상태에서 이어 붙여, 최신 기록이 타임라인 끝쪽에 오도록 한다.
-        merged.extend(portal_items_sorted)
+# /api/history/stream 구독자들에게 새 항목을 밀어 주는 채널
+_history_events = HistoryBroadcaster()
 
-    # 전체 타임라인에서 가장 최근 limit개만 반환 (아래로 갈수록 최신)
-    return merged[-limit:]
+# /api/history/search 용 n-gram 역색인 (없으면 startup 때 백그라운드로 만든다)
+HISTORY_SEARCH_DB = Path("portal_history") / "history_search.sqlite3"
+_history_search = HistorySearchIndex(HISTORY_SEARCH_DB, HISTORY_FILES, _burned_archive)
 
 
-# 서버 공용 히스토리 파일(포털 기준)에 한 줄 추가.
-def _append_history(role: str, text: str, attachments: Optional[list[dict]] = None) -> None:
+def _load_history_page(
+    limit: int = 400,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> history_store.HistoryPage:
     """
-    서버 공용 히스토리 파일(포털 기준)에 한 줄 추가.
-    - /api/history 에서 읽어가는 sowon.chat.jsonl 파일에 작성한다.
-    - attachments 가 있으면 그대로 기록해서 나중에 이미지/파일 썸네일을 복원할 수 있게 한다.
+    불탄방 + 포털 히스토리를 한 타임라인으로 합친 뒤, 뒤에서 limit 개만 돌려준다.
+    - before=<id> 면 그 항목 바로 앞 limit 개, after=<id> 면 바로 뒤 limit 개 (커서 페이지).
+    - 캐시가 데워져 있으면 파일 stat 만 확인하고 메모리에서 바로 잘라준다.
+      (파일이 자랐으면 늘어난 줄만, 비워졌거나 교체됐으면 전체를 다시 읽는다)
+    - 아직 데워지기 전이면 사이드카 오프셋 인덱스(.idx)로 필요한 구간만 읽는다.
+      커서 페이지는 인덱스로 커서 위치를 찾은 뒤, 거기서부터 블록 단위로 거꾸로 읽는다.
+    - 포털 히스토리는 (id, role, text) 다이제스트 기준 dedup 후 id 정렬, 불탄방은 아카이브 순서 그대로 앞쪽에 붙는다.
     """
-    ts = datetime.now().isoformat(timespec="seconds")
+    if _history_cache.ready:
+        if before is not None or after is not None:
+            return _history_cache.page(before=before, after=after, limit=limit)
+        return _history_cache.tail(limit)
+    if before is not None:
+        return history_store.load_history_before(HISTORY_FILES, _burned_archive, before, limit=limit)
+    if after is not None:
+        return history_store.load_history_after(HISTORY_FILES, _burned_archive, after, limit=limit)
+    return history_store.load_history_tail(HISTORY_FILES, _burned_archive, limit=limit)
+
+
+def _load_history(
+    limit: int = 400,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> List[HistoryItem]:
+    """_load_history_page 결과를 HistoryItem 리스트로. (응답 JSON 은 api_history 가 바로 만든다)"""
+    page = _load_history_page(limit=limit, before=before, after=after)
+    return [HistoryItem(**item) for item in page.items()]
+
+
+# ---- 히스토리 기록 ----
+
+# fsync 정책: none(안 함) / batch(묶음마다, 기본) / record(턴·레코드마다)
+HISTORY_FSYNC = os.getenv("HISTORY_FSYNC", "batch")
+
+_history_id_lock = threading.Lock()
+_last_history_id = ""
+
+
+def _next_history_id() -> str:
+    """커서(before/after)로 쓸 수 있게 프로세스 안에서 항상 증가하는 마이크로초 id."""
+    global _last_history_id
+    with _history_id_lock:
+        now = datetime.now()
+        hid = now.isoformat(timespec="microseconds")
+        if hid <= _last_history_id:
+            # 같은 마이크로초에 두 줄 (한 턴의 user/assistant 등) → 1µs 뒤로 민다.
+            prev = datetime.fromisoformat(_last_history_id)
+            hid = (prev + timedelta(microseconds=1)).isoformat(timespec="microseconds")
+        _last_history_id = hid
+        return hid
+
+
+def _history_record(
+    role: str,
+    text: str,
+    attachments: Optional[list[dict]] = None,
+    client_id: Optional[str] = None,
+) -> dict:
+    """sowon.chat.jsonl 한 줄 dict."""
+    hid = _next_history_id()
     item: dict = {
-        "id": ts,
+        "id": hid,
         "role": role,
         "text": text,
-        "timestamp": ts,
+        "timestamp": hid[:19],
     }
     if attachments:
         item["attachments"] = attachments
-
-    try:
-        with HISTORY_WRITE_FILE.open("a", encoding="utf-8") as f:
-            json.dump(item, f, ensure_ascii=False)
-            f.write("\n")
-    except Exception:
-        # 히스토리 기록 실패는 채팅 자체를 막지는 않는다.
-        pass
+    if client_id:
+        item["client_id"] = client_id
+    return item
+
+
+def _on_history_commit(path: str, line: bytes, start: int, end: int) -> None:
+    """writer 스레드가 한 줄을 파일에 쓴 직후: 캐시에 바로 밀어 넣고 SSE 구독자에게 푸시, 검색 색인."""
+    view = history_store.parse_portal_line(line)
+    if view is None:
+        return
+    _history_cache.push(path, view, start, end)
+    _history_events.publish(view.as_dict())
+    _history_search.push(path, view, start, end)
+
+
+# 여러 요청(포털 탭들, 텔레그램 등)의 기록을 한 번의 write 로 묶어서 쓰는 writer 스레드
+_history_writer = HistoryWriter(
+    HISTORY_WRITE_FILE,
+    fsync_policy=HISTORY_FSYNC,
+    on_commit=_on_history_commit,
+)
 
 
-app = FastAPI()
+def _append_turn(records: List[dict]) -> Future:
+    """한 턴(user + assistant)을 한 덩어리로 기록. 반만 써지는 일 없이 한 번의 write 로 나간다."""
+    if len(records) > 1:
+        # turn / turn_n(턴 줄 수) 키를 맨 앞에 둬야 끊긴 줄에서도 읽혀서,
+        # 재시작 때 끊기거나 줄이 모자란 턴을 통째로 잘라낼 수 있다.
+        turn = records[0]["id"]
+        records = [{"turn": turn, "turn_n": len(records), **r} for r in records]
+    return _history_writer.submit(records)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # director 호출용 공용 연결 풀 (/api/chat, /health 프로버)
+    await _director.start()
+    # director 상태 / 큐 깊이 주기 수집 → /health, /health/detail 은 스냅샷만 읽는다.
+    probing = asyncio.create_task(_health_prober.run())
+    # 불탄방 아카이브는 startup 때 한 번만 로드 (컴파일본이 없거나 낡았으면 여기서 다시 만든다)
+    await asyncio.to_thread(_burned_archive.load)
+    # 히스토리 캐시는 백그라운드에서 데운다. 그동안 /api/history 는 오프셋 인덱스 경로로 응답.
+    warmup = asyncio.create_task(asyncio.to_thread(_history_cache.sync))
+    # 검색 색인도 백그라운드에서 늘어난 줄만 따라잡는다 (처음이면 전체 색인).
+    indexing = asyncio.create_task(asyncio.to_thread(_history_search.sync))
+    # 지난번에 받다가 죽은 업로드 임시 파일 정리
+    await asyncio.to_thread(upload_stream.sweep_stale_parts, UPLOAD_STAGING_DIR)
+    # Pillow / pillow-heif 가 빠져 있으면 썸네일·HEIC 변환이 조용히 원본으로 대신되므로 크게 알린다
+    _derivatives.warn_if_missing()
+    # portal/ 정적 파일을 읽어서 지문 이름 / gzip(br) 을 미리 만들어 둔다
+    await asyncio.to_thread(_static_assets.build)
+    # 로컬 → NAS 복제 (지난번에 못 끝낸 것부터). NAS 가 멈춰 있어도 startup 은 안 기다린다.
+    _replicator.start()
+    # 폰이 영영 안 돌아온 이어 올리기 세션 정리
+    await asyncio.to_thread(_upload_sessions.sweep, UPLOAD_SESSION_TTL)
+    yield
+    warmup.cancel()
+    indexing.cancel()
+    probing.cancel()
+    # 큐에 남은 기록은 다 쓰고 내려간다.
+    await asyncio.to_thread(_history_writer.close)
+    _history_search.close()
+    _derivatives.close()
+    # 남은 복제 작업은 journal 에 있으니 다음 시작 때 이어서
+    await asyncio.to_thread(_replicator.close)
+    await _director.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # CORS: chat.html / 확장프로그램 / 아이폰 브라우저 등 다 열어두기
@@ -220,81 +328,232 @@ app.add_middleware(
 )
 
 
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 헤더에 etag 가 있는지 (W/ 접두어, 여러 값, * 허용)."""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# 이 개수 이상이면 응답 JSON 을 통째로 만들지 않고 조각조각 흘려보낸다. (아카이브 내보내기, 새 기기 첫 동기화 등)
+HISTORY_STREAM_MIN_ITEMS = 1000
+
+
 @app.get("/api/history")
-async def api_history(limit: int = 400):
-    """최근 대화 히스토리를 반환 (서버 기준, 기기와 브라우저를 넘어 공통 히스토리)."""
+async def api_history(
+    request: Request,
+    limit: int = 400,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since_etag: Optional[str] = None,
+    format: str = "json",
+    stream: bool = False,
+):
+    """
+    최근 대화 히스토리를 반환 (서버 기준, 기기와 브라우저를 넘어 공통 히스토리).
+    - ?before=<id>&limit= : 그 메시지보다 오래된 페이지 (위로 스크롤할 때)
+    - ?after=<id>&limit=  : 그 메시지 이후 페이지 (다른 기기에서 새로 쌓인 것 따라잡기)
+    - 커서 id 를 못 찾으면 빈 리스트
+    - 응답에는 히스토리 상태 버전 ETag 가 붙고, If-None-Match 가 같으면 304 (본문 없음)
+    - ?since_etag=<ETag> : 그 버전 이후에 새로 쌓인 항목만 (X-History-Delta: 1).
+      파일이 비워졌거나 교체돼서 델타를 못 만들면 보통 응답(최근 limit개)으로 대신한다 (X-History-Delta: 0).
+    - ?format=ndjson : 한 줄에 항목 하나 (application/x-ndjson, 항상 스트리밍)
+    - ?stream=1 이거나 항목이 HISTORY_STREAM_MIN_ITEMS 개 이상이면 JSON 배열도 조각조각 흘려보낸다
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="before 와 after 는 같이 쓸 수 없음")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format 은 json 또는 ndjson")
     try:
-        items = _load_history(limit=limit)
+        # 버전을 먼저 잡는다. 그 사이 붙은 줄은 다음 델타에 한 번 더 실릴 뿐 빠지지는 않는다.
+        etag = f'"{history_store.history_version(HISTORY_FILES, _burned_archive)}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        if since_etag and before is None and after is None:
+            delta = history_store.load_history_since(HISTORY_FILES, _burned_archive, since_etag)
+            if delta is not None:
+                headers["X-History-Delta"] = "1"
+                body = history_store.HistoryPage(_burned_archive, portal=delta).to_json()
+                return Response(content=body, media_type="application/json", headers=headers)
+            headers["X-History-Delta"] = "0"
+
+        page = _load_history_page(limit=limit, before=before, after=after)
+        if format == "ndjson":
+            return StreamingResponse(page.iter_ndjson(), media_type="application/x-ndjson", headers=headers)
+        if stream or len(page) >= HISTORY_STREAM_MIN_ITEMS:
+            return StreamingResponse(page.iter_json(), media_type="application/json", headers=headers)
+        # 항목마다 pydantic 검증/직렬화를 거치지 않고, 불탄방은 미리 직렬화된 조각을 그대로 붙인다.
+        body = page.to_json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"history_load_error: {e}")
-    return [item.dict() for item in items]
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-@app.get("/health")
-async def health():
+@app.get("/api/history/search")
+async def api_history_search(q: str = "", limit: int = 20):
     """
-    포털 자체 헬스체크.
-    + 부감독 뇌 서버까지 같이 확인.
+    포털 히스토리 + 불탄방 전문 검색.
+    - 한국어 조사 때문에 띄어쓰기 대신 글자 2/3-gram 역색인으로 찾는다 (portal_core/history_search.py)
+    - 응답: {"query", "total", "took_ms", "hits": [{id, role, timestamp, source, score, snippet, highlights}]}
+      highlights 는 snippet 안에서 걸린 글자 구간 [시작, 끝] 목록
+    - 찾은 id 는 /api/history?after= / ?before= 커서로 그 앞뒤 대화를 불러올 때 쓴다
     """
-    core_status = "unknown"
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q 가 비어 있음")
+    limit = max(1, min(limit, 100))
     try:
-        r = requests.get(f"{DIRECTOR_CORE_URL}/health", timeout=3)
-        if r.ok:
-            core_status = r.json().get("status", "ok")
-        else:
-            core_status = f"http_{r.status_code}"
+        return await asyncio.to_thread(_history_search.search, q, limit)
     except Exception as e:
-        core_status = f"error: {e}"
+        raise HTTPException(status_code=500, detail=f"history_search_error: {e}")
 
-    return {"status": "ok", "director_core_status": core_status}
 
+HISTORY_STREAM_PING_SEC = 15.0
+HISTORY_STREAM_REPLAY_PAGE = 200
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+
+def _sse_event(item: dict) -> str:
+    data = json.dumps(item, ensure_ascii=False)
+    return f"id: {item['id']}\nevent: history\ndata: {data}\n\n"
+
+
+@app.get("/api/history/stream")
+async def api_history_stream(request: Request, last_id: Optional[str] = None):
     """
-    chat.html / 사이드바 확장 / 아이폰에서 쓰는 공통 엔드포인트.
+    새 히스토리 항목을 SSE(text/event-stream)로 흘려보낸다.
+    - HistoryWriter 가 기록하는 순간 event: history 로 한 건씩 전송 (id: 는 히스토리 id)
+    - 다시 붙을 때는 Last-Event-ID 헤더(EventSource 자동) 또는 ?last_id= 이후 항목부터 replay
+    - 15초마다 주석 줄(: ping)로 연결 유지
+    - 너무 느려서 큐가 넘친 구독자는 끊는다 → 클라이언트가 Last-Event-ID 로 다시 붙어 따라잡는다
+    """
+    resume_id = request.headers.get("last-event-id") or last_id
 
-    - 클라이언트 → /api/chat 로 messages + attachments 메타정보 보냄
-    - 여기서 director_core(8897)로 그대로 포워딩
-    - 부감독 뇌의 reply만 꺼내서 반환
+    # replay 하는 동안 새로 쓰인 항목도 놓치지 않게, 구독부터 먼저 건다.
+    sub = _history_events.subscribe()
+
+    async def event_stream():
+        sent: set[str] = set()
+        try:
+            # 1) 끊겨 있던 동안 쌓인 항목 replay (after 커서 페이지를 이어서)
+            cursor = resume_id
+            while cursor:
+                page = _load_history(limit=HISTORY_STREAM_REPLAY_PAGE, after=cursor)
+                for it in page:
+                    sent.add(it.id)
+                    yield _sse_event(it.model_dump())
+                if len(page) < HISTORY_STREAM_REPLAY_PAGE:
+                    break
+                cursor = page[-1].id
+
+            # 2) 실시간 푸시
+            while True:
+                item = await sub.get(timeout=HISTORY_STREAM_PING_SEC)
+                if sub.overflowed or await request.is_disconnected():
+                    break
+                if item is None:
+                    yield ": ping\n\n"
+                    continue
+                if item["id"] in sent:
+                    continue
+                yield _sse_event(item)
+        finally:
+            _history_events.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _health_extra() -> dict:
+    return {
+        # director 로 나가 있는 / 자리 기다리는 채팅 요청 수
+        "director_requests": _director.stats(),
+        # 히스토리 writer 큐 깊이 / flush 지연
+        "history_writer": _history_writer.stats(),
+        # 중복 채팅 요청 합치기 / replay 횟수
+        "chat_idempotency": _chat_idempotency.stats(),
+        # 썸네일 / 모델용 JPEG 만들기
+        "derivatives": _derivatives.stats(),
+        # 로컬 → NAS 복제 밀린 양 / 마지막 오류
+        "nas_replication": _replicator.stats(),
+        # 미리 압축해 둔 정적 파일
+        "static_assets": _static_assets.stats(),
+    }
+
+
+_health_prober = HealthProber(_director, interval=HEALTH_PROBE_INTERVAL, extra=_health_extra)
+# 실제 채팅 호출 지연도 모아서 /health/detail 의 p50/p95 로
+_director.latency_observer = _health_prober.observe
+
+
+@app.get("/health")
+async def health():
+    """
+    포털 자체 헬스체크.
+    + 부감독 뇌 서버 상태 / 큐 깊이 (HEALTH_PROBE_INTERVAL 초마다 백그라운드에서 찍은 스냅샷, age_s 초 전 것)
+    """
+    return {"status": "ok", **_health_prober.snapshot()}
+
+
+@app.get("/health/detail")
+async def health_detail():
+    """
+    /health + 최근 5분 지연 p50/p95 (director 프로브, /chat, /chat/stream, /chat/stream#ttft)
+    + 사이드바 부하 막대용 load_pct.
     """
+    return {"status": "ok", **_health_prober.detail()}
+
+
+def _director_payload(req: ChatRequest) -> dict:
     # 첨부 파일 메타정보는 req.attachments 로 들어온다.
-    # director_core(/chat) 호출 시:
-    #   - messages: 대화 맥락
+    # director_core(/chat, /chat/stream) 호출 시:
+    #   - messages: 새 메시지 (base_seq 가 있으면 그 뒤로 새로 쓴 것만)
+    #   - base_seq: 클라이언트가 마지막으로 받은 맥락 seq
     #   - attachments: 파일 메타 (name/type/size/url 등)
     #   - upload_profile: 실제 파일이 저장된 프로필 이름 (예: local_default, gdrive_...)
     # director_core 쪽에서 이 정보를 바탕으로 이미지/파일을 열어볼 수 있다.
+    messages = [m.model_dump(exclude_none=True) for m in req.messages]
+    if req.client_message_id:
+        for m in reversed(messages):
+            if m["role"] == "user":
+                m.setdefault("id", req.client_message_id)
+                break
     payload = {
-        "messages": [m.model_dump() for m in req.messages],
+        "messages": messages,
         "upload_profile": req.upload_profile or "local_default",
     }
+    if req.base_seq is not None:
+        payload["base_seq"] = req.base_seq
+    if req.channel:
+        payload["channel"] = req.channel
+    if req.user_id:
+        payload["user_id"] = req.user_id
     if req.attachments:
         payload["attachments"] = [a.model_dump() for a in req.attachments]
+    return payload
 
-    try:
-        resp = requests.post(
-            f"{DIRECTOR_CORE_URL}/chat",
-            json=payload,
-            timeout=60,
-        )
-        resp.raise_for_status()
-    except requests.RequestException as e:
-        # 여기서 에러 나면 브라우저에 500으로 전달 → 콘솔에 500 찍히는 그 부분
-        raise HTTPException(
-            status_code=500,
-            detail=f"director_core 연결 오류: {e}",
-        )
 
-    data = resp.json()
-    reply = data.get("reply", "").strip()
+def _chat_fingerprint(payload: dict) -> str:
+    # base_seq 는 빼고 비교한다: 실패한 메시지를 다른 메시지가 나간 뒤에 다시 보내면 커서만 달라진다
+    return payload_fingerprint({k: v for k, v in payload.items() if k != "base_seq"})
 
-    if not reply:
-        raise HTTPException(
-            status_code=500,
-            detail="director_core 응답에 reply 필드가 비어 있음",
-        )
 
-    # 히스토리 파일에 이번 턴 기록 (마지막 user 발화 + assistant 응답)
+def _idempotency_key(request: Request, req: ChatRequest) -> Optional[str]:
+    # 헤더가 우선, 없으면 chat.html 이 보내는 client_message_id (재전송도 같은 id 로 온다)
+    key = (request.headers.get("idempotency-key") or req.client_message_id or "").strip()
+    return key or None
+
+
+async def _record_turn(req: ChatRequest, reply: str) -> None:
+    """히스토리 파일에 이번 턴 기록 (마지막 user 발화 + assistant 응답)."""
     try:
         last_user = None
         for m in reversed(req.messages):
@@ -307,66 +566,497 @@ async def chat(req: ChatRequest):
         if req.attachments:
             att_list = [a.model_dump() for a in req.attachments]
 
+        client_id = req.client_message_id
+        records: List[dict] = []
         if last_user is not None:
-            _append_history("user", last_user.content, att_list)
-
-        _append_history("assistant", reply)
+            records.append(_history_record("user", last_user.content, att_list, client_id=client_id))
+        records.append(_history_record(
+            "assistant",
+            reply,
+            client_id=f"{client_id}:reply" if client_id else None,
+        ))
+        # user/assistant 를 한 번의 write 로. 다른 요청의 기록과 같이 묶여서 나간다.
+        await asyncio.wrap_future(_append_turn(records))
     except Exception:
         # 히스토리 기록 실패는 채팅 응답 자체를 막지 않는다.
         pass
 
-    return ChatResponse(reply=reply)
+
+async def _chat_once(req: ChatRequest, payload: dict) -> ChatResponse:
+    """director 한 번 호출 + 히스토리 기록 → reply (+ 맥락 seq)."""
+    try:
+        # 공용 연결 풀로 비동기 호출 → 모델 응답을 기다리는 동안에도 /api/history 등은 계속 응답한다.
+        data = await _director.post_json("/chat", payload)
+    except DirectorBusy as e:
+        raise HTTPException(status_code=503, detail=f"director_core 바쁨: {e}")
+    except DirectorError as e:
+        # 여기서 에러 나면 브라우저에 500으로 전달 → 콘솔에 500 찍히는 그 부분
+        raise HTTPException(
+            status_code=500,
+            detail=f"director_core 연결 오류: {e}",
+        )
+
+    reply = data.get("reply", "").strip()
+
+    if not reply:
+        raise HTTPException(
+            status_code=500,
+            detail="director_core 응답에 reply 필드가 비어 있음",
+        )
+
+    await _record_turn(req, reply)
+    return ChatResponse(reply=reply, seq=data.get("seq"))
+
+
+async def _await_shared(fut: asyncio.Future) -> ChatResponse:
+    """같은 키로 합쳐진 결과 기다리기. 실패는 처음 요청과 같은 HTTPException."""
+    try:
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        if not fut.cancelled():
+            raise
+        # 처음 요청(스트림)이 중간에 끊겨서 결과가 없다 → 다시 보내면 새로 부른다.
+        raise HTTPException(status_code=500, detail="같은 키의 처음 요청이 중간에 끊김")
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest, request: Request, response: Response):
+    """
+    chat.html / 사이드바 확장 / 아이폰에서 쓰는 공통 엔드포인트.
+
+    - 클라이언트 → /api/chat 로 messages + attachments 메타정보 보냄
+    - 여기서 director_core(8897)로 그대로 포워딩
+    - 부감독 뇌의 reply만 꺼내서 반환
+    - Idempotency-Key 헤더(없으면 client_message_id)가 같은 요청은 한 번만 처리한다.
+      처리 중이면 그 결과를 같이 기다리고, 끝난 지 CHAT_IDEMPOTENCY_TTL 초 안이면 그대로 replay
+      (모델 호출도, 히스토리 기록도 한 번). 같은 키에 다른 내용이면 409.
+    """
+    payload = _director_payload(req)
+    key = _idempotency_key(request, req)
+    if key is None:
+        return await _chat_once(req, payload)
+
+    fingerprint = _chat_fingerprint(payload)
+    try:
+        fut = _chat_idempotency.lookup(key, fingerprint)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    shared = fut is not None
+    if fut is None:
+        fut = _chat_idempotency.start(key, fingerprint, lambda: _chat_once(req, payload))
+    result = await _await_shared(fut)
+    if shared:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+def _ndjson_line(obj: dict) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_chat(req: ChatRequest, payload: dict, key: Optional[str]):
+    """director /chat/stream 중계 (NDJSON 줄들). key 가 있으면 끝난 결과/실패를 idempotency 캐시에 알린다."""
+    parts: List[str] = []
+    reply: Optional[str] = None
+    seq: Optional[int] = None
+    error: Optional[HTTPException] = None
+    try:
+        try:
+            # aclosing: done 에서 빠져나와도 director 연결/세마포어 자리를 바로 돌려준다.
+            async with aclosing(_director.stream_lines("/chat/stream", payload)) as lines:
+                async for msg in lines:
+                    if "delta" in msg:
+                        delta = str(msg["delta"])
+                        parts.append(delta)
+                        yield _ndjson_line({"delta": delta})
+                    elif msg.get("error"):
+                        error = HTTPException(status_code=500, detail=str(msg["error"]))
+                        break
+                    elif msg.get("done"):
+                        reply = str(msg.get("reply") or "".join(parts)).strip()
+                        seq = msg.get("seq")
+                        break
+        except DirectorBusy as e:
+            error = HTTPException(status_code=503, detail=f"director_core 바쁨: {e}")
+        except DirectorError as e:
+            error = HTTPException(status_code=500, detail=f"director_core 연결 오류: {e}")
+
+        if error is None and not reply:
+            error = HTTPException(status_code=500, detail="director_core 응답에 reply 필드가 비어 있음")
+        if error is not None:
+            if key:
+                _chat_idempotency.fail(key, error)
+            yield _ndjson_line({"error": error.detail, "status": error.status_code})
+            return
+
+        await _record_turn(req, reply)
+        if key:
+            _chat_idempotency.complete(key, ChatResponse(reply=reply, seq=seq))
+        yield _ndjson_line({"done": True, "reply": reply, "seq": seq})
+    finally:
+        # 클라이언트가 중간에 끊으면 여기로 → 같은 키를 기다리던 요청은 실패로 (이미 끝났으면 아무 일 없음)
+        if key:
+            _chat_idempotency.fail(key, asyncio.CancelledError())
+
+
+class _ClaimedStreamingResponse(StreamingResponse):
+    """응답이 끝나면 idempotency claim 을 푼다.
+
+    클라이언트가 본문이 돌기 전에 끊으면 _stream_chat 제너레이터는 시작도 안 해서 그 finally 가 안 불린다.
+    ASGI 호출 자체는 (끊겨서 예외로 끝나도) 여기서 끝나므로 이 자리에서 풀어 준다. 이미 끝난 claim 이면 아무 일 없음.
+    """
+
+    def __init__(self, content, key: str, claim: asyncio.Future, **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._key = key
+        self._claim = claim
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _chat_idempotency.release(self._key, self._claim)
+
+
+async def _replay_stream(fut: asyncio.Future):
+    """같은 키의 처리 중/끝난 결과를 스트림 모양으로 (전체 응답을 delta 한 번 + done)."""
+    try:
+        result = await _await_shared(fut)
+    except HTTPException as e:
+        yield _ndjson_line({"error": e.detail, "status": e.status_code})
+        return
+    yield _ndjson_line({"delta": result.reply})
+    yield _ndjson_line({"done": True, "reply": result.reply, "seq": result.seq})
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """
+    /api/chat 의 스트리밍 버전. 입력은 같고, 응답은 NDJSON (application/x-ndjson).
+
+        {"delta": "..."}               director 가 조각을 낼 때마다 그대로 전달
+        {"done": true, "reply": "...", "seq": N} 다 끝났을 때 (전체 응답, 히스토리 기록 후, 뇌 서버 맥락 seq)
+        {"error": "...", "status": N}  director 연결/모델 오류 (이 뒤로는 아무것도 안 옴)
+
+    - 히스토리는 스트림이 done 으로 끝났을 때만 기록한다.
+      (중간에 끊기거나 오류면 이번 턴은 안 남긴다 → /api/chat 과 같은 기준)
+    - idempotency 키는 /api/chat 과 같이 공유한다. 같은 키가 처리 중이거나 끝났으면
+      새로 부르지 않고 그 결과를 delta 한 번 + done 으로 돌려준다 (Idempotent-Replayed: true).
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    payload = _director_payload(req)
+    key = _idempotency_key(request, req)
+    if key is None:
+        body = _stream_chat(req, payload, None)
+    else:
+        fingerprint = _chat_fingerprint(payload)
+        try:
+            fut = _chat_idempotency.lookup(key, fingerprint)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if fut is not None:
+            headers["Idempotent-Replayed"] = "true"
+            body = _replay_stream(fut)
+        else:
+            claim = _chat_idempotency.claim(key, fingerprint)
+            return _ClaimedStreamingResponse(
+                _stream_chat(req, payload, key), key, claim, media_type="application/x-ndjson", headers=headers
+            )
+
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+def _safe_upload_name(name: str) -> str:
+    # 너무 긴 이름/경로 관련 문자를 간단히 정리
+    return name.replace("/", "_").replace("\\", "_")
+
+
+def _upload_result(
+    original_name: str, safe_name: str, upload_profile: str, entry: dict, created: bool, path: Path
+) -> dict:
+    result = {
+        "name": original_name,
+        "saved_as": safe_name,
+        # 내용 주소 URL → 내용이 바뀌지 않으므로 브라우저가 영원히 캐시해도 된다.
+        "url": f"/uploads/{entry['blob']}",
+        "upload_profile": upload_profile,
+        # 로컬에 받은 것 (이미 NAS 에만 있던 내용이면 NAS 경로)
+        "server_path": str(path),
+        "type": entry["type"],
+        "size": entry["size"],
+        "sha256": entry["sha256"],
+        # 이미 있던 내용이라 NAS 에 새로 안 썼는지
+        "deduplicated": not created,
+    }
+    if is_image_ext(blob_ext(entry["blob"])):
+        # 파생본은 뒤에서 만들어 둔다. 아직 없을 때 요청하면 그 자리에서 만들어서 준다.
+        result["thumb_url"] = f"{result['url']}/thumb"
+        result["model_url"] = f"{result['url']}/model"
+        _derivatives.schedule(entry["sha256"], path)
+    return result
 
 
 @app.post("/api/upload")
-async def upload_files(
-    files: List[UploadFile] = File(...),
-    upload_profile: str = Form("local_default"),
-):
+async def upload_files(request: Request):
     """
     첨부 파일 실제 업로드 엔드포인트.
-    - 프론트에서 FormData로 파일들 + upload_profile 을 보낸다.
-    - uploads/<upload_profile>/ 아래에 저장하고, /uploads/... 경로를 돌려준다.
+    - 프론트에서 FormData로 파일들(files) + upload_profile 을 보낸다.
+    - 내용은 blobs/<sha256> 로 저장하고, <upload_profile>/.manifest.jsonl 에 이름 → blob 을 남긴다.
+      같은 내용이 이미 있으면 blob 은 안 쓰고 목록만 (deduplicated: true).
+    - 본문을 흘려 받으면서 1MB 씩 임시 파일에 쓰고(SHA-256 도 같이), 다 받은 뒤 제자리로 rename
+      → 파일 크기와 상관없이 메모리는 일정, 반쯤 쓴 파일은 안 보인다.
+    - 파일 하나가 UPLOAD_MAX_BYTES 를 넘으면 413.
     """
+    try:
+        fields, received = await upload_stream.receive_multipart(
+            request.headers, request.stream(), UPLOAD_STAGING_DIR, UPLOAD_MAX_BYTES
+        )
+    except upload_stream.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"업로드 크기 제한 초과: {e}")
+    except upload_stream.UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    upload_profile = fields.get("upload_profile") or "local_default"
     upload_dir = get_upload_dir(upload_profile)
     results: list[dict] = []
 
-    for uf in files:
-        original_name = uf.filename or "file"
-        # 너무 긴 이름/경로 관련 문자를 간단히 정리
-        safe_name = original_name.replace("/", "_").replace("\\", "_")
-        target_path = upload_dir / safe_name
+    try:
+        for rf in received:
+            original_name = rf.filename or "file"
+            safe_name = _safe_upload_name(original_name)
+            ext = blob_ext(safe_name)
+            path, created = await asyncio.to_thread(_blob_store.put, rf, ext)
+            entry = await asyncio.to_thread(
+                _blob_store.link, upload_dir, safe_name, rf.sha256, ext, rf.size, rf.content_type
+            )
+            results.append(_upload_result(original_name, safe_name, upload_profile, entry, created, path))
+    finally:
+        # 옮기다 실패한 나머지 임시 파일은 버린다 (이미 옮긴 건 unlink 가 그냥 실패)
+        for rf in received:
+            upload_stream.discard(rf)
 
-        try:
-            with target_path.open("wb") as out_f:
-                content = await uf.read()
-                out_f.write(content)
-        finally:
-            await uf.close()
-
-        # 정적 서빙용 URL (/uploads 마운트 기준)
-        rel_path = target_path.relative_to(UPLOAD_ROOT)
-        url = f"/uploads/{rel_path.as_posix()}"
-
-        results.append(
-            {
-                "name": original_name,
-                "saved_as": safe_name,
-                "url": url,
-                "upload_profile": upload_profile,
-                "server_path": str(target_path),
-            }
-        )
+    return {"files": results}
+
+
+class UploadLinkItem(BaseModel):
+    name: str
+    sha256: str
+    type: Optional[str] = None
+    size: Optional[int] = None
+
+
+class UploadLinkRequest(BaseModel):
+    upload_profile: Optional[str] = "local_default"
+    files: List[UploadLinkItem]
 
+
+def _link_content_type(upload_dir: Path, safe_name: str, sha256: str, given: Optional[str]) -> Optional[str]:
+    """해시만 보낸 첨부의 type: 클라이언트가 안 주면 그 프로필에서 같은 blob 에 기록된 type → 확장자 추측."""
+    if given:
+        return given
+    prev = _blob_store.manifest(upload_dir).lookup_blob(sha256)
+    if prev is not None and prev.get("type"):
+        return prev["type"]
+    return mimetypes.guess_type(safe_name)[0]
+
+
+@app.post("/api/upload/link")
+async def upload_link(req: UploadLinkRequest):
+    """
+    바이트 없이 해시만으로 첨부하기 (다시 올리는 같은 사진/스크린샷용).
+    - 클라이언트가 SHA-256 을 먼저 계산해서 보낸다.
+    - 그 내용이 이미 blobs/ 에 있으면 /api/upload 와 같은 모양의 결과 (목록에 한 줄 추가만)
+    - 없으면 {"name", "sha256", "missing": true} → 그 파일만 /api/upload 로 올리면 된다.
+    순서는 요청 files 와 같다.
+    """
+    upload_profile = req.upload_profile or "local_default"
+    upload_dir = get_upload_dir(upload_profile)
+    results: list[dict] = []
+    for item in req.files:
+        safe_name = _safe_upload_name(item.name or "file")
+        ext = blob_ext(safe_name)
+        sha256 = item.sha256.lower()
+        # (경로, stat) 을 같이 받는다 → NAS 에 있는 blob 이어도 이벤트 루프에서 stat 하지 않는다
+        found = await asyncio.to_thread(_blob_store.find, sha256, ext)
+        if found is None:
+            results.append({"name": item.name, "sha256": sha256, "missing": True})
+            continue
+        path, st = found
+        size = st.st_size
+        content_type = await asyncio.to_thread(_link_content_type, upload_dir, safe_name, sha256, item.type)
+        entry = await asyncio.to_thread(_blob_store.link, upload_dir, safe_name, sha256, ext, size, content_type)
+        results.append(_upload_result(item.name, safe_name, upload_profile, entry, False, path))
     return {"files": results}
 
-from fastapi.responses import FileResponse, RedirectResponse
+
+class UploadSessionCreate(BaseModel):
+    name: str
+    size: int
+    type: Optional[str] = None
+    upload_profile: Optional[str] = "local_default"
+    # 알면 보내기: finish 때 받은 내용과 비교 (다르면 422)
+    sha256: Optional[str] = None
+
+
+def _session_error(e: Exception) -> HTTPException:
+    if isinstance(e, UploadSessionNotFound):
+        return HTTPException(status_code=404, detail="업로드 세션 없음")
+    if isinstance(e, (UploadOffsetMismatch, UploadSessionIncomplete)):
+        # 클라이언트는 offset 부터 다시 보내면 된다.
+        return HTTPException(status_code=409, detail={"error": str(e), "offset": e.offset})
+    if isinstance(e, UploadSessionBusy):
+        return HTTPException(status_code=409, detail={"error": "같은 세션에 다른 요청이 진행 중"})
+    if isinstance(e, upload_stream.UploadTooLarge):
+        return HTTPException(status_code=413, detail=f"업로드 크기 제한 초과: {e}")
+    if isinstance(e, UploadChecksumMismatch):
+        return HTTPException(status_code=422, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/upload/sessions")
+async def upload_session_create(req: UploadSessionCreate):
+    """
+    이어 올리기 업로드 시작 (큰 동영상 / 끊기는 Wi-Fi 용).
+    1) POST /api/upload/sessions {name, size, type, upload_profile} → {upload_id, offset: 0, chunk_size}
+    2) PUT  /api/upload/sessions/<id>?offset=N  (본문 = 파일의 N 바이트부터, chunk_size 정도씩) → {offset}
+    3) 끊기면 GET /api/upload/sessions/<id> 로 offset 을 받아서 거기부터 다시 PUT
+    4) POST /api/upload/sessions/<id>/complete → /api/upload 의 files[] 항목과 같은 모양
+    """
+    try:
+        return await asyncio.to_thread(
+            _upload_sessions.create,
+            req.name or "file",
+            req.size,
+            req.type,
+            _safe_profile(req.upload_profile or "local_default"),
+            req.sha256,
+        )
+    except (upload_stream.UploadTooLarge, upload_stream.UploadFormError) as e:
+        raise _session_error(e)
+
+
+@app.get("/api/upload/sessions/{upload_id}")
+async def upload_session_status(upload_id: str):
+    try:
+        return await asyncio.to_thread(_upload_sessions.status, upload_id)
+    except UploadSessionNotFound as e:
+        raise _session_error(e)
+
+
+@app.put("/api/upload/sessions/{upload_id}")
+async def upload_session_put(upload_id: str, offset: int, request: Request):
+    """offset 부터 본문을 붙인다. 중간에 끊겨도 받은 데까지는 남는다 (다음 GET 의 offset)."""
+    try:
+        received = await _upload_sessions.write(upload_id, offset, request.stream())
+    except ClientDisconnect:
+        # 응답 받을 쪽이 없다. 받은 만큼은 이미 붙여 뒀다.
+        return Response(status_code=499)
+    except (
+        UploadSessionNotFound,
+        UploadOffsetMismatch,
+        UploadSessionBusy,
+        upload_stream.UploadTooLarge,
+    ) as e:
+        raise _session_error(e)
+    return {"upload_id": upload_id, "offset": received}
+
+
+@app.post("/api/upload/sessions/{upload_id}/complete")
+async def upload_session_complete(upload_id: str):
+    try:
+        meta, rf = await _upload_sessions.finish(upload_id)
+    except (UploadSessionNotFound, UploadSessionIncomplete, UploadSessionBusy, UploadChecksumMismatch) as e:
+        raise _session_error(e)
+
+    upload_profile = meta["upload_profile"]
+    safe_name = _safe_upload_name(rf.filename)
+    ext = blob_ext(safe_name)
+    try:
+        path, created = await asyncio.to_thread(_blob_store.put, rf, ext)
+        entry = await asyncio.to_thread(
+            _blob_store.link, get_upload_dir(upload_profile), safe_name, rf.sha256, ext, rf.size, rf.content_type
+        )
+    finally:
+        upload_stream.discard(rf)
+    return _upload_result(rf.filename, safe_name, upload_profile, entry, created, path)
+
+
+@app.delete("/api/upload/sessions/{upload_id}")
+async def upload_session_abort(upload_id: str):
+    try:
+        await _upload_sessions.abort(upload_id)
+    except (UploadSessionNotFound, UploadSessionBusy) as e:
+        raise _session_error(e)
+    return {"ok": True}
+
+
+from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
-# 정적 파일(스타일/JS) 서빙
-app.mount("/static", StaticFiles(directory="portal", html=False), name="static")
-# 업로드 파일 서빙 (/uploads/ 경로 아래에서 접근)
+
+@app.get("/uploads/.{rest:path}")
+async def upload_hidden(rest: str):
+    # 점으로 시작하는 것(받는 중인 임시 파일 / 이어 올리기 세션 / NAS 복제 journal)은 내보내지 않는다
+    # (아래 StaticFiles 마운트보다 먼저 걸리게)
+    raise HTTPException(status_code=404)
+
+
+@app.get("/uploads/blobs/{shard}/{blob_name}")
+async def upload_blob(request: Request, shard: str, blob_name: str):
+    """내용 주소 blob. 이름이 곧 내용 해시라 절대 안 바뀜 → 1년 + immutable 캐시."""
+    sha256, ext = blob_name[:64], blob_name[64:]
+    if shard != sha256[:2] or blob_ext("x" + ext) != ext:
+        raise HTTPException(status_code=404)
+    found = await asyncio.to_thread(_blob_store.find, sha256, ext)
+    if found is None:
+        raise HTTPException(status_code=404)
+    path, st = found
+    return file_response(request, path, IMMUTABLE, stat_result=st)
+
+
+@app.get("/uploads/blobs/{shard}/{blob_name}/{kind}")
+async def upload_blob_derivative(request: Request, shard: str, blob_name: str, kind: str):
+    """
+    이미지 blob 의 파생본: thumb(긴 변 320px) / model(긴 변 1600px, HEIC → JPEG).
+    - 없으면 그 자리에서 프로세스 풀로 만들고 (동시에 여러 번 와도 한 번만), 이후로는 파일만 보낸다.
+    - Pillow 가 없거나 열 수 없는 이미지면 원본을 대신 보낸다 (나중에 파생본이 생길 수 있으니 no-cache).
+    """
+    sha256, ext = blob_name[:64], blob_name[64:]
+    if kind not in ("thumb", "model") or shard != sha256[:2] or blob_ext("x" + ext) != ext:
+        raise HTTPException(status_code=404)
+    found = await asyncio.to_thread(_blob_store.find, sha256, ext)
+    if found is None:
+        raise HTTPException(status_code=404)
+    src, st = found
+    if is_image_ext(ext) and await _derivatives.ensure(sha256, src):
+        # 파생본은 로컬 디스크
+        return file_response(request, _derivatives.path(sha256, kind), IMMUTABLE, media_type="image/jpeg")
+    return file_response(request, src, "no-cache", stat_result=st)
+
+
+@app.get("/uploads/{profile}/{name}")
+async def upload_by_name(request: Request, profile: str, name: str):
+    """
+    예전 모양 URL (/uploads/<profile>/<이름>).
+    - 예전처럼 실제 파일이 있으면 그대로
+    - 없으면 그 프로필의 이름 → blob 목록에서 찾아서 (같은 이름이 나중에 다른 내용을 가리킬 수 있어 no-cache)
+    """
+    # 점으로 시작하는 것(.manifest.jsonl, .incoming/ 의 받는 중인 파일, ..)은 내보내지 않는다.
+    if profile.startswith(".") or name.startswith(".") or profile != _safe_profile(profile):
+        raise HTTPException(status_code=404)
+    # locate / resolve 가 (경로, stat) 을 스레드 안에서 같이 구한다 (NAS 가 멈춰도 이벤트 루프는 안 막힘)
+    found = await asyncio.to_thread(_blob_store.locate, f"{profile}/{name}")
+    if found is None:
+        found = await asyncio.to_thread(_blob_store.resolve, UPLOAD_ROOT / profile, name)
+    if found is None:
+        raise HTTPException(status_code=404)
+    path, st = found
+    return file_response(request, path, "no-cache", stat_result=st)
+
+# 정적 파일(스타일/JS) 서빙: 지문 붙은 이름은 1년 immutable, 원래 이름은 ETag 로 304
+app.mount("/static", _static_assets, name="static")
+# 업로드 파일 서빙 (/uploads/ 경로 아래에서 접근). Range / If-None-Match 는 StaticFiles 가 처리
 app.mount("/uploads", StaticFiles(directory=str(UPLOAD_ROOT), html=False), name="uploads")
 
-# portal 폴더 전체를 /portal 아래에 그대로 매핑
-app.mount("/portal", StaticFiles(directory="portal", html=True), name="portal_html")
\ No newline at end of file
+# portal 폴더 전체를 /portal 아래에 그대로 매핑 (/portal/ → index.html)
+app.mount("/portal", _static_assets, name="portal_html")
\ No newline at end of file
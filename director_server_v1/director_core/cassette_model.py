@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+"""
+기록/재생(cassette) 모델 (v1).
+
+실제 모델(Gemini, fake 등) 응답을 JSONL 파일에 한 줄씩 기록해 두었다가
+같은 요청이 오면 네트워크 없이 그대로 돌려준다. Pi / CI 에서 프롬프트 조립이나
+서버 처리량 벤치마크를 오프라인으로, 매번 같은 응답으로 돌리기 위한 자리.
+
+    model = CassetteModel(Path("storage/model_cassette.jsonl"), "replay", "gemini-2.0-flash")
+    model = CassetteModel(path, "record", name, inner=genai.GenerativeModel(name))
+
+genai.GenerativeModel 과 같은 모양 (generate_content(contents, stream=False, **kwargs)).
+
+- 키: 모델 이름 + stream 여부 + contents(이미지는 픽셀 해시) + kwargs 의 sha256
+- record: inner 를 부르고 (스트림은 끝까지 받은 것만) 한 줄 append. 같은 키가 또 오면 다음 기록으로 쌓인다
+- replay: 같은 키의 기록을 순서대로 돌려주고 (다 쓰면 처음부터), 없으면 CassetteMiss
+- timing=True 면 재생할 때도 기록된 첫 조각 / 조각 사이 시간만큼 기다린다 (처리량 벤치용)
+
+주의: 키는 조립이 끝난 프롬프트 전체로 만든다. 그 안에 최근 대화 맥락(recent_context)이 들어가고
+맥락은 응답마다 바뀌므로, 재생은 기록할 때와 같은 상태에서 시작해서 같은 요청을 같은 순서로 보낼 때만 맞는다.
+- 기록/재생 모두 빈 맥락 폴더(recent_context.STORAGE_DIR 를 새 임시 폴더로)에서 시작할 것
+  (scripts/bench_model_gateway.py, bench_chat_ttft.py 는 실행마다 새 임시 폴더를 쓴다)
+- memory/ · identity/ · akashic/ 등 프롬프트에 들어가는 파일이 바뀌어도 키가 달라진다 → 다시 record
+- 실제 storage/ 로 띄운 서버에서 재생하면 대부분 CassetteMiss
+"""
+
+MODES = ("record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """replay 인데 이 요청의 기록이 없는 경우."""
+
+
+class CassetteChunk:
+    """genai 응답/스트림 조각처럼 .text 만 가진 객체."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+def _text(obj: Any) -> str:
+    # genai 응답/조각 중엔 텍스트가 없는 것(안전 필터 등)도 있다 → .text 접근이 예외를 낼 수 있음
+    try:
+        return obj.text or ""
+    except Exception:
+        return ""
+
+
+def _part_key(part: Any) -> Any:
+    if isinstance(part, (str, int, float, bool)) or part is None:
+        return part
+    if isinstance(part, dict):
+        return {str(k): _part_key(v) for k, v in sorted(part.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(part, (list, tuple)):
+        return [_part_key(p) for p in part]
+    tobytes = getattr(part, "tobytes", None)
+    if callable(tobytes):
+        # PIL 이미지 등: 픽셀 내용으로
+        return {"bytes_sha256": hashlib.sha256(tobytes()).hexdigest(), "size": list(getattr(part, "size", ()))}
+    return repr(part)
+
+
+def request_key(model: str, contents: Any, stream: bool, kwargs: Dict[str, Any]) -> str:
+    raw = json.dumps(
+        {"model": model, "stream": stream, "contents": _part_key(contents), "kwargs": _part_key(kwargs)},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CassetteModel:
+    def __init__(
+        self,
+        path: Path,
+        mode: str,
+        name: str,
+        inner: Any = None,
+        timing: bool = False,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"cassette mode 는 {MODES} 중 하나: {mode!r}")
+        if mode == "record" and inner is None:
+            raise ValueError("record 모드에는 기록할 실제 모델(inner)이 필요해요.")
+        self.path = path
+        self.mode = mode
+        self.name = name
+        self.inner = inner
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._records: Dict[str, List[dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                # 쓰다 끊긴 마지막 줄
+                continue
+            self._records.setdefault(rec["key"], []).append(rec)
+        print(f"[cassette] {self.path.name}: {sum(len(v) for v in self._records.values())} records")
+
+    def _append(self, rec: dict) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._records.setdefault(rec["key"], []).append(rec)
+
+    def _next(self, key: str) -> dict:
+        with self._lock:
+            recs = self._records.get(key)
+            if not recs:
+                raise CassetteMiss(f"cassette {self.path.name} 에 이 요청 기록이 없음 (key {key[:12]})")
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            return recs[i % len(recs)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "path": str(self.path), "records": sum(len(v) for v in self._records.values())}
+
+    # ---- genai.GenerativeModel 흉내 ----
+
+    def generate_content(self, contents: Any, stream: bool = False, **kwargs: Any):
+        key = request_key(self.name, contents, stream, kwargs)
+        if self.mode == "record":
+            if stream:
+                return self._record_stream(key, contents, kwargs)
+            t0 = time.perf_counter()
+            resp = self.inner.generate_content(contents, **kwargs)
+            self._append({"key": key, "model": self.name, "stream": False, "chunks": [_text(resp)],
+                          "delays": [round(time.perf_counter() - t0, 4)]})
+            return resp
+
+        rec = self._next(key)
+        if stream:
+            return self._replay_stream(rec)
+        if self.timing:
+            time.sleep(sum(rec.get("delays") or []))
+        return CassetteChunk("".join(rec["chunks"]))
+
+    def _record_stream(self, key: str, contents: Any, kwargs: Dict[str, Any]) -> Iterator[Any]:
+        chunks: List[str] = []
+        delays: List[float] = []
+        t = time.perf_counter()
+        for chunk in self.inner.generate_content(contents, stream=True, **kwargs):
+            now = time.perf_counter()
+            chunks.append(_text(chunk))
+            delays.append(round(now - t, 4))
+            t = now
+            yield chunk
+        # 끝까지 받은 스트림만 기록 (중간에 끊기면 안 남긴다)
+        self._append({"key": key, "model": self.name, "stream": True, "chunks": chunks, "delays": delays})
+
+    def _replay_stream(self, rec: dict) -> Iterator[CassetteChunk]:
+        delays = rec.get("delays") or []
+        for i, text in enumerate(rec["chunks"]):
+            if self.timing and i < len(delays):
+                time.sleep(delays[i])
+            yield CassetteChunk(text)
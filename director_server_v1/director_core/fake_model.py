@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+"""
+가짜 스트리밍 모델 (v1).
+
+Gemini 없이(오프라인) director → 포털 → chat.html 스트리밍 경로를 돌려 보고
+첫 토큰까지 걸리는 시간(TTFT)을 재기 위한 자리.
+
+    DIRECTOR_MODEL_BACKEND=fake uvicorn main:app --port 8897
+
+genai.GenerativeModel 과 같은 모양으로 쓴다:
+- generate_content(contents)              → .text 가 있는 응답 하나
+- generate_content(contents, stream=True) → .text 가 있는 조각들을 차례로 내주는 이터레이터
+
+지연은 env 로 조절:
+- FAKE_MODEL_TTFT         첫 조각까지 지연(초, 기본 0.8)
+- FAKE_MODEL_TTFT_JITTER  첫 조각 지연의 표준편차(초, 기본 0 → 항상 같은 지연)
+- FAKE_MODEL_CHUNK_DELAY  조각 사이 지연(초, 기본 0.05)
+- FAKE_MODEL_CHUNK_CHARS  조각당 글자 수 (기본 8)
+- FAKE_MODEL_REPLY_CHARS  응답 전체 글자 수 (기본 400)
+
+실패 주입 (서버 오류 경로 확인용):
+- FAKE_MODEL_FAIL_RATE    호출이 시작하자마자 FakeModelError 로 실패할 확률 (기본 0)
+- FAKE_MODEL_FAIL_MID     스트림이 절반쯤 조각을 낸 뒤 끊길 확률 (기본 0)
+- FAKE_MODEL_EMPTY_RATE   텍스트 없는 응답(안전 필터처럼 빈 조각만)을 낼 확률 (기본 0)
+- FAKE_MODEL_SEED         지연/실패를 뽑는 seed (기본 0)
+
+지연·실패는 (seed, 프롬프트, 같은 프롬프트가 몇 번째인지) 로 정해지므로
+같은 요청들을 다시 보내면 동시에 보내도 같은 결과가 나온다.
+"""
+
+
+class FakeModelError(RuntimeError):
+    """실패 주입으로 일부러 낸 오류."""
+
+
+class FakeChunk:
+    """genai 응답/스트림 조각처럼 .text 만 가진 객체."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class FakeStreamingModel:
+    def __init__(
+        self,
+        ttft: float = 0.8,
+        chunk_delay: float = 0.05,
+        chunk_chars: int = 8,
+        reply_chars: int = 400,
+        ttft_jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        fail_mid: float = 0.0,
+        empty_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.ttft = ttft
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = max(1, chunk_chars)
+        self.reply_chars = max(1, reply_chars)
+        self.ttft_jitter = max(0.0, ttft_jitter)
+        self.fail_rate = fail_rate
+        self.fail_mid = fail_mid
+        self.empty_rate = empty_rate
+        self.seed = seed
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeStreamingModel":
+        return cls(
+            ttft=float(os.getenv("FAKE_MODEL_TTFT", "0.8")),
+            chunk_delay=float(os.getenv("FAKE_MODEL_CHUNK_DELAY", "0.05")),
+            chunk_chars=int(os.getenv("FAKE_MODEL_CHUNK_CHARS", "8")),
+            reply_chars=int(os.getenv("FAKE_MODEL_REPLY_CHARS", "400")),
+            ttft_jitter=float(os.getenv("FAKE_MODEL_TTFT_JITTER", "0")),
+            fail_rate=float(os.getenv("FAKE_MODEL_FAIL_RATE", "0")),
+            fail_mid=float(os.getenv("FAKE_MODEL_FAIL_MID", "0")),
+            empty_rate=float(os.getenv("FAKE_MODEL_EMPTY_RATE", "0")),
+            seed=int(os.getenv("FAKE_MODEL_SEED", "0")),
+        )
+
+    # ---- 응답 만들기 ----
+
+    def _reply_for(self, contents: Any) -> str:
+        # 프롬프트 끝부분(보통 마지막 사용자 발화)을 되풀이해서 정해진 길이를 채운다.
+        if isinstance(contents, (list, tuple)):
+            prompt = next((c for c in reversed(contents) if isinstance(c, str)), "")
+            images = sum(1 for c in contents if not isinstance(c, str))
+        else:
+            prompt, images = str(contents), 0
+
+        tail = " ".join(prompt.split()[-12:]) or "..."
+        text = f"(fake) 프롬프트 {len(prompt)}자"
+        text += f", 이미지 {images}장 받았어. " if images else " 받았어. "
+        while len(text) < self.reply_chars:
+            text += tail + " "
+        return text[: self.reply_chars].rstrip()
+
+    def _chunks(self, text: str) -> List[str]:
+        n = self.chunk_chars
+        return [text[i:i + n] for i in range(0, len(text), n)]
+
+    def _draw(self, text: str) -> random.Random:
+        # 호출마다 쓰는 난수: 같은 응답 텍스트(= 같은 프롬프트)의 n 번째 호출이면 언제나 같은 값
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            n = self._seen.get(digest, 0)
+            self._seen[digest] = n + 1
+        return random.Random(f"{self.seed}:{digest}:{n}")
+
+    # ---- genai.GenerativeModel 흉내 ----
+
+    def generate_content(self, contents: Any, stream: bool = False, **kwargs: Any):
+        text = self._reply_for(contents)
+        rng = self._draw(text)
+        ttft = max(0.0, rng.gauss(self.ttft, self.ttft_jitter)) if self.ttft_jitter else self.ttft
+        if rng.random() < self.fail_rate:
+            time.sleep(ttft)
+            raise FakeModelError("fake model: 주입된 실패")
+        cut = len(self._chunks(text)) // 2 if stream and rng.random() < self.fail_mid else None
+        # 빈 응답 뽑기는 맨 뒤에 (앞의 지연/실패 값은 empty_rate 와 상관없이 예전과 같게)
+        empty = rng.random() < self.empty_rate
+        if stream:
+            return self._stream(text, ttft, cut, empty)
+        # 한 번에 받는 경우도 스트림이 다 끝날 때까지 걸리는 시간만큼 기다린다.
+        time.sleep(ttft + self.chunk_delay * max(0, len(self._chunks(text)) - 1))
+        return FakeChunk("" if empty else text)
+
+    def _stream(self, text: str, ttft: float, cut: Optional[int] = None, empty: bool = False) -> Iterator[FakeChunk]:
+        time.sleep(ttft)
+        for i, piece in enumerate(self._chunks(text)):
+            if i == cut:
+                raise FakeModelError("fake model: 주입된 스트림 중간 끊김")
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk("" if empty else piece)
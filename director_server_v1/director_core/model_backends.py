@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+"""
+모델 백엔드 고르기 (v1).
+
+main.py(ModelGateway) 와 prompt_assembler.call_model 이 같은 자리에서 모델을 받아 간다.
+돌려주는 것은 "모델 이름 → generate_content 가 있는 객체" factory 하나.
+
+    from director_core.model_backends import make_model_factory
+
+    factory = make_model_factory()          # DIRECTOR_MODEL_BACKEND 를 본다
+    model = factory("gemini-2.0-flash")
+
+DIRECTOR_MODEL_BACKEND:
+- gemini   (기본) google.generativeai.GenerativeModel. GEMINI_API_KEY 필요
+- fake     director_core/fake_model.py 가짜 스트리밍 모델 (지연 분포 / 실패 주입은 FAKE_MODEL_* env)
+- cassette director_core/cassette_model.py 기록/재생
+    MODEL_CASSETTE         JSONL 경로 (기본 storage/model_cassette.jsonl)
+    MODEL_CASSETTE_MODE    replay (기본) / record
+    MODEL_CASSETTE_INNER   record 때 실제로 부를 백엔드 (기본 gemini, fake 도 가능)
+    MODEL_CASSETTE_TIMING  1 이면 재생도 기록된 시간만큼 기다림 (처리량 벤치용)
+    재생은 기록할 때와 같은 (빈) 맥락 폴더에서 같은 요청 순서로 시작해야 맞는다 (키에 최근 대화 맥락이 들어감,
+    cassette_model.py 주의 참고). 실제 storage/ 를 쓰는 서비스에서는 쓰지 말 것
+
+gemini 패키지는 gemini 백엔드를 고를 때만 import 한다 → fake / cassette 재생은 키도 패키지도 없이 돈다.
+"""
+
+BACKENDS = ("gemini", "fake", "cassette")
+DEFAULT_CASSETTE = Path(__file__).resolve().parents[1] / "storage" / "model_cassette.jsonl"
+
+
+def _gemini_factory() -> Callable[[str], Any]:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY env가 필요해요.")
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel
+
+
+def make_model_factory(backend: Optional[str] = None) -> Callable[[str], Any]:
+    """backend(없으면 DIRECTOR_MODEL_BACKEND) → 모델 이름을 받아 모델을 만드는 함수."""
+    backend = (backend or os.getenv("DIRECTOR_MODEL_BACKEND", "gemini")).strip().lower()
+
+    if backend == "gemini":
+        return _gemini_factory()
+
+    if backend == "fake":
+        from director_core.fake_model import FakeStreamingModel
+
+        # 이름이 달라도 같은 가짜 모델 (지연/실패 seed 상태를 하나로)
+        fake = FakeStreamingModel.from_env()
+        return lambda name: fake
+
+    if backend == "cassette":
+        from director_core.cassette_model import CassetteModel
+
+        path = Path(os.getenv("MODEL_CASSETTE", str(DEFAULT_CASSETTE)))
+        mode = os.getenv("MODEL_CASSETTE_MODE", "replay").strip().lower()
+        timing = os.getenv("MODEL_CASSETTE_TIMING", "0") == "1"
+        inner: Optional[Callable[[str], Any]] = None
+        if mode == "record":
+            inner_backend = os.getenv("MODEL_CASSETTE_INNER", "gemini").strip().lower()
+            if inner_backend == "cassette":
+                raise ValueError("MODEL_CASSETTE_INNER 는 cassette 가 될 수 없어요.")
+            inner = make_model_factory(inner_backend)
+        print(f"[model_backends] cassette {mode}: {path}")
+        return lambda name: CassetteModel(path, mode, name, inner=inner(name) if inner else None, timing=timing)
+
+    raise ValueError(f"DIRECTOR_MODEL_BACKEND 는 {BACKENDS} 중 하나: {backend!r}")
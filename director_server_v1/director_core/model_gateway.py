@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+"""
+모델 호출 게이트웨이 (v1).
+
+예전 /chat 은 async def 안에서 blocking generate_content 를 그대로 불러서
+응답 하나가 길어지면 director 전체(/health 포함)가 그동안 멈췄다.
+
+    from director_core.model_gateway import ModelGateway, ModelBusy
+
+    gateway = ModelGateway(genai.GenerativeModel, default_model="gemini-2.0-flash", max_workers=4)
+    resp = await gateway.generate(contents)                 # .text 가 있는 응답 하나
+    async for chunk in gateway.stream(contents): ...        # 스트림 조각들
+
+역할:
+- 모델 이름마다 클라이언트(GenerativeModel 등)를 한 번만 만들어서 프로세스 내내 재사용
+- 모델 호출은 크기가 정해진 전용 스레드풀(max_workers)에서 → 이벤트 루프는 안 막힘
+  자리가 안 나면 queue_timeout 초 뒤 ModelBusy (포털 DirectorClient 와 같은 방식)
+- 스트림은 조각 하나 받을 때마다 스레드풀로 보내고, 스트림이 끝날 때까지 자리 하나 차지
+- stats(): 동시 실행 수 / 대기 수 / 최고 동시 실행 수 / 호출·오류 수 / 최근 지연 p50·p95 (첫 조각 포함)
+
+genai 의 generate_content_async 대신 스레드풀을 쓰는 이유: fake 모델과 같은 경로로 돌고,
+스트림 이터레이터가 동기라 어차피 스레드가 필요하다.
+"""
+
+_DONE = object()
+
+
+class ModelBusy(Exception):
+    """동시 호출 한도가 꽉 차서 queue_timeout 안에 자리가 안 난 경우."""
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+class _Latency:
+    """최근 max_samples 개 지연(ms)."""
+
+    def __init__(self, max_samples: int = 256) -> None:
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def add(self, ms: float) -> None:
+        self._samples.append(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        values = list(self._samples)
+        if not values:
+            return {"n": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "n": len(values),
+            "p50_ms": round(_percentile(values, 0.5), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "max_ms": round(max(values), 1),
+        }
+
+
+class ModelGateway:
+    """모델 클라이언트 캐시 + 전용 스레드풀 + 지표."""
+
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        default_model: str,
+        max_workers: int = 4,
+        queue_timeout: float = 60.0,
+    ) -> None:
+        self.factory = factory
+        self.default_model = default_model
+        self.max_workers = max(1, max_workers)
+        self.queue_timeout = queue_timeout
+
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._peak = 0
+        self._calls = 0
+        self._errors = 0
+        self._busy = 0
+        self._latency: Dict[str, _Latency] = {"generate": _Latency(), "stream": _Latency(), "stream#ttft": _Latency()}
+
+    # ---- 수명 ----
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model")
+        self._sem = asyncio.Semaphore(self.max_workers)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # 돌고 있는 호출은 끝까지 기다리지 않는다 (종료가 모델 응답에 묶이지 않게)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._sem = None
+
+    def model(self, name: Optional[str] = None) -> Any:
+        """모델 이름 → 재사용하는 클라이언트 (처음 한 번만 factory 호출)."""
+        name = name or self.default_model
+        model = self._models.get(name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = self.factory(name)
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": sorted(self._models),
+            "max_workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "peak_in_flight": self._peak,
+            "calls": self._calls,
+            "errors": self._errors,
+            "busy": self._busy,
+            "latency": {kind: lat.summary() for kind, lat in self._latency.items()},
+        }
+
+    # ---- 호출 ----
+
+    async def _acquire(self) -> Tuple[asyncio.AbstractEventLoop, ThreadPoolExecutor]:
+        if self._executor is None or self._sem is None:
+            raise RuntimeError("ModelGateway.start() 전에 호출됨")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._busy += 1
+            raise ModelBusy(f"모델 호출 {self.max_workers}개가 {self.queue_timeout:.0f}초 동안 안 끝남")
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        self._calls += 1
+        self._peak = max(self._peak, self._in_flight)
+        return asyncio.get_running_loop(), self._executor
+
+    def _release(self, sem: asyncio.Semaphore) -> None:
+        self._in_flight -= 1
+        sem.release()
+
+    async def generate(self, contents: Any, model: Optional[str] = None, **kwargs: Any) -> Any:
+        """generate_content(contents, **kwargs) 를 스레드풀에서 한 번."""
+        client = self.model(model)
+        sem = self._sem
+        loop, executor = await self._acquire()
+        t0 = time.perf_counter()
+        try:
+            resp = await loop.run_in_executor(executor, lambda: client.generate_content(contents, **kwargs))
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._release(sem)
+        self._latency["generate"].add((time.perf_counter() - t0) * 1000)
+        return resp
+
+    async def stream(self, contents: Any, model: Optional[str] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        """generate_content(contents, stream=True) 조각들. 조각마다 스레드풀에서 next()."""
+        client = self.model(model)
+        sem = self._sem
+        loop, executor = await self._acquire()
+        t0 = time.perf_counter()
+        first = True
+        try:
+            it = await loop.run_in_executor(
+                executor, lambda: iter(client.generate_content(contents, stream=True, **kwargs))
+            )
+            while True:
+                chunk = await loop.run_in_executor(executor, next, it, _DONE)
+                if chunk is _DONE:
+                    break
+                if first:
+                    first = False
+                    self._latency["stream#ttft"].add((time.perf_counter() - t0) * 1000)
+                yield chunk
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._release(sem)
+        self._latency["stream"].add((time.perf_counter() - t0) * 1000)
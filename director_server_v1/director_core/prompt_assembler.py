@@ -389,18 +389,29 @@ def select_burned_room_snippets(user_input: str, max_items: int = 4) -> List[str
     return snippets
 
 import os
-import google.generativeai as genai
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
+from director_core.model_backends import make_model_factory
+
 # Gemini Flash 2.5 설정
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# 키 확인 / genai.configure 는 처음 call_model 할 때 (DIRECTOR_MODEL_BACKEND 에 따라, model_backends.py)
+# → 프롬프트 조립만 쓰는 쪽(벤치, fake / cassette 백엔드)은 키 없이 import 된다
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY 환경 변수가 설정되어 있지 않습니다.")
+# 모델 이름마다 모델 하나를 만들어 두고 재사용 (호출마다 새로 만들지 않게)
+_models: Dict[str, Any] = {}
+_factory: Optional[Callable[[str], Any]] = None
+
 
-genai.configure(api_key=GEMINI_API_KEY)
+def _get_model(name: str) -> Any:
+    global _factory
+    model = _models.get(name)
+    if model is None:
+        if _factory is None:
+            _factory = make_model_factory()
+        model = _models[name] = _factory(name)
+    return model
 
 
 def call_model(system_prompt: str) -> str:
@@ -417,16 +428,16 @@ def call_model(system_prompt: str) -> str:
     이 모두가 하나의 텍스트로 합쳐져 있다.
     이 문자열을 그대로 모델에 전달해서 "한 번에" 답변을 받는다.
     """
-    model = genai.GenerativeModel(GEMINI_MODEL)
-
     try:
+        model = _get_model(GEMINI_MODEL)
+        # GenerationConfig 대신 같은 내용의 dict (genai 가 그대로 받음, cassette 키도 안정적)
         response = model.generate_content(
             system_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.9,
-                max_output_tokens=512,
-            ),
+            generation_config={
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "max_output_tokens": 512,
+            },
         )
     except Exception as e:
         # 서버 로그에만 에러를 남기고, 사용자에게는 부드럽게 설명
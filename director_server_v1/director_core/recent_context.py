@@ -1,21 +1,31 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
 """
 부감독용 최근 대화 맥락 엔진 (v1).
 
 main.py 에서:
 
-    from director_core.recent_context import RecentContext
+    from director_core.recent_context import RecentContextStore
 
 로 import 해서 사용한다.
 
 역할:
 - 최근 대화 N턴을 JSON 파일에 저장
 - LLM 호출 전에 recent_messages 리스트로 건네주기
+
+RecentContext 는 부를 때마다 파일 전체를 읽고/쓰는 단순판,
+RecentContextStore 는 뇌 서버 프로세스에 상주하는 판이고,
+RecentContextSessions 는 채널 · 사용자 · 업로드 프로필마다 따로 RecentContextStore 를 들고 있는다 (main.py 는 이쪽을 쓴다).
 """
 
 # project root = spacetiming-studio
@@ -93,4 +103,410 @@ class RecentContext:
         """
         if max_turns is None or max_turns >= len(self.messages):
             return list(self.messages)
-        return self.messages[-max_turns:]
\ No newline at end of file
+        return self.messages[-max_turns:]
+
+
+# ---- 상주판 (journal + 스냅샷) ----
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _parse_messages(data: bytes) -> List[Dict[str, Any]]:
+    try:
+        messages = json.loads(data.decode("utf-8")) if data.strip() else []
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return []
+    return messages if isinstance(messages, list) else []
+
+
+def _max_seq(messages: List[Dict[str, Any]]) -> int:
+    # 예전 스냅샷의 메시지는 seq 가 없다 (0 으로 본다)
+    return max((m.get("seq") or 0 for m in messages if isinstance(m, dict)), default=0)
+
+
+def _entry(message: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {"role": message.get("role", "user"), "content": message.get("content") or ""}
+    if message.get("id"):
+        entry["id"] = message["id"]
+    return entry
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RecentContextStore:
+    """프로세스에 상주하는 최근 대화 맥락.
+
+    /chat 마다 recent_context.json 전체를 읽고 indent=2 로 다시 쓰던 것을 대신한다.
+
+    - 기준은 메모리의 messages. 바꾸는 것은 lock 안에서만 (동시 요청이 서로의 추가분을 덮어쓰지 않음)
+    - 바뀔 때마다 journal(recent_context.journal.jsonl) 에 한 줄만 덧붙인다 → 요청 하나 = 작은 append 한 번
+    - journal 이 compact_every 줄을 넘으면 스냅샷(recent_context.json)을 임시 파일 → rename 으로 새로 쓰고 journal 을 비운다
+    - journal 첫 줄에는 그 journal 이 이어 붙는 스냅샷의 해시(base)를 적어 둔다
+        시작할 때 스냅샷 해시가 base 와 같으면 journal 을 다시 적용하고,
+        다르면(스냅샷만 새로 쓰고 죽었거나, 리셋으로 echo '[]' > recent_context.json 했거나) journal 은 버린다
+    - 쓰다 끊긴 마지막 줄은 건너뛴다
+
+    맥락 동기화 (seq):
+    - 들어오는 메시지(클라이언트 발화 / 부감독 응답)마다 1씩 늘어나는 seq 를 붙인다 (리셋해도 줄지 않음)
+    - 클라이언트는 마지막으로 받은 seq 를 base_seq 로 같이 보내고, 새 메시지만 보낸다 (add_messages)
+    - 부감독 응답도 여기 들어간다 (add_reply) → 창에는 user / assistant 가 번갈아 한 번씩
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Path = STORAGE_PATH,
+        journal_path: Optional[Path] = None,
+        max_turns: int = 32,
+        compact_every: int = 64,
+        fsync: bool = False,
+    ) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or snapshot_path.with_name(f"{snapshot_path.stem}.journal.jsonl")
+        self.max_turns = max_turns
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self.messages: List[Dict[str, Any]] = []
+        self.seq = 0
+        self._base = ""
+        self._journal = None
+        self._journal_ops = 0
+
+        # 통계
+        self._appends = 0
+        self._compactions = 0
+        self._errors = 0
+
+    # ---- 시작 / 정지 ----
+
+    def open(self) -> None:
+        """스냅샷 + journal 로 메모리를 복구한다. journal 이 온전하면 그 뒤에 이어 쓰고, 아니면 스냅샷으로 접어 둔다."""
+        with self._lock:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                raw = self.snapshot_path.read_bytes()
+            except FileNotFoundError:
+                raw = b""
+            self.messages = _parse_messages(raw)
+            self.seq = _max_seq(self.messages)
+
+            base = _digest(raw)
+            replayed, clean = self._replay(base)
+            if clean and replayed < self.compact_every:
+                # (세션이 LRU 에서 밀려났다가 다시 열릴 때 대부분 여기 → 파일 쓰기 없음)
+                self._base = base
+                self._journal_ops = replayed
+            else:
+                self._compact()
+
+    def _replay(self, base: str) -> Tuple[int, bool]:
+        """journal 을 메모리에 적용. (적용한 줄 수, 이어 써도 되는 온전한 journal 인지)."""
+        try:
+            with self.journal_path.open("r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0, False
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except json.JSONDecodeError:
+            header = {}
+        # seq 는 스냅샷이 바뀌었어도 줄이지 않는다 (클라이언트 커서가 거꾸로 가지 않게)
+        self.seq = max(self.seq, int(header.get("seq") or 0))
+        if header.get("base") != base:
+            if len(lines) > 1:
+                print(f"[recent_context] {self.snapshot_path.name}: snapshot replaced since journal began → journal ignored")
+            return 0, False
+        replayed = 0
+        for line in lines[1:]:
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                # 쓰다 끊긴 마지막 줄
+                return replayed, False
+            self._apply(op)
+            replayed += 1
+        return replayed, lines[-1].endswith("\n")
+
+    def close(self) -> None:
+        # 끌 때 스냅샷을 새로 쓰지 않는다: journal 은 이미 디스크에 있고,
+        # 리셋(echo '[]' > recent_context.json → 재시작) 한 파일을 메모리 내용으로 덮어쓰면 안 되니까.
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # ---- 조작 ----
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        if op.get("clear"):
+            self.messages = []
+        for m in op.get("add") or []:
+            self.messages.append(m)
+            self.seq = max(self.seq, m.get("seq") or 0)
+        if len(self.messages) > self.max_turns:
+            self.messages = self.messages[-self.max_turns :]
+
+    def add_messages(
+        self,
+        messages: Iterable[Dict[str, Any]],
+        base_seq: Optional[int] = None,
+        max_turns: int | None = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """클라이언트 메시지를 합치고 (journal 한 줄), 같은 lock 안에서 (프롬프트용 최근 목록, 합친 뒤 seq) 를 돌려준다.
+
+        base_seq 가 있으면 델타: messages 는 그 클라이언트가 base_seq 뒤로 새로 쓴 것만.
+            id 가 이미 창에 있는 것(응답을 못 받고 다시 보낸 것)만 건너뛴다.
+        base_seq 가 없으면 예전 방식: 전체 목록을 다시 보냈을 수 있으므로
+            창 끝과 겹치는 앞부분은 이미 있는 것으로 보고 나머지만 붙인다.
+        """
+        items = [_entry(m) for m in messages]
+        with self._lock:
+            self._add(self._fresh(items, base_seq))
+            return self._recent(max_turns), self.seq
+
+    def add_reply(self, content: str, reply_id: Optional[str] = None) -> int:
+        """부감독 응답을 맥락에 넣고 seq 를 돌려준다 (클라이언트가 다음 base_seq 로 쓸 값).
+
+        reply_id("<user 메시지 id>:reply") 가 이미 창에 있으면 (다시 보낸 메시지에 대한 두 번째 응답) 넣지 않는다.
+        """
+        with self._lock:
+            entry = _entry({"role": "assistant", "content": content, "id": reply_id})
+            self._add(self._fresh([entry], base_seq=self.seq))
+            return self.seq
+
+    def add(self, role: str, content: str) -> None:
+        with self._lock:
+            self._add([{"role": role, "content": content}])
+
+    def _fresh(self, items: List[Dict[str, Any]], base_seq: Optional[int]) -> List[Dict[str, Any]]:
+        if base_seq is not None:
+            ids = {m.get("id") for m in self.messages if m.get("id")}
+            return [it for it in items if not it.get("id") or it["id"] not in ids]
+        window = [(m.get("role"), m.get("content")) for m in self.messages]
+        keys = [(it["role"], it["content"]) for it in items]
+        # keys[:j] 의 끝이 창의 끝과 겹치는 가장 큰 j → 그 뒤만 새것
+        for j in range(len(keys), 0, -1):
+            k = min(j, len(window))
+            if k and keys[j - k : j] == window[-k:]:
+                return items[j:]
+        return items
+
+    def _add(self, items: List[Dict[str, Any]]) -> None:
+        if not items:
+            return
+        for it in items:
+            self.seq += 1
+            it["seq"] = self.seq
+        op = {"add": items}
+        self._apply(op)
+        self._append(op)
+
+    def clear(self) -> None:
+        """전체 로그 초기화 (이 순간부터 다시 시작용)."""
+        with self._lock:
+            self.messages = []
+            self._compact(adopt_external=False)
+
+    def _recent(self, max_turns: int | None) -> List[Dict[str, Any]]:
+        if max_turns is None or max_turns >= len(self.messages):
+            return list(self.messages)
+        return self.messages[-max_turns:]
+
+    def extract_for_prompt(self, max_turns: int | None = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._recent(max_turns)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.messages)
+
+    # ---- 디스크 (lock 잡은 채로 부른다) ----
+
+    def _append(self, op: Dict[str, Any]) -> None:
+        try:
+            if self._journal is None:
+                self._journal = self.journal_path.open("a", encoding="utf-8")
+            self._journal.write(json.dumps(op, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._appends += 1
+            self._journal_ops += 1
+        except OSError as e:
+            # 저장 실패해도 서버가 죽지는 않게 (메모리에는 남아 있고, 다음 접기 때 스냅샷으로)
+            self._errors += 1
+            print(f"[recent_context] journal append error: {e}")
+            return
+        if self._journal_ops >= self.compact_every:
+            self._compact()
+
+    def _compact(self, adopt_external: bool = True) -> None:
+        """메모리 → 스냅샷, journal 은 새 base 로 비운다."""
+        try:
+            if adopt_external and self._base:
+                # 돌아가는 동안 누가 스냅샷을 바꿨으면(리셋) 그쪽을 따른다
+                try:
+                    raw = self.snapshot_path.read_bytes()
+                except FileNotFoundError:
+                    raw = b""
+                if _digest(raw) != self._base:
+                    print("[recent_context] snapshot replaced outside → reloaded")
+                    self.messages = _parse_messages(raw)
+
+            data = json.dumps(self.messages, ensure_ascii=False, indent=2).encode("utf-8")
+            # 순서: 스냅샷 먼저 → 그다음 journal. 사이에 죽으면 journal 의 base 가 안 맞아 버려진다 (스냅샷에 이미 다 있음)
+            _atomic_write(self.snapshot_path, data)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._base = _digest(data)
+            header = {"base": self._base, "seq": self.seq}
+            _atomic_write(self.journal_path, (json.dumps(header) + "\n").encode("utf-8"))
+            self._journal_ops = 0
+            self._compactions += 1
+        except OSError as e:
+            self._errors += 1
+            print(f"[recent_context] compaction error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "messages": len(self.messages),
+                "seq": self.seq,
+                "journal_ops": self._journal_ops,
+                "appends": self._appends,
+                "compactions": self._compactions,
+                "errors": self._errors,
+            }
+
+
+# ---- 세션별 맥락 (LRU) ----
+
+SESSIONS_DIR_NAME = "sessions"
+DEFAULT_CHANNEL = "portal"
+DEFAULT_USER = "default"
+DEFAULT_PROFILE = "local_default"
+_KEY_PART_RE = re.compile(r"[^0-9A-Za-z_-]+")
+
+
+class RecentContextSessions:
+    """세션(채널 · 사용자 · 업로드 프로필)마다 따로인 최근 대화 맥락.
+
+    포털 / 사이드바 확장 / 텔레그램이 한 창(32칸)을 같이 쓰면 서로의 메시지가 섞이고 밀려나서,
+    세션 키마다 RecentContextStore 를 하나씩 둔다.
+
+    - 기본 세션(portal · default · local_default) 은 예전 그대로 storage/recent_context.json (리셋 방법도 그대로), 항상 메모리에
+    - 나머지는 storage/sessions/<키>.json (+ .journal.jsonl)
+    - 메모리에는 최근에 쓴 max_live 개만 (LRU). 밀려난 세션은 journal 이 이미 디스크에 있으니 닫기만 하고,
+      다시 오면 파일에서 다시 연다 → 채팅방이 몇 개 열려 있어도 메모리는 max_live × max_turns 메시지
+    - 요청이 쓰고 있는 세션은 밀어내지 않는다 (session() 안에서만 쓰기)
+    """
+
+    def __init__(self, storage_dir: Path = STORAGE_DIR, max_live: int = 32, **store_kwargs: Any) -> None:
+        self.storage_dir = storage_dir
+        self.max_live = max_live
+        self.store_kwargs = store_kwargs
+        self.default_key = self.key(None, None, None)
+
+        self._lock = threading.Lock()
+        self._live: "OrderedDict[str, RecentContextStore]" = OrderedDict()
+        self._users: Dict[str, int] = {}
+
+        # 통계
+        self._opened = 0
+        self._evicted = 0
+
+    @staticmethod
+    def key(channel: Optional[str], user_id: Optional[str], upload_profile: Optional[str]) -> str:
+        parts = (channel or DEFAULT_CHANNEL, user_id or DEFAULT_USER, upload_profile or DEFAULT_PROFILE)
+        safe = ".".join(_KEY_PART_RE.sub("_", p)[:48] for p in parts)
+        if safe == ".".join(parts):
+            return safe
+        # 바꾼 글자가 있으면 원래 값 해시를 붙여서 다른 세션끼리 파일이 겹치지 않게
+        return f"{safe}-{_digest('.'.join(parts).encode('utf-8'))[:8]}"
+
+    def _path(self, key: str) -> Path:
+        if key == self.default_key:
+            return self.storage_dir / STORAGE_PATH.name
+        return self.storage_dir / SESSIONS_DIR_NAME / f"{key}.json"
+
+    # ---- 시작 / 정지 ----
+
+    def open(self) -> None:
+        """기본 세션을 startup 때 미리 복구해 둔다 (나머지는 처음 쓸 때)."""
+        with self.session(self.default_key):
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            for store in self._live.values():
+                store.close()
+            self._live.clear()
+            self._users.clear()
+
+    # ---- 세션 ----
+
+    @contextmanager
+    def session(self, key: str) -> Iterator[RecentContextStore]:
+        """key 세션의 맥락. with 블록 안에서는 밀려나지 않는다."""
+        store = self._acquire(key)
+        try:
+            yield store
+        finally:
+            self._release(key)
+
+    def _acquire(self, key: str) -> RecentContextStore:
+        with self._lock:
+            store = self._live.get(key)
+            if store is None:
+                path = self._path(key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                store = RecentContextStore(path, **self.store_kwargs)
+                store.open()
+                self._live[key] = store
+                self._opened += 1
+            self._live.move_to_end(key)
+            self._users[key] = self._users.get(key, 0) + 1
+            self._evict()
+            return store
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            users = self._users.get(key, 0) - 1
+            if users > 0:
+                self._users[key] = users
+            else:
+                self._users.pop(key, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        # 오래 안 쓴 것부터, 쓰는 중인 세션과 기본 세션은 건너뛴다 (다 쓰는 중이면 잠깐 max_live 를 넘는다)
+        for key in list(self._live):
+            if len(self._live) <= self.max_live:
+                return
+            if key == self.default_key or key in self._users:
+                continue
+            self._live.pop(key).close()
+            self._evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = len(self._live)
+            default = self._live.get(self.default_key)
+        return {
+            "live": live,
+            "max_live": self.max_live,
+            "opened": self._opened,
+            "evicted": self._evicted,
+            "default": default.stats() if default is not None else None,
+        }
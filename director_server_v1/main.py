@@ -1,33 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 
+from director_core.model_backends import make_model_factory
+from director_core.model_gateway import ModelGateway
 from director_core.prompt_assembler import assemble_director_prompt
-from director_core.recent_context import RecentContext
+from director_core.recent_context import RecentContextSessions
 
 import os
+import json
 from pathlib import Path
-import google.generativeai as genai
 from PIL import Image as PILImage
 
-UPLOAD_ROOT = Path("/mnt/sowon_cloud/chat_uploads").resolve()
-UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+# 포털과 같은 두 단계 업로드 저장소: 로컬(UPLOAD_LOCAL_ROOT, 포털이 먼저 받는 곳) → 없으면 NAS(UPLOAD_NAS_ROOT).
+# 여기서는 읽기만 하므로 import 때 mkdir 하지 않는다 (NAS 마운트가 멈춰도 startup 은 안 막힘).
+UPLOAD_ROOT = Path(
+    os.getenv("UPLOAD_LOCAL_ROOT", str(Path(__file__).resolve().parents[1] / "uploads"))
+).resolve()
+UPLOAD_NAS_ROOT = Path(os.getenv("UPLOAD_NAS_ROOT", "/mnt/sowon_cloud/chat_uploads"))
+UPLOAD_ROOTS = (UPLOAD_ROOT, UPLOAD_NAS_ROOT)
 
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")  # 실제 모델 이름에 맞게 수정 가능
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY env가 필요해요.")
+# 모델 백엔드: gemini (기본) / fake (가짜 스트리밍 모델) / cassette (기록/재생)
+# → director_core/model_backends.py. fake / cassette 는 Gemini 키·네트워크 없이 돈다
+MODEL_BACKEND = os.getenv("DIRECTOR_MODEL_BACKEND", "gemini").strip().lower()
+# 동시에 도는 모델 호출 수 (전용 스레드풀 크기). 넘치면 MODEL_QUEUE_TIMEOUT 초까지 줄 서서 기다림
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "4"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "60"))
+
+_model_factory = make_model_factory(MODEL_BACKEND)
 
-genai.configure(api_key=GEMINI_API_KEY)
-_model = genai.GenerativeModel(GEMINI_MODEL)
+# 모델 이름마다 클라이언트 하나를 재사용, 호출은 이벤트 루프 밖 스레드풀에서
+_gateway = ModelGateway(
+    _model_factory,
+    default_model=GEMINI_MODEL,
+    max_workers=MODEL_MAX_CONCURRENCY,
+    queue_timeout=MODEL_QUEUE_TIMEOUT,
+)
 
 
 def call_model(system_prompt: str) -> str:
-    """Gemini Flash 2.0 한 번 호출해서 텍스트만 꺼내오는 자리."""
-    resp = _model.generate_content(system_prompt)
+    """Gemini Flash 2.0 한 번 호출해서 텍스트만 꺼내오는 자리. (동기: 스레드 안에서만 쓸 것)"""
+    resp = _gateway.model().generate_content(system_prompt)
     # resp.text 있으면 그거, 아니면 파트들 합쳐서 반환
     if getattr(resp, "text", None):
         return resp.text
@@ -41,12 +62,31 @@ def call_model(system_prompt: str) -> str:
         return "부감독: 응답 파싱 중 에러가 나서 원문을 보여주진 못했어."
 
 
-app = FastAPI(title="Spacetime Director Core")
+# 최근 대화 맥락은 프로세스에 상주 (요청마다 파일 전체를 읽고 쓰지 않고 journal 에 한 줄만)
+# 채널 · 사용자 · 업로드 프로필마다 따로, 메모리에는 최근에 쓴 RECENT_CONTEXT_MAX_SESSIONS 개만
+RECENT_CONTEXT_FSYNC = os.getenv("RECENT_CONTEXT_FSYNC", "0") == "1"
+RECENT_CONTEXT_MAX_SESSIONS = int(os.getenv("RECENT_CONTEXT_MAX_SESSIONS", "32"))
+_contexts = RecentContextSessions(max_live=RECENT_CONTEXT_MAX_SESSIONS, fsync=RECENT_CONTEXT_FSYNC)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 기본(포털) 세션을 스냅샷 + journal 로 복구 (지난번에 쓰다 죽었어도 마지막 온전한 줄까지)
+    _contexts.open()
+    _gateway.start()
+    yield
+    _gateway.close()
+    _contexts.close()
+
+
+app = FastAPI(title="Spacetime Director Core", lifespan=lifespan)
 
 
 class ChatMessage(BaseModel):
     role: str
     content: str
+    # 클라이언트 메시지 id (포털이 client_message_id 로 채움) → 다시 보낸 것을 맥락에 두 번 넣지 않는다
+    id: Optional[str] = None
 
 
 class AttachmentMeta(BaseModel):
@@ -55,119 +95,259 @@ class AttachmentMeta(BaseModel):
     size: Optional[int] = None
     url: Optional[str] = None
     server_path: Optional[str] = None
+    thumb_url: Optional[str] = None
+    model_url: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     attachments: Optional[List[AttachmentMeta]] = None
     upload_profile: Optional[str] = None
+    # 클라이언트가 마지막으로 받은 맥락 seq. 있으면 messages 는 그 뒤 새 메시지만 (없으면 예전처럼 전체 목록일 수 있음)
+    base_seq: Optional[int] = None
+    # 맥락 세션 = (channel, user_id, upload_profile). 없으면 portal / default / local_default
+    channel: Optional[str] = None
+    user_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     reply: str
+    # 이번 턴(응답 포함)까지 합친 맥락 seq → 클라이언트의 다음 base_seq
+    seq: Optional[int] = None
 
 
-@app.post("/chat")
-async def chat(req: "ChatRequest"):
-    """
-    director_core recent_context + 부감독 프롬프트 + Gemini 호출
-    """
+def _session_key(req: "ChatRequest") -> str:
+    return RecentContextSessions.key(req.channel, req.user_id, req.upload_profile)
+
+
+def _build_prompt(req: "ChatRequest") -> Tuple[str, int]:
+    """recent_context 갱신 + 부감독 프롬프트 조립 (/chat, /chat/stream 공통)."""
     # 첨부 파일 메타정보는 req.attachments 로 들어온다.
     # assemble_director_prompt 호출 시 attachments 인자로 넘겨서,
     # 프롬프트 상단에 [첨부 파일 정보] 블럭으로 간단히 요약해 준다.
-    # 1) 최근 대화 컨텍스트 로드/업데이트
-    ctx = RecentContext()
-    ctx.load()
-
-    for m in req.messages:
-        ctx.add(m.role, m.content)
-
-    ctx.save()
-
-    # 2) 프롬프트에 넣을 최근 대화 뽑기
-    recent_for_prompt = ctx.extract_for_prompt(max_turns=32)
+    # 1) 최근 대화 컨텍스트에 새 메시지 합치기 + 2) 프롬프트에 넣을 최근 대화 뽑기 (한 lock 안에서, 디스크는 journal 한 줄)
+    with _contexts.session(_session_key(req)) as ctx:
+        recent_for_prompt, seq = ctx.add_messages(
+            (m.model_dump() for m in req.messages), base_seq=req.base_seq, max_turns=32
+        )
     user_input = req.messages[-1].content if req.messages else ""
 
     # 3) 부감독 인격 프롬프트 조립
-    final_prompt = assemble_director_prompt(
+    prompt = assemble_director_prompt(
         recent_messages=recent_for_prompt,
         user_input=user_input,
         max_recent=32,
         attachments=[a.model_dump() for a in (req.attachments or [])] or None,
     )
+    return prompt, seq
 
-    # 4) Gemini 호출 (이미지가 있으면 함께 넘김)
-    try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-
-        image_parts = []
-        for att in req.attachments or []:
-            # 1) 이 첨부가 이미지인지 판별 (MIME type 또는 확장자 기반)
-            name_lower = (att.name or "").lower()
-            is_ext_image = name_lower.endswith(
-                (".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".bmp")
-            )
-            is_type_image = bool(att.type and att.type.startswith("image/"))
-            if not (is_type_image or is_ext_image):
-                continue
 
-            candidate_paths = []
+def _reply_id(req: "ChatRequest") -> Optional[str]:
+    # 응답은 "<마지막 user 메시지 id>:reply" 로 맥락에 넣는다 (포털 히스토리의 client_id 와 같은 모양)
+    for m in reversed(req.messages):
+        if m.role == "user":
+            return f"{m.id}:reply" if m.id else None
+    return None
 
-            # (a) url 기반 경로 추출
-            if att.url:
-                rel = att.url.lstrip("/")  # "/uploads/..." 또는 "uploads/..."
-                img_rel = Path(rel)
 
-                if str(img_rel).startswith("uploads/"):
-                    try:
-                        img_rel = img_rel.relative_to("uploads")  # "local_default/IMG_3001.jpeg"
-                    except ValueError:
-                        img_rel = Path(str(img_rel)[len("uploads/"):])
-                    candidate_paths.append(UPLOAD_ROOT / img_rel)
-                else:
-                    if img_rel.is_absolute():
-                        candidate_paths.append(img_rel)
-                    else:
-                        candidate_paths.append(UPLOAD_ROOT / img_rel)
-
-            # (b) server_path 가 있으면 그쪽도 후보에 추가
-            if att.server_path:
-                sp = Path(att.server_path)
-                if sp.is_absolute():
-                    candidate_paths.append(sp)
-                else:
-                    candidate_paths.append(UPLOAD_ROOT / sp)
+def _add_reply(req: "ChatRequest", reply: str) -> int:
+    # 모델을 기다리는 동안 세션이 밀려났어도 여기서 다시 연다 (journal 은 디스크에 있음)
+    with _contexts.session(_session_key(req)) as ctx:
+        return ctx.add_reply(reply, _reply_id(req))
 
-            # (c) 이름만 있을 때는 업로드 프로필 기준으로 추론
-            if att.name:
-                profile = req.upload_profile or "local_default"
-                candidate_paths.append(UPLOAD_ROOT / profile / att.name)
 
-            # 후보 경로들 중에서 실제 존재하는 첫 번째 파일을 연다
-            img_obj = None
-            for p in candidate_paths:
+def _manifest_blob(profile: str, name: str) -> Optional[Path]:
+    """포털 업로드 목록(<profile>/.manifest.jsonl, 로컬 → NAS)에서 이름 → blob 경로 (같은 이름은 마지막 줄)."""
+    for manifest_root in UPLOAD_ROOTS:
+        blob = None
+        try:
+            with (manifest_root / profile / ".manifest.jsonl").open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(entry, dict) and entry.get("name") == name and entry.get("blob"):
+                        blob = entry["blob"]
+        except OSError:
+            continue
+        if blob:
+            for root in UPLOAD_ROOTS:
                 try:
-                    if p.is_file():
-                        img_obj = PILImage.open(p)
-                        break
-                except Exception:
+                    if (root / blob).is_file():
+                        return root / blob
+                except OSError:
                     continue
+    return None
+
+
+def _derived_model_jpeg(model_url: str) -> Optional[Path]:
+    """/uploads/blobs/ab/<sha256><ext>/model → 포털이 만들어 둔 UPLOAD_ROOT/derived/ab/<sha256>.model.jpg"""
+    parts = model_url.rstrip("/").split("/")
+    if len(parts) < 2 or parts[-1] != "model":
+        return None
+    sha256 = parts[-2][:64]
+    if len(sha256) != 64:
+        return None
+    return UPLOAD_ROOT / "derived" / sha256[:2] / f"{sha256}.model.jpg"
+
+
+def _load_image_parts(req: "ChatRequest") -> list:
+    """첨부 중 이미지인 것들을 찾아서 PIL 이미지로 연다 (모델에 같이 넘길 것)."""
+    image_parts = []
+    for att in req.attachments or []:
+        # 1) 이 첨부가 이미지인지 판별 (MIME type 또는 확장자 기반)
+        name_lower = (att.name or "").lower()
+        is_ext_image = name_lower.endswith(
+            (".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".bmp")
+        )
+        is_type_image = bool(att.type and att.type.startswith("image/"))
+        if not (is_type_image or is_ext_image):
+            continue
 
-            if img_obj is not None:
-                image_parts.append(img_obj)
+        candidate_paths = []
 
-        if image_parts:
-            contents = image_parts + [final_prompt]
-            resp = model.generate_content(contents)
-        else:
-            resp = model.generate_content(final_prompt)
+        # (0) 포털이 미리 줄여 둔 모델용 JPEG (HEIC 도 JPEG 로 바뀌어 있음) 이 있으면 그걸 먼저
+        if att.model_url:
+            derived = _derived_model_jpeg(att.model_url)
+            if derived is not None:
+                candidate_paths.append(derived)
 
+        # (a) url 기반 경로 추출
+        if att.url:
+            rel = att.url.lstrip("/")  # "/uploads/..." 또는 "uploads/..."
+            img_rel = Path(rel)
+
+            if str(img_rel).startswith("uploads/"):
+                try:
+                    img_rel = img_rel.relative_to("uploads")  # "local_default/IMG_3001.jpeg"
+                except ValueError:
+                    img_rel = Path(str(img_rel)[len("uploads/"):])
+                candidate_paths.extend(root / img_rel for root in UPLOAD_ROOTS)
+            else:
+                if img_rel.is_absolute():
+                    candidate_paths.append(img_rel)
+                else:
+                    candidate_paths.extend(root / img_rel for root in UPLOAD_ROOTS)
+
+        # (b) server_path 가 있으면 그쪽도 후보에 추가
+        if att.server_path:
+            sp = Path(att.server_path)
+            if sp.is_absolute():
+                candidate_paths.append(sp)
+            else:
+                candidate_paths.extend(root / sp for root in UPLOAD_ROOTS)
+
+        # (c) 이름만 있을 때는 업로드 프로필 기준으로 추론
+        #     (예전 <profile>/<이름> 파일 → 없으면 포털 업로드 목록에서 이름 → blob)
+        if att.name:
+            profile = req.upload_profile or "local_default"
+            candidate_paths.extend(root / profile / att.name for root in UPLOAD_ROOTS)
+            blob_path = _manifest_blob(profile, att.name)
+            if blob_path is not None:
+                candidate_paths.append(blob_path)
+
+        # 후보 경로들 중에서 실제 존재하는 첫 번째 파일을 연다
+        img_obj = None
+        for p in candidate_paths:
+            try:
+                if p.is_file():
+                    img_obj = PILImage.open(p)
+                    break
+            except Exception:
+                continue
+
+        if img_obj is not None:
+            image_parts.append(img_obj)
+    return image_parts
+
+
+def _model_contents(req: "ChatRequest", final_prompt: str):
+    image_parts = _load_image_parts(req)
+    if image_parts:
+        return image_parts + [final_prompt]
+    return final_prompt
+
+
+def _chunk_text(chunk) -> str:
+    # 스트림 조각 중엔 텍스트가 없는 것(안전 필터 등)도 있다 → .text 접근이 예외를 낼 수 있음
+    try:
+        return chunk.text or ""
+    except Exception:
+        return ""
+
+
+@app.post("/chat")
+async def chat(req: "ChatRequest"):
+    """
+    director_core recent_context + 부감독 프롬프트 + Gemini 호출
+    """
+    # 프롬프트 조립 / 이미지 읽기 / 모델 호출은 전부 이벤트 루프 밖에서 (/health 가 안 막히게)
+    final_prompt, seq = await asyncio.to_thread(_build_prompt, req)
+
+    # 4) Gemini 호출 (이미지가 있으면 함께 넘김)
+    try:
+        contents = await asyncio.to_thread(_model_contents, req, final_prompt)
+        resp = await _gateway.generate(contents)
         reply_text = resp.text.strip() if hasattr(resp, "text") else str(resp)
+        # 5) 응답도 맥락에 (오류 문구는 넣지 않는다)
+        if reply_text:
+            seq = await asyncio.to_thread(_add_reply, req, reply_text)
     except Exception as e:
         reply_text = f"부감독 뇌 연결 중 오류가 있었어. (세부: {e})"
 
-    return {"reply": reply_text}
+    return {"reply": reply_text, "seq": seq}
+
+
+def _ndjson(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: "ChatRequest"):
+    """
+    /chat 과 같은 입력, 응답은 NDJSON 스트림 (application/x-ndjson).
+
+        {"delta": "..."}              모델이 조각을 낼 때마다
+        {"done": true, "reply": "...", "seq": N} 다 끝났을 때 (전체 응답, 응답까지 합친 맥락 seq)
+        {"error": "..."}               중간에 실패했을 때 (이 뒤로는 아무것도 안 옴)
+    """
+    final_prompt, seq = await asyncio.to_thread(_build_prompt, req)
+
+    async def gen() -> AsyncIterator[bytes]:
+        # 조각마다 모델 게이트웨이 스레드풀에서 받아 온다 (이벤트 루프 안 막음, 동시 스트림 수 제한)
+        parts: List[str] = []
+        try:
+            contents = await asyncio.to_thread(_model_contents, req, final_prompt)
+            async for chunk in _gateway.stream(contents):
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                parts.append(text)
+                yield _ndjson({"delta": text})
+        except Exception as e:
+            yield _ndjson({"error": f"부감독 뇌 연결 중 오류가 있었어. (세부: {e})"})
+            return
+        reply = "".join(parts).strip()
+        # 끝까지 받은 응답만 맥락에 (중간에 끊기면 안 넣는다).
+        # 빈 응답(안전 필터 등)이면 맥락은 그대로 → 질문까지 합친 seq 를 돌려준다
+        reply_seq = seq
+        if reply:
+            reply_seq = await asyncio.to_thread(_add_reply, req, reply)
+        yield _ndjson({"done": True, "reply": reply, "seq": reply_seq})
+
+    return StreamingResponse(
+        gen(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/health")
 async def health() -> Dict[str, Any]:
-    return {"status": "ok", "role": "director_core"}
+    return {
+        "status": "ok",
+        "role": "director_core",
+        "model_backend": MODEL_BACKEND,
+        "recent_context": _contexts.stats(),
+        "model_gateway": _gateway.stats(),
+    }
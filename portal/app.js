@@ -5,7 +5,14 @@
 
 const DIRECTOR_API_URL = "/api/chat";
 const UPLOAD_API_URL = "/api/upload";
+// 이보다 큰 파일은 이어 올리기 세션(/api/upload/sessions)으로: 끊겨도 서버가 받은 데부터 다시
+const UPLOAD_SESSIONS_URL = "/api/upload/sessions";
+const RESUMABLE_MIN_BYTES = 8 * 1024 * 1024;
+const RESUMABLE_MAX_RETRIES = 8;
+const RESUMABLE_STORE_KEY = "sowon_upload_sessions_v1";
 const DEFAULT_UPLOAD_PROFILE = "local_default";
+// 뇌 서버가 마지막으로 합쳐 준 맥락 seq. 새 메시지만 base_seq 와 같이 보내고, 응답의 seq 로 갱신한다.
+const CONTEXT_SEQ_KEY = "director_context_seq_v1";
 
 const chatListEl = document.getElementById("chat-list");
 const sessionMetaEl = document.getElementById("session-meta");
@@ -297,33 +304,179 @@ function renderAttachments() {
   updateSendButtonState();
 }
 
+function resumableKey(file) {
+  return [DEFAULT_UPLOAD_PROFILE, file.name, file.size, file.lastModified].join("|");
+}
+
+function loadResumableIds() {
+  try {
+    return JSON.parse(localStorage.getItem(RESUMABLE_STORE_KEY) || "{}") || {};
+  } catch (_) {
+    return {};
+  }
+}
+
+function rememberResumable(file, uploadId) {
+  const ids = loadResumableIds();
+  if (uploadId) ids[resumableKey(file)] = uploadId;
+  else delete ids[resumableKey(file)];
+  try {
+    localStorage.setItem(RESUMABLE_STORE_KEY, JSON.stringify(ids));
+  } catch (_) {}
+}
+
+async function fetchJson(url, options) {
+  const res = await fetch(url, options);
+  let data = null;
+  try {
+    data = await res.json();
+  } catch (_) {}
+  return { res, data };
+}
+
+async function openUploadSession(file) {
+  // 같은 파일로 하다 만 세션이 있으면 그걸 이어서 (페이지를 새로 열었어도)
+  const saved = loadResumableIds()[resumableKey(file)];
+  if (saved) {
+    try {
+      const { res, data } = await fetchJson(`${UPLOAD_SESSIONS_URL}/${saved}`);
+      if (res.ok && data && data.size === file.size) return data;
+    } catch (_) {}
+    rememberResumable(file, null);
+  }
+  const { res, data } = await fetchJson(UPLOAD_SESSIONS_URL, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      name: file.name,
+      size: file.size,
+      type: file.type || null,
+      upload_profile: DEFAULT_UPLOAD_PROFILE,
+    }),
+  });
+  if (!res.ok || !data) {
+    throw new Error(`Upload session failed (HTTP ${res.status})`);
+  }
+  rememberResumable(file, data.upload_id);
+  return data;
+}
+
+async function uploadResumable(file) {
+  const session = await openUploadSession(file);
+  const id = session.upload_id;
+  const chunkSize = session.chunk_size || RESUMABLE_MIN_BYTES;
+  let offset = session.offset || 0;
+  let failures = 0;
+
+  while (true) {
+    let res = null;
+    let data = null;
+    try {
+      if (offset < file.size) {
+        ({ res, data } = await fetchJson(`${UPLOAD_SESSIONS_URL}/${id}?offset=${offset}`, {
+          method: "PUT",
+          body: file.slice(offset, Math.min(file.size, offset + chunkSize)),
+        }));
+        if (res.ok) {
+          offset = data.offset;
+          failures = 0;
+          continue;
+        }
+      } else {
+        ({ res, data } = await fetchJson(`${UPLOAD_SESSIONS_URL}/${id}/complete`, { method: "POST" }));
+        if (res.ok) {
+          rememberResumable(file, null);
+          return data;
+        }
+      }
+    } catch (_) {
+      // 네트워크 끊김 → 아래에서 잠깐 쉬고 다시
+    }
+
+    if (res && res.status === 409 && data && data.detail && typeof data.detail.offset === "number") {
+      // 서버가 실제로 받은 데부터
+      offset = data.detail.offset;
+      continue;
+    }
+    if (res && res.status !== 409 && res.status < 500) {
+      // 세션이 없어졌거나(404) 너무 크거나(413) 내용이 다르면(422) 이어 올릴 수 없다
+      rememberResumable(file, null);
+      throw new Error(`Resumable upload failed (HTTP ${res.status})`);
+    }
+    failures += 1;
+    if (failures > RESUMABLE_MAX_RETRIES) {
+      // 세션은 남겨 둔다 → 같은 파일을 다시 보내면 여기서부터
+      throw new Error(`Resumable upload gave up at ${offset}/${file.size}`);
+    }
+    await new Promise((r) => setTimeout(r, Math.min(30000, 1000 * 2 ** (failures - 1))));
+    try {
+      const { res: st, data: info } = await fetchJson(`${UPLOAD_SESSIONS_URL}/${id}`);
+      if (st.ok && info && typeof info.offset === "number") offset = info.offset;
+    } catch (_) {}
+  }
+}
+
 async function uploadAttachments(files) {
   if (!files || !files.length) {
     return null;
   }
 
+  // 큰 파일은 하나씩 이어 올리기, 나머지는 한 번에 → 결과는 files 순서대로
+  const results = files.map(() => null);
+  for (let i = 0; i < files.length; i++) {
+    if (files[i].size >= RESUMABLE_MIN_BYTES) {
+      results[i] = await uploadResumable(files[i]);
+    }
+  }
+
   const formData = new FormData();
-  files.forEach((file) => {
+  const smallIdx = [];
+  files.forEach((file, i) => {
+    if (results[i]) return;
     formData.append("files", file);
+    smallIdx.push(i);
   });
-  formData.append("upload_profile", DEFAULT_UPLOAD_PROFILE);
 
-  const res = await fetch(UPLOAD_API_URL, {
-    method: "POST",
-    body: formData,
-  });
+  if (smallIdx.length) {
+    formData.append("upload_profile", DEFAULT_UPLOAD_PROFILE);
 
-  if (!res.ok) {
-    throw new Error(`Upload failed (HTTP ${res.status})`);
+    const res = await fetch(UPLOAD_API_URL, {
+      method: "POST",
+      body: formData,
+    });
+
+    if (!res.ok) {
+      throw new Error(`Upload failed (HTTP ${res.status})`);
+    }
+
+    const data = await res.json();
+    const uploaded = Array.isArray(data.files) ? data.files : [];
+    smallIdx.forEach((i, k) => {
+      results[i] = uploaded[k] || {};
+    });
   }
 
-  const data = await res.json();
-  return data;
+  return { files: results };
 }
 
-async function sendToDirector(text, attachmentMeta) {
+function loadContextSeq() {
+  const seq = parseInt(localStorage.getItem(CONTEXT_SEQ_KEY) || "", 10);
+  return Number.isFinite(seq) ? seq : 0;
+}
+
+function saveContextSeq(seq) {
+  // 앞으로만 (같은 메시지를 다시 보내서 예전 응답이 replay 되면 그때의 seq 가 온다)
+  if (typeof seq === "number" && seq > loadContextSeq()) {
+    localStorage.setItem(CONTEXT_SEQ_KEY, String(seq));
+  }
+}
+
+async function sendToDirector(text, attachmentMeta, clientMessageId) {
   // 첨부 파일 메타정보(이름/타입/크기/URL)는 payload.attachments에 넣어서 서버로 함께 보낸다.
   // 실제 바이너리 업로드는 /api/upload 에서 처리하고, 여기서는 메타만 전달한다.
+  // 맥락은 뇌 서버가 들고 있으므로 이번 메시지 하나 + 마지막으로 받은 seq 만 보낸다.
   const payload = {
     messages: [
       {
@@ -331,7 +484,11 @@ async function sendToDirector(text, attachmentMeta) {
         content: text,
       },
     ],
+    base_seq: loadContextSeq(),
   };
+  if (clientMessageId) {
+    payload.client_message_id = clientMessageId;
+  }
 
   // 첨부 파일 메타정보(이름/타입/크기)는 payload.attachments에 넣어서 서버로 함께 보낸다.
   // 아직 바이너리 업로드는 하지 않고, 나중에 app.py 확장 시 이 정보를 활용한다.
@@ -351,6 +508,7 @@ async function sendToDirector(text, attachmentMeta) {
     throw new Error(`HTTP ${res.status}`);
   }
   const data = await res.json();
+  saveContextSeq(data.seq);
   return data.reply || "(응답이 비었어.)";
 }
 
@@ -402,7 +560,7 @@ async function handleSend() {
 
     const displayText = (raw || "") + attachmentNote;
 
-    addMessage("user", displayText);
+    const userMsg = addMessage("user", displayText);
     composerInput.value = "";
     attachments = [];
     renderAttachments();
@@ -411,7 +569,7 @@ async function handleSend() {
     showTyping();
 
     // 3) 부감독에게는 텍스트 + 메타정보를 함께 보낸다.
-    const replyText = await sendToDirector(displayText, attachmentMeta);
+    const replyText = await sendToDirector(displayText, attachmentMeta, userMsg.id);
     clearTyping();
     addMessage("assistant", replyText);
   } catch (err) {
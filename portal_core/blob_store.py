@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import stat
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+Located = Tuple[Path, os.stat_result]
+
+from portal_core import upload_stream
+
+"""
+업로드 내용 주소(content-addressed) 저장소 (v1).
+
+같은 스크린샷/사진이 계속 다시 첨부되는데, 예전에는 <profile>/<원래 이름> 으로 저장해서
+- 같은 내용이면 NAS 에 또 쓰고
+- 이름이 같은 다른 파일이 오면 앞의 것을 덮어썼다.
+
+이제 실제 바이트는 해시로만 저장하고, 프로필마다 "이름 → blob" 목록을 따로 둔다.
+
+    UPLOAD_ROOT/blobs/ab/abcdef...(sha256).jpg     ← 내용이 같으면 한 벌, 절대 안 바뀜
+    UPLOAD_ROOT/<profile>/.manifest.jsonl          ← {"name", "sha256", "blob", "size", "type", "uploaded_at"} 한 줄씩
+                                                      (같은 이름은 마지막 줄이 이김)
+
+- URL(/uploads/blobs/...)은 내용이 바뀌지 않으므로 영원히 캐시해도 된다
+- 이미 있는 내용이면 다시 올려도 목록에 한 줄 추가만 (NAS 쓰기 없음)
+- root 는 로컬 디스크, fallback_roots(NAS)는 읽기만: 로컬에 없으면 거기서 찾는다
+  새로 쓴 blob / 목록 줄은 replicator(NasReplicator)가 뒤에서 NAS 로 옮긴다
+- 쓰는 쪽(put)의 중복 확인은 로컬만 본다 → 업로드는 NAS 가 멈춰도 안 기다린다
+  (NAS 에만 있던 내용이면 로컬에 한 벌 더 쓰고, replicator 는 같은 크기의 NAS 파일을 보면 건너뛴다)
+- locate / find / resolve 는 (경로, stat) 을 같이 돌려준다: NAS stat 도 부른 스레드 안에서 끝내서
+  이벤트 루프에서 다시 stat 하지 않게 (file_response(..., stat_result=) 로 넘긴다)
+
+    from portal_core.blob_store import BlobStore
+"""
+
+BLOB_DIR = "blobs"
+MANIFEST_NAME = ".manifest.jsonl"
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_EXT_RE = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+
+
+def blob_ext(name: str) -> str:
+    """원래 이름의 확장자 (정적 서빙 Content-Type 용). 이상하면 빈 문자열."""
+    ext = Path(name).suffix.lower()
+    return ext if _EXT_RE.match(ext) else ""
+
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_RE.match(value or ""))
+
+
+class ProfileManifest:
+    """프로필 하나의 이름 → blob 목록 (append-only jsonl, 처음 쓸 때 한 번 읽어 둔다)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            entries: Dict[str, Dict[str, Any]] = {}
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 끊긴 마지막 줄 등은 건너뛴다.
+                            continue
+                        if isinstance(entry, dict) and entry.get("name"):
+                            entries[entry["name"]] = entry
+            except FileNotFoundError:
+                # 아직 없음 (또는 NAS 가 안 붙어 있음) → 기억하지 않고 다음에 다시 본다
+                return entries
+            self._entries = entries
+        return self._entries
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load().get(name)
+
+    def lookup_blob(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """같은 내용(sha256)을 가리키는 항목 중 가장 나중 것 (이름은 달라도 됨)."""
+        with self._lock:
+            for entry in reversed(list(self._load().values())):
+                if entry.get("sha256") == sha256:
+                    return entry
+        return None
+
+    def record(self, entry: Dict[str, Any]) -> str:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            entries = self._load()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+            entries[entry["name"]] = entry
+        return line
+
+
+class BlobStore:
+    def __init__(self, root: Path, fallback_roots: Iterable[Path] = (), replicator=None) -> None:
+        self.root = root
+        self.fallback_roots = tuple(fallback_roots)
+        self.replicator = replicator
+        self._manifests: Dict[str, ProfileManifest] = {}
+        self._lock = threading.Lock()
+
+    def locate(self, rel: str, local_only: bool = False) -> Optional[Located]:
+        """root 기준 상대 경로를 로컬 → fallback(NAS) 순서로 찾아서 (경로, stat). local_only 면 로컬만."""
+        bases = (self.root,) if local_only else (self.root, *self.fallback_roots)
+        for base in bases:
+            path = base / rel
+            try:
+                st = os.stat(path)
+            except OSError:
+                # 없거나 NAS 가 빠졌으면 없는 것으로
+                continue
+            if stat.S_ISREG(st.st_mode):
+                return path, st
+        return None
+
+    # ---- blob ----
+
+    def blob_rel(self, sha256: str, ext: str) -> str:
+        return f"{BLOB_DIR}/{sha256[:2]}/{sha256}{ext}"
+
+    def blob_path(self, sha256: str, ext: str) -> Path:
+        return self.root / self.blob_rel(sha256, ext)
+
+    def find(self, sha256: str, ext: str, local_only: bool = False) -> Optional[Located]:
+        if not is_sha256(sha256):
+            return None
+        return self.locate(self.blob_rel(sha256, ext), local_only=local_only)
+
+    def put(self, received: upload_stream.ReceivedFile, ext: str) -> Tuple[Path, bool]:
+        """받은 임시 파일을 blob 으로. 로컬에 이미 있으면 임시 파일만 버린다. (경로, 새로 썼는지)"""
+        existing = self.find(received.sha256, ext, local_only=True)
+        if existing is not None:
+            upload_stream.discard(received)
+            return existing[0], False
+        path = upload_stream.commit(received, self.blob_path(received.sha256, ext))
+        if self.replicator is not None:
+            self.replicator.copy(self.blob_rel(received.sha256, ext))
+        return path, True
+
+    # ---- 이름 → blob 목록 ----
+
+    def manifest(self, profile_dir: Path) -> ProfileManifest:
+        key = str(profile_dir)
+        with self._lock:
+            m = self._manifests.get(key)
+            if m is None:
+                m = self._manifests[key] = ProfileManifest(profile_dir / MANIFEST_NAME)
+            return m
+
+    def link(
+        self,
+        profile_dir: Path,
+        name: str,
+        sha256: str,
+        ext: str,
+        size: int,
+        content_type: Optional[str],
+    ) -> Dict[str, Any]:
+        """프로필 목록에 이름 → blob 한 줄 추가하고 그 항목을 돌려준다."""
+        entry = {
+            "name": name,
+            "sha256": sha256,
+            "blob": self.blob_rel(sha256, ext),
+            "size": size,
+            "type": content_type,
+            "uploaded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        line = self.manifest(profile_dir).record(entry)
+        if self.replicator is not None:
+            self.replicator.append(str((profile_dir / MANIFEST_NAME).relative_to(self.root)), line)
+        return entry
+
+    def resolve(self, profile_dir: Path, name: str) -> Optional[Located]:
+        """<profile>/<name> 으로 찾을 때: 목록(로컬 → NAS)에 있으면 그 blob (경로, stat)."""
+        rel = profile_dir.relative_to(self.root)
+        for base in (self.root, *self.fallback_roots):
+            try:
+                entry = self.manifest(base / rel).lookup(name)
+            except OSError:
+                continue
+            if entry is not None:
+                return self.locate(entry["blob"])
+        return None
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from portal_core.history_entry import HistoryEntry
+
+"""
+불탄방 아카이브 사전 컴파일 (v1).
+
+akashic/burned_room_*.jsonl 은 런타임에 바뀌지 않는 고정 아카이브라서,
+요청마다 줄을 디코딩하고 HistoryItem 을 만들 필요가 없다.
+
+컴파일 결과 (tools/compile_burned_archive.py 로 미리 만들거나, 포털 startup 때 자동 생성):
+- <name>.compiled.json      : /api/history 응답 모양 그대로 직렬화된 항목들의 JSON 배열
+- <name>.compiled.idx.json  : 원본 파일 지문(size, mtime_ns) + 항목별 [id, 시작, 끝] 바이트 오프셋 표
+
+포털은 startup 때 한 번만 읽어서 들고 있다가
+- 항목 dict 가 필요하면 items[a:b] 를,
+- JSON 응답이면 payload 의 바이트 조각(fragments[a:b])을 그대로 이어 붙여서 쓴다.
+"""
+
+COMPILED_VERSION = 1
+
+
+def parse_burned_line(raw: bytes, ordinal: int) -> Optional[Dict[str, Any]]:
+    """불탄방 아카이브 한 줄 → /api/history 항목 dict. 본문이 없거나 깨진 줄이면 None.
+
+    id 가 없는 줄은 burned_<순번> 으로 채운다. (순번 = 본문 있는 항목 기준)
+    """
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    text = data.get("text") or data.get("content") or ""
+    if not text:
+        return None
+
+    return {
+        "id": data.get("id") or f"burned_{ordinal:04d}",
+        "role": data.get("role") or "assistant",
+        "content": text,
+        "timestamp": data.get("timestamp") or "",
+        "attachments": None,
+        "client_id": None,
+    }
+
+
+def _source_stamp(paths: List[Path]) -> List[Dict[str, Any]]:
+    stamp = []
+    for p in paths:
+        try:
+            st = p.stat()
+            stamp.append({"path": str(p), "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        except FileNotFoundError:
+            stamp.append({"path": str(p), "size": -1, "mtime_ns": 0})
+    return stamp
+
+
+class BurnedArchive:
+    """컴파일된 불탄방 아카이브 (읽기 전용, 프로세스당 한 번 로드)."""
+
+    def __init__(self, source_paths: List[str | Path], compiled_path: str | Path) -> None:
+        self.source_paths = [Path(p) for p in source_paths]
+        self.compiled_path = Path(compiled_path)
+        self.index_path = self.compiled_path.with_name(
+            self.compiled_path.name.replace(".json", "") + ".idx.json"
+        )
+
+        self.loaded = False
+        self.items: List[HistoryEntry] = []
+        self.fragments: List[memoryview] = []  # items[i] 의 직렬화된 JSON 바이트
+        self._first: Dict[str, int] = {}
+        self._last: Dict[str, int] = {}
+
+    # ---- 조회 ----
+
+    def __len__(self) -> int:
+        self.ensure_loaded()
+        return len(self.items)
+
+    def find_first(self, msg_id: str) -> Optional[int]:
+        self.ensure_loaded()
+        return self._first.get(msg_id)
+
+    def find_last(self, msg_id: str) -> Optional[int]:
+        self.ensure_loaded()
+        return self._last.get(msg_id)
+
+    def source_stamp(self) -> List[Dict[str, Any]]:
+        """원본 파일 지문 [(path, size, mtime_ns)...]. 원본이 바뀌었는지 비교할 때 쓴다."""
+        return _source_stamp(self.source_paths)
+
+    # ---- 컴파일 ----
+
+    def compile(self) -> Tuple[bytes, List[Tuple[str, int, int]]]:
+        """원본 JSONL 들을 읽어서 (JSON 배열 바이트, [(id, 시작, 끝)...]) 을 만든다."""
+        parts: List[bytes] = [b"["]
+        offsets: List[Tuple[str, int, int]] = []
+        pos = 1
+        ordinal = 0
+        for path in self.source_paths:
+            try:
+                f = path.open("rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                for raw in f:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+                    item = parse_burned_line(raw, ordinal)
+                    if item is None:
+                        continue
+                    ordinal += 1
+                    blob = json.dumps(item, ensure_ascii=False).encode("utf-8")
+                    if offsets:
+                        parts.append(b",")
+                        pos += 1
+                    offsets.append((item["id"], pos, pos + len(blob)))
+                    parts.append(blob)
+                    pos += len(blob)
+        parts.append(b"]")
+        return b"".join(parts), offsets
+
+    def write_compiled(self) -> int:
+        """컴파일해서 .compiled.json / .compiled.idx.json 으로 저장. 항목 수를 돌려준다."""
+        payload, offsets = self.compile()
+        self._write(payload, offsets)
+        return len(offsets)
+
+    def _write(self, payload: bytes, offsets: List[Tuple[str, int, int]]) -> None:
+        meta = {
+            "version": COMPILED_VERSION,
+            "sources": _source_stamp(self.source_paths),
+            "count": len(offsets),
+            "offsets": offsets,
+        }
+        self.compiled_path.parent.mkdir(parents=True, exist_ok=True)
+        # 배열 먼저, 인덱스는 나중에 바꿔 넣는다. (인덱스가 있으면 배열도 온전하다는 보장)
+        for path, data in (
+            (self.compiled_path, payload),
+            (self.index_path, json.dumps(meta, ensure_ascii=False).encode("utf-8")),
+        ):
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+    # ---- 로드 ----
+
+    def ensure_loaded(self) -> None:
+        if not self.loaded:
+            self.load()
+
+    def load(self) -> None:
+        """컴파일본이 원본과 맞으면 그대로 읽고, 없거나 낡았으면 다시 컴파일한다."""
+        loaded = self._load_compiled()
+        if loaded is None:
+            payload, offsets = self.compile()
+            try:
+                self._write(payload, offsets)
+            except OSError:
+                # 컴파일본을 못 써도 메모리에 만든 걸로 계속 간다.
+                pass
+            loaded = (payload, offsets)
+        self._install(*loaded)
+
+    def _load_compiled(self) -> Optional[Tuple[bytes, List[Tuple[str, int, int]]]]:
+        try:
+            meta = json.loads(self.index_path.read_bytes())
+            payload = self.compiled_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(meta, dict)
+            or meta.get("version") != COMPILED_VERSION
+            or meta.get("sources") != _source_stamp(self.source_paths)
+            or meta.get("count") != len(meta.get("offsets") or [])
+        ):
+            return None
+        offsets = [tuple(o) for o in meta["offsets"]]
+        if offsets and offsets[-1][2] + 1 != len(payload):
+            return None
+        return payload, offsets
+
+    def _install(self, payload: bytes, offsets: List[Tuple[str, int, int]]) -> None:
+        items = [HistoryEntry.from_dict(d) for d in json.loads(payload)] if payload else []
+        view = memoryview(payload)
+        self.items = items
+        self.fragments = [view[start:end] for _, start, end in offsets]
+        self._first = {}
+        self._last = {}
+        for pos, (msg_id, _, _) in enumerate(offsets):
+            self._first.setdefault(msg_id, pos)
+            self._last[msg_id] = pos
+        self.loaded = True
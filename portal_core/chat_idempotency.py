@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+"""
+/api/chat 중복 요청 합치기 (idempotency 키, v1).
+
+iOS Safari 재시도 / 전송 두 번 탭 때문에 같은 발화가 두 번 들어오면
+모델을 두 번 부르고 sowon.chat.jsonl 에 같은 턴이 두 번 남는다.
+클라이언트가 만든 키(Idempotency-Key 헤더 또는 client_message_id)로 묶어서:
+
+- 같은 키가 처리 중이면 → 새로 부르지 않고 그 결과를 같이 기다린다 (in-flight 합치기)
+- 같은 키가 ttl 초 안에 끝났으면 → 저장해 둔 결과를 그대로 돌려준다 (replay)
+- 실패한 요청은 남기지 않는다 → 재전송하면 다시 부른다
+- 같은 키인데 내용(fingerprint)이 다르면 IdempotencyConflict
+- max_in_flight 초가 지나도 안 끝난 항목(주인이 사라진 경우)은 취소해서 기다리던 쪽을 깨운다
+
+    from portal_core.chat_idempotency import IdempotencyCache, IdempotencyConflict, payload_fingerprint
+
+이벤트 루프 안에서만 쓴다 (락 없음).
+"""
+
+
+class IdempotencyConflict(Exception):
+    """같은 키로 내용이 다른 요청이 들어온 경우."""
+
+
+class _Entry(NamedTuple):
+    fingerprint: str
+    future: asyncio.Future
+    expires: float  # 처리 중이면 claim 후 max_in_flight 초, 끝났으면 ttl 초 뒤
+
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _consume_exception(fut: asyncio.Future) -> None:
+    # 기다리는 쪽이 없어도 "exception was never retrieved" 경고가 안 뜨게
+    if not fut.cancelled():
+        fut.exception()
+
+
+class IdempotencyCache:
+    def __init__(self, ttl: float = 600.0, max_entries: int = 1024, max_in_flight: float = 300.0) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_in_flight = max_in_flight
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._replayed = 0
+        self._joined = 0
+        self._claimed = 0
+
+    # ---- 조회 / 등록 ----
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires <= now]:
+            entry = self._entries.pop(key)
+            if not entry.future.done():
+                entry.future.cancel()
+
+    def lookup(self, key: str, fingerprint: str) -> Optional[asyncio.Future]:
+        """처리 중이거나 끝난 같은 키의 future. 없으면 None."""
+        self._purge()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.fingerprint != fingerprint:
+            raise IdempotencyConflict(f"같은 키({key})로 다른 내용의 요청")
+        if entry.future.done():
+            self._replayed += 1
+        else:
+            self._joined += 1
+        return entry.future
+
+    def claim(self, key: str, fingerprint: str) -> asyncio.Future:
+        """이 키를 처리하겠다고 등록. 끝나면 complete / fail 로 알려야 한다."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        fut.add_done_callback(_consume_exception)
+        self._entries[key] = _Entry(fingerprint, fut, time.monotonic() + self.max_in_flight)
+        # 주인이 complete / fail 없이 사라져도 기다리는 쪽이 영원히 매달리지 않게
+        loop.call_later(self.max_in_flight, self._abandon, key, fut)
+        self._claimed += 1
+        self._evict()
+        return fut
+
+    def complete(self, key: str, value: Any) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.future.done():
+            return
+        entry.future.set_result(value)
+        self._entries[key] = entry._replace(expires=time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+    def fail(self, key: str, exc: BaseException) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.future.done():
+            return
+        del self._entries[key]
+        if isinstance(exc, asyncio.CancelledError):
+            entry.future.cancel()
+        else:
+            entry.future.set_exception(exc)
+
+    def release(self, key: str, fut: asyncio.Future) -> None:
+        """claim 한 쪽이 complete / fail 없이 끝났을 때 (응답 본문이 한 번도 안 돈 채 끊긴 경우 등).
+
+        그 claim(fut) 이 아직 처리 중일 때만 취소한다 → 이미 끝났거나 같은 키로 새로 claim 된 항목은 그대로.
+        """
+        self._abandon(key, fut)
+
+    def _abandon(self, key: str, fut: asyncio.Future) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.future is fut and not fut.done():
+            del self._entries[key]
+            fut.cancel()
+
+    def _evict(self) -> None:
+        # 오래된 "끝난" 항목부터 버린다. 처리 중인 건 건드리지 않는다.
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [k for k, e in self._entries.items() if e.future.done()]:
+            if len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def start(self, key: str, fingerprint: str, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """claim + factory() 를 별도 태스크로 돌리고, 끝나면 알아서 complete / fail.
+
+        처음 요청한 쪽이 끊겨도(취소돼도) 같이 기다리는 요청은 결과를 받는다.
+        기다리는 쪽은 asyncio.shield(future) 로 기다린다.
+        """
+        fut = self.claim(key, fingerprint)
+        task = asyncio.ensure_future(factory())
+
+        def _settle(t: asyncio.Task) -> None:
+            if t.cancelled():
+                self.fail(key, asyncio.CancelledError())
+            elif t.exception() is not None:
+                self.fail(key, t.exception())
+            else:
+                self.complete(key, t.result())
+
+        task.add_done_callback(_settle)
+        return fut
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight = sum(1 for e in self._entries.values() if not e.future.done())
+        return {
+            "ttl": self.ttl,
+            "in_flight": in_flight,
+            "cached": len(self._entries) - in_flight,
+            "claimed": self._claimed,
+            "joined": self._joined,
+            "replayed": self._replayed,
+        }
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 가 없으면 파생본 없이 원본만 쓴다.
+    Image = None
+    ImageOps = None
+
+try:
+    import pillow_heif
+except ImportError:  # 없으면 HEIC 는 파생본을 못 만든다 (원본 그대로).
+    pillow_heif = None
+
+"""
+업로드 이미지 파생본(썸네일 / 모델용 JPEG) 만들기 (v1).
+
+chat.html 말풍선은 첨부 썸네일을 원본(/uploads/...) 그대로 그려서,
+히스토리를 다시 불러올 때마다 몇 MB 짜리 사진을 Wi-Fi 로 다시 받았다.
+업로드가 끝나면 백그라운드 프로세스 풀에서 blob 마다 두 가지를 만들어 둔다.
+
+    UPLOAD_ROOT/derived/ab/<sha256>.thumb.jpg   긴 변 320px  (말풍선 썸네일, 수십 KB)
+    UPLOAD_ROOT/derived/ab/<sha256>.model.jpg   긴 변 1600px (모델에 넘길 크기, HEIC → JPEG 변환 포함)
+
+- 파생본도 blob 내용으로 정해지므로 한 번 만들면 안 바뀐다 (immutable 캐시)
+- 같은 blob 을 동시에 요청하면 한 번만 만든다
+- Pillow 가 없으면 available() 이 False → 호출하는 쪽은 원본으로 대신한다
+  (HEIC 는 pillow-heif 까지 있어야 열린다). 둘 다 requirements.txt 에 있고,
+  빠져 있으면 startup 때 경고(warn_if_missing) + /health 의 derivatives.missing 에 표시
+
+    from portal_core.derivatives import DerivativePipeline
+"""
+
+DERIVED_DIR = "derived"
+# kind → (긴 변 최대 px, JPEG 품질)
+KINDS: Dict[str, tuple] = {
+    "thumb": (320, 75),
+    "model": (1600, 85),
+}
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".bmp"}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def missing_packages() -> List[str]:
+    """파생본에 필요한데 설치 안 된 패키지 이름들."""
+    missing = []
+    if Image is None:
+        missing.append("Pillow")
+    if pillow_heif is None:
+        missing.append("pillow-heif")
+    return missing
+
+
+def is_image_ext(ext: str) -> bool:
+    return ext.lower() in IMAGE_EXTS
+
+
+def derived_rel(sha256: str, kind: str) -> str:
+    return f"{DERIVED_DIR}/{sha256[:2]}/{sha256}.{kind}.jpg"
+
+
+# ---- 자식 프로세스에서 도는 부분 ----
+
+
+def _to_rgb(im):
+    # 투명 배경은 흰색으로 깔고, 팔레트/CMYK 등은 RGB 로
+    if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+        im = im.convert("RGBA")
+        bg = Image.new("RGB", im.size, (255, 255, 255))
+        bg.paste(im, mask=im.getchannel("A"))
+        return bg
+    if im.mode not in ("RGB", "L"):
+        return im.convert("RGB")
+    return im
+
+
+def render_derivatives(src: str, targets: Dict[str, str]) -> Dict[str, str]:
+    """src 이미지를 한 번 열어서 targets(kind → 경로) 를 다 만든다. 임시 파일 + rename."""
+    if pillow_heif is not None:
+        pillow_heif.register_heif_opener()
+
+    with Image.open(src) as opened:
+        im = _to_rgb(ImageOps.exif_transpose(opened))
+        for kind, path in targets.items():
+            max_px, quality = KINDS[kind]
+            out = im.copy()
+            out.thumbnail((max_px, max_px), Image.LANCZOS)  # 작은 이미지는 키우지 않는다
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            out.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, path)
+    return targets
+
+
+# ---- 포털 쪽 ----
+
+
+class DerivativePipeline:
+    def __init__(self, root: Path, max_workers: int = 1) -> None:
+        self.root = root
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # 열 수 없는 blob (이미지가 아님 / HEIC 인데 pillow-heif 없음) → 매번 다시 시도하지 않는다
+        self._unrenderable: Set[str] = set()
+        self._made = 0
+        self._failed = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 스레드가 여럿 도는 포털 프로세스를 fork 하지 않도록 spawn
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def warn_if_missing(self) -> None:
+        missing = missing_packages()
+        if missing:
+            print(
+                f"[derivatives] WARNING: {', '.join(missing)} 없음 → "
+                + ("썸네일/모델용 JPEG 없이 원본 그대로 보냄" if Image is None else "HEIC 는 변환 없이 원본 그대로 보냄")
+                + " (pip install -r requirements.txt)"
+            )
+
+    def path(self, sha256: str, kind: str) -> Path:
+        return self.root / derived_rel(sha256, kind)
+
+    def existing(self, sha256: str, kind: str) -> Optional[Path]:
+        p = self.path(sha256, kind)
+        return p if p.is_file() else None
+
+    async def ensure(self, sha256: str, src: Path) -> bool:
+        """모든 kind 파생본이 있게 만든다. 못 만들면(Pillow 없음/열 수 없는 형식) False."""
+        if not available() or sha256 in self._unrenderable:
+            return False
+        targets = {kind: str(self.path(sha256, kind)) for kind in KINDS if self.existing(sha256, kind) is None}
+        if not targets:
+            return True
+
+        fut = self._pending.get(sha256)
+        if fut is None:
+            try:
+                loop = asyncio.get_running_loop()
+                fut = loop.run_in_executor(self._executor(), render_derivatives, str(src), targets)
+            except BrokenProcessPool:
+                self._reset_pool()
+                return False
+            self._pending[sha256] = fut
+            fut.add_done_callback(lambda f: self._settle(sha256, src, f))
+        try:
+            await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return False
+        return True
+
+    def _settle(self, sha256: str, src: Path, fut: asyncio.Future) -> None:
+        # 통계/실패 기록은 여기서 한 번만 (같은 blob 을 기다리던 요청이 여럿이어도)
+        self._pending.pop(sha256, None)
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is None:
+            self._made += 1
+            return
+        self._failed += 1
+        if isinstance(exc, BrokenProcessPool):
+            # 워커가 죽었으면(메모리 부족 등) 풀을 버리고 다음 요청 때 새로 띄운다.
+            print(f"[derive] worker died: {exc}")
+            self._reset_pool()
+        else:
+            print(f"[derive] {src.name}: {exc}")
+            self._unrenderable.add(sha256)
+
+    def schedule(self, sha256: str, src: Path) -> None:
+        """업로드 응답을 기다리게 하지 않고 뒤에서 만든다."""
+        if not available():
+            return
+        task = asyncio.create_task(self.ensure(sha256, src))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _reset_pool(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        self._reset_pool()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": available(),
+            "heic": pillow_heif is not None,
+            "missing": missing_packages(),
+            "pending": len(self._pending),
+            "made": self._made,
+            "failed": self._failed,
+        }
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+"""
+포털 → 부감독 뇌(director_server_v1) 호출용 공용 비동기 클라이언트 (v1).
+
+app.py 의 lifespan 에서 하나 만들어서 /api/chat, /health 가 같이 쓴다.
+
+    from portal_core.director_client import DirectorClient, DirectorError
+
+역할:
+- httpx.AsyncClient 하나를 프로세스 내내 재사용 (keep-alive 연결 풀)
+  → 예전처럼 요청마다 blocking requests.post 로 이벤트 루프를 멈추지 않는다
+- 동시에 director 로 나가는 채팅 요청 수를 세마포어로 제한 (Pi 위 director 가 한꺼번에 몰리지 않게)
+  자리가 안 나면 queue_timeout 초 뒤 DirectorBusy
+- /health 는 채팅 세마포어를 안 거친다 (채팅이 밀려 있어도 상태 확인은 바로)
+- stream_lines: /chat/stream 같은 NDJSON 스트림을 한 줄씩 dict 로 (스트림이 끝날 때까지 자리 하나 차지)
+- latency_observer(kind, ms): 성공한 호출 지연을 알려 준다
+  (kind = 경로, 스트림 첫 줄까지는 "<경로>#ttft", 스트림 전체는 {"done"} 줄까지)
+"""
+
+
+class DirectorError(Exception):
+    """director 연결/응답 오류."""
+
+
+class DirectorBusy(DirectorError):
+    """동시 요청 한도가 꽉 차서 queue_timeout 안에 자리가 안 난 경우."""
+
+
+class DirectorClient:
+    """director_server_v1 호출용 공용 클라이언트 (연결 풀 + 동시 요청 제한)."""
+
+    def __init__(
+        self,
+        base_url: str,
+        max_concurrency: int = 4,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        queue_timeout: float = 30.0,
+        latency_observer: Optional[Callable[[str, float], None]] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.latency_observer = latency_observer
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+
+    # ---- 수명 ----
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise DirectorError("DirectorClient.start() 전에 호출됨")
+        return self._client
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+        }
+
+    # ---- 호출 ----
+
+    def _observe(self, kind: str, t0: float) -> None:
+        if self.latency_observer is not None:
+            self.latency_observer(kind, (time.perf_counter() - t0) * 1000)
+
+    async def _acquire(self) -> None:
+        if self._sem is None:
+            raise DirectorError("DirectorClient.start() 전에 호출됨")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise DirectorBusy(f"동시 요청 {self.max_concurrency}개가 {self.queue_timeout:.0f}초 동안 안 끝남")
+        finally:
+            self._waiting -= 1
+
+    async def post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """동시 요청 한도 안에서 POST → JSON. 연결/HTTP 오류는 DirectorError."""
+        await self._acquire()
+        self._in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.post(path, json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+            self._observe(path, t0)
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            raise DirectorError(str(e) or e.__class__.__name__) from e
+        finally:
+            self._in_flight -= 1
+            self._sem.release()
+
+    async def stream_lines(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """동시 요청 한도 안에서 POST → NDJSON 한 줄씩 dict. 연결/HTTP/파싱 오류는 DirectorError."""
+        await self._acquire()
+        self._in_flight += 1
+        t0 = time.perf_counter()
+        first = True
+        try:
+            async with self.client.stream("POST", path, json=payload) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if first:
+                        first = False
+                        self._observe(f"{path}#ttft", t0)
+                    msg = json.loads(line)
+                    if msg.get("done"):
+                        # 받는 쪽이 done 에서 바로 빠져나가므로 전체 시간은 여기서 잰다.
+                        self._observe(path, t0)
+                    yield msg
+        except (httpx.HTTPError, ValueError) as e:
+            raise DirectorError(str(e) or e.__class__.__name__) from e
+        finally:
+            self._in_flight -= 1
+            self._sem.release()
+
+    async def health(self, timeout: float = 3.0) -> str:
+        """director /health 의 status (실패하면 http_<code> / error: ... 문자열)."""
+        try:
+            r = await self.client.get("/health", timeout=timeout)
+        except (httpx.HTTPError, DirectorError) as e:
+            return f"error: {e}"
+        if r.is_success:
+            try:
+                return r.json().get("status", "ok")
+            except ValueError:
+                return "ok"
+        return f"http_{r.status_code}"
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+"""
+포털 /health 용 백그라운드 상태 수집기 (v1).
+
+예전에는 /health 를 찌를 때마다 director /health 를 직접 불러서 (최대 3초) 기다렸다.
+사이드바 확장이 30초마다 상태를 찍어 보는 용도라, 이제는:
+
+- HealthProber.run() 이 lifespan 에서 interval 초마다 한 번씩
+  director /health 상태 + 응답 시간, 큐 깊이(extra 콜백) 를 모아 스냅샷을 만든다
+- /health 는 마지막 스냅샷을 그대로 (age_s: 몇 초 전 것인지) → 기다림 없음
+- observe(kind, ms) 로 들어온 실제 모델 호출 지연(/chat, /chat/stream 첫 조각 등)을
+  최근 window 초 동안 모아서 /health/detail 에서 p50/p95 로 보여 준다
+
+    from portal_core.health_prober import HealthProber
+"""
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+class RollingLatency:
+    """최근 window 초 동안의 지연(ms) 샘플."""
+
+    def __init__(self, window: float = 300.0, max_samples: int = 512) -> None:
+        self.window = window
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+
+    def add(self, ms: float) -> None:
+        self._samples.append((time.monotonic(), ms))
+
+    def _trim(self) -> None:
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def summary(self) -> Dict[str, Any]:
+        self._trim()
+        values = [ms for _, ms in self._samples]
+        if not values:
+            return {"n": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "n": len(values),
+            "p50_ms": round(_percentile(values, 0.5), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "max_ms": round(max(values), 1),
+        }
+
+
+class HealthProber:
+    def __init__(
+        self,
+        director,
+        interval: float = 10.0,
+        window: float = 300.0,
+        extra: Optional[Callable[[], Dict[str, Any]]] = None,
+    ) -> None:
+        self.director = director
+        self.interval = interval
+        self.window = window
+        self.extra = extra
+
+        self._probe = RollingLatency(window)
+        self._observed: Dict[str, RollingLatency] = {}
+        self._snapshot: Dict[str, Any] = {"director_core_status": "unknown"}
+        self._sampled_at: Optional[float] = None
+
+    # ---- 실제 호출 지연 ----
+
+    def observe(self, kind: str, ms: float) -> None:
+        """실제 director 호출 지연 기록 (DirectorClient 의 latency_observer 로 건다)."""
+        window = self._observed.get(kind)
+        if window is None:
+            window = self._observed[kind] = RollingLatency(self.window)
+        window.add(ms)
+
+    # ---- 주기 샘플 ----
+
+    async def sample(self) -> None:
+        t0 = time.perf_counter()
+        status = await self.director.health()
+        probe_ms = (time.perf_counter() - t0) * 1000
+        self._probe.add(probe_ms)
+
+        snapshot: Dict[str, Any] = {
+            "director_core_status": status,
+            "director_probe_ms": round(probe_ms, 1),
+            "checked_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if self.extra is not None:
+            try:
+                snapshot.update(self.extra())
+            except Exception as e:
+                # 통계 모으다 실패해도 상태판은 계속 돈다.
+                snapshot["extra_error"] = str(e)
+        self._snapshot = snapshot
+        self._sampled_at = time.monotonic()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.sample()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[health] probe error: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ---- 읽기 ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """마지막 스냅샷 + age_s (아직 한 번도 못 찍었으면 None)."""
+        age = None if self._sampled_at is None else round(time.monotonic() - self._sampled_at, 1)
+        return {**self._snapshot, "age_s": age, "interval_s": self.interval}
+
+    def detail(self) -> Dict[str, Any]:
+        """스냅샷 + 최근 window 초 지연 p50/p95 + 사이드바 부하 막대용 load_pct."""
+        snap = self.snapshot()
+        # 부하는 지금 값으로 (stats() 는 카운터만 읽어서 싸다)
+        requests = self.director.stats()
+        busy = requests["in_flight"] + requests["waiting"]
+        limit = requests["max_concurrency"] or 1
+        return {
+            **snap,
+            "director_requests": requests,
+            "window_s": self.window,
+            "latency": {
+                "director_probe": self._probe.summary(),
+                **{kind: w.summary() for kind, w in sorted(self._observed.items())},
+            },
+            # 동시 요청 한도 대비 (나가 있는 + 자리 기다리는) 채팅 요청 비율
+            "load_pct": min(100, round(100 * busy / limit)),
+        }
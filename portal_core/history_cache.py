@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from portal_core.burned_archive import BurnedArchive
+from portal_core.history_entry import HistoryEntry
+from portal_core.history_store import (
+    HistoryPage,
+    dedup_key,
+    parse_portal_line,
+    tail_crc,
+)
+
+"""
+포털 히스토리 인메모리 캐시 (v1).
+
+app.py 에서 프로세스당 하나만 만들어서 쓴다.
+
+    from portal_core.history_cache import HistoryCache
+
+역할:
+- _load_history 가 만들던 "불탄방 + 포털(dedup, id 정렬)" 타임라인을 메모리에 계속 들고 있는다
+  (불탄방은 startup 때 한 번 로드한 BurnedArchive 를 그대로 쓰고, 포털 부분만 여기서 관리)
+- 요청마다 파일 stat 만 보고
+  - 그대로면 디스크를 안 읽고 바로 응답
+  - 뒤로만 자랐으면 늘어난 바이트만 파싱해서 끼워 넣기
+  - inode 가 바뀌었거나 크기가 줄었으면 (RESET_FLOW.md 의 `: >` 비우기 등) 전체 다시 로드
+    (비운 뒤 다시 자라서 크기로는 모를 때는 읽은 위치 직전 바이트의 crc 로 알아챈다)
+- HistoryWriter 가 쓴 줄은 push() 로 바로 밀어 넣고, 그만큼 읽은 위치도 같이 당겨서 다시 파싱하지 않는다
+"""
+
+
+_READ_BLOCK = 1 << 20  # 1 MB
+
+
+@dataclass
+class _FileState:
+    inode: int = 0
+    consumed: int = 0  # 여기까지(마지막 '\n' 직후)는 이미 파싱해서 캐시에 반영됨
+    anchor: Optional[int] = None  # consumed 직전 바이트들의 crc (None 이면 다음 확인 때 계산)
+
+
+class HistoryCache:
+    """불탄방 + 포털 히스토리 타임라인 캐시.
+
+    portal: id 기준으로 정렬된 포털 항목 리스트 (dedup 완료)
+    archive: 불탄방 아카이브 (파일 순서 그대로, 읽기 전용)
+    """
+
+    def __init__(self, portal_paths: List[str], archive: BurnedArchive) -> None:
+        self.portal_paths = [str(p) for p in portal_paths]
+        self.archive = archive
+        self.ready = False
+
+        self._lock = threading.RLock()
+        self._states: Dict[str, _FileState] = {}
+        self._portal: List[HistoryEntry] = []
+        self._portal_ids: List[str] = []  # bisect 용 (self._portal 과 같은 순서)
+        self._by_key: Dict[bytes, HistoryEntry] = {}  # dedup 다이제스트 → 항목
+
+    # ---- 조회 ----
+
+    def tail(self, limit: int = 400) -> HistoryPage:
+        """타임라인에서 가장 최근 limit개 (limit <= 0 이면 전체). 먼저 sync 한다."""
+        with self._lock:
+            self.sync()
+            total = len(self.archive) + len(self._portal)
+            return self._slice(max(0, total - limit) if limit > 0 else 0, total)
+
+    def page(
+        self,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 200,
+    ) -> HistoryPage:
+        """커서 페이지. 의미는 history_store.load_history_before / load_history_after 와 같다.
+
+        before=X → id 가 X 인 첫 항목 바로 앞 limit 개, after=X → 마지막 항목 바로 뒤 limit 개.
+        X 를 못 찾으면 빈 페이지. 페이지 양 끝의 같은 id 묶음은 가르지 않는다 (_slice).
+        """
+        with self._lock:
+            self.sync()
+            nb = len(self.archive)
+            if before is not None:
+                i = bisect.bisect_left(self._portal_ids, before)
+                if i < len(self._portal_ids) and self._portal_ids[i] == before:
+                    pos = nb + i
+                else:
+                    pos = self.archive.find_first(before)
+                    if pos is None:
+                        return HistoryPage(self.archive)
+                return self._slice(max(0, pos - limit), pos)
+
+            if after is not None:
+                j = bisect.bisect_right(self._portal_ids, after)
+                if j > 0 and self._portal_ids[j - 1] == after:
+                    pos = nb + j
+                else:
+                    last = self.archive.find_last(after)
+                    if last is None:
+                        return HistoryPage(self.archive)
+                    pos = last + 1
+                return self._slice(pos, pos + limit)
+
+        return self.tail(limit)
+
+    def _slice(self, a: int, b: int) -> HistoryPage:
+        """불탄방 + 포털을 이어 붙인 타임라인의 [a, b) 구간.
+
+        예전 초 단위 id 는 user/assistant 가 같을 수 있다. 양 끝이 같은 id 묶음 가운데면 묶음 끝까지 넓혀서
+        다음 before=(맨 앞 id) / after=(맨 뒤 id) 가 묶음의 나머지를 건너뛰지 않게 한다.
+        """
+        nb = len(self.archive)
+        total = nb + len(self._portal)
+        while 0 < a < total and self._id_at(a - 1) == self._id_at(a):
+            a -= 1
+        while a < b < total and self._id_at(b) == self._id_at(b - 1):
+            b += 1
+        portal = self._portal[max(0, a - nb):b - nb] if b > nb else []
+        return HistoryPage(self.archive, min(a, nb), min(b, nb), portal)
+
+    def _id_at(self, pos: int) -> str:
+        nb = len(self.archive)
+        return self.archive.items[pos].id if pos < nb else self._portal[pos - nb].id
+
+    # ---- 동기화 ----
+
+    def sync(self) -> None:
+        """파일 상태를 확인해서 캐시를 최신으로 맞춘다."""
+        with self._lock:
+            self.archive.ensure_loaded()
+            if self._needs_reload(self.portal_paths):
+                self._reload_portal()
+            else:
+                for path in self.portal_paths:
+                    for item in self._read_appended(path):
+                        self._insert(item)
+            self.ready = True
+
+    def _needs_reload(self, paths: List[str]) -> bool:
+        for path in paths:
+            state = self._states.get(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                if state is not None and state.consumed:
+                    return True
+                continue
+            if state is None:
+                return True
+            if st.st_ino != state.inode or st.st_size < state.consumed:
+                return True
+            if state.consumed and not self._anchor_ok(path, state):
+                # 같은 inode 로 비웠다가(`: >`) 다시 원래 크기 이상으로 자란 경우
+                return True
+        return False
+
+    def _anchor_ok(self, path: str, state: _FileState) -> bool:
+        try:
+            with open(path, "rb") as f:
+                crc = tail_crc(f, state.consumed)
+        except FileNotFoundError:
+            return False
+        if state.anchor is None:
+            state.anchor = crc
+        return crc == state.anchor
+
+    def _reload_portal(self) -> None:
+        self._portal = []
+        self._portal_ids = []
+        self._by_key = {}
+        for path in self.portal_paths:
+            self._states[path] = _FileState()
+            for item in self._read_appended(path):
+                self._insert(item)
+
+    def _read_appended(self, path: str) -> Iterator[HistoryEntry]:
+        """consumed 이후 새로 붙은 완성된 줄들을 블록 단위로 읽어 파싱하고 consumed 를 옮긴다.
+
+        파일 전체를 한 번에 읽지 않으므로 첫 로드 때도 최고 메모리가 "캐시 + 블록 하나" 정도로 유지된다.
+        """
+        state = self._states.setdefault(path, _FileState())
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_size <= state.consumed and st.st_ino == state.inode:
+                return
+            state.inode = st.st_ino
+            f.seek(state.consumed)
+            rest = b""
+            while True:
+                block = f.read(_READ_BLOCK)
+                if not block:
+                    break
+                buf = rest + block
+                # 개행 없이 끝난 꼬리 줄은 다음 블록과 잇거나, 아직 쓰는 중이면 다음 번에 읽는다.
+                end = buf.rfind(b"\n") + 1
+                rest = buf[end:]
+                if not end:
+                    continue
+                state.consumed += end
+                for line in buf[:end].split(b"\n"):
+                    if line.strip():
+                        item = parse_portal_line(line)
+                        if item is not None:
+                            yield item
+            state.anchor = tail_crc(f, state.consumed)
+
+    # ---- 삽입 ----
+
+    def _insert(self, item: HistoryEntry) -> None:
+        key = dedup_key(item)
+        old = self._by_key.get(key)
+        self._by_key[key] = item
+        if old is not None:
+            # 같은 발화가 다시 들어오면 (mac/pi 중복) 뒤에 읽은 쪽으로 자리만 교체한다.
+            lo = bisect.bisect_left(self._portal_ids, old.id)
+            for i in range(lo, len(self._portal)):
+                if self._portal[i] is old:
+                    self._portal[i] = item
+                    return
+
+        # 대부분은 가장 최신 id 라서 맨 뒤에 붙는다. 같은 id 끼리는 들어온 순서를 유지.
+        pos = bisect.bisect_right(self._portal_ids, item.id)
+        self._portal_ids.insert(pos, item.id)
+        self._portal.insert(pos, item)
+
+    def push(self, path: str, item: HistoryEntry, start: int, end: int) -> None:
+        """HistoryWriter 가 path 의 [start, end) 에 방금 쓴 한 줄(item)을 캐시에 바로 반영한다.
+
+        캐시가 읽은 위치가 정확히 start 였으면 end 로 당겨서 다음 sync 때 다시 파싱하지 않는다.
+        (그 사이 다른 프로세스가 끼어 썼다면 위치는 두고, 다음 sync 가 dedup 으로 정리한다.)
+        """
+        with self._lock:
+            if not self.ready:
+                return
+            state: Optional[_FileState] = self._states.get(str(path))
+            if state is not None and state.consumed == start:
+                self._advance(str(path), state, end)
+            self._insert(item)
+
+    def _advance(self, path: str, state: _FileState, end: int) -> None:
+        """읽은 위치를 end 로 당긴다. 그 사이 파일이 비워졌다 다시 자랐으면(crc 불일치) 두고 sync 에 맡긴다."""
+        try:
+            with open(path, "rb") as f:
+                if state.anchor is not None and tail_crc(f, state.consumed) != state.anchor:
+                    return
+                state.consumed = end
+                state.anchor = tail_crc(f, end)
+        except FileNotFoundError:
+            return
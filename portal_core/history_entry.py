@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+"""
+히스토리 항목 표현 (v1).
+
+포털/불탄방 히스토리 항목을 메모리에 들고 있을 때 쓰는 가벼운 모양.
+
+    from portal_core.history_entry import HistoryEntry, dedup_key
+
+- HistoryEntry: 튜플 기반 (NamedTuple) → 항목마다 dict/pydantic 객체를 두지 않는다.
+  필드 순서는 /api/history 응답(HistoryItem) 키 순서와 같다.
+- dedup_key: (id, role, content) 의 16바이트 blake2b 다이제스트.
+  예전처럼 "id|role|본문" 문자열을 키로 두면 본문 전체가 한 벌 더 메모리에 남는다.
+"""
+
+DEDUP_DIGEST_SIZE = 16
+
+
+class HistoryEntry(NamedTuple):
+    id: str
+    role: str
+    content: str
+    timestamp: str
+    attachments: Optional[list] = None
+    client_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistoryEntry":
+        return cls(
+            data.get("id") or "",
+            data.get("role") or "assistant",
+            data.get("content") or "",
+            data.get("timestamp") or "",
+            data.get("attachments"),
+            data.get("client_id"),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """HistoryItem 모양 dict (응답/SSE 용). 필요할 때만 만든다."""
+        return dict(zip(self._fields, self))
+
+    def to_json(self) -> bytes:
+        return json.dumps(self.as_dict(), ensure_ascii=False).encode("utf-8")
+
+
+def dedup_key(item: HistoryEntry) -> bytes:
+    # sowon.chat / sowon.chat.mac 에서 동일 발화가 중복되는 걸 막기 위한 키 (고정 크기 다이제스트)
+    h = hashlib.blake2b(digest_size=DEDUP_DIGEST_SIZE)
+    h.update(item.id.encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(item.role.encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(item.content.encode("utf-8"))
+    return h.digest()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set
+
+"""
+히스토리 푸시 채널 (v1).
+
+app.py 의 HistoryWriter 가 새 줄을 쓰면 (on_commit) publish() 하고,
+/api/history/stream (SSE) 구독자들이 subscribe() 로 받아간다.
+
+    from portal_core.history_events import HistoryBroadcaster
+
+역할:
+- 구독자마다 작은 asyncio.Queue 를 하나씩 둔다
+- publish 는 어느 스레드에서 불러도 된다 (구독자 이벤트 루프로 call_soon_threadsafe)
+- 큐가 가득 찬 느린 구독자는 overflowed 로 표시만 하고 버린다.
+  → 스트림이 끊기면 브라우저 EventSource 가 Last-Event-ID 로 다시 붙어서 빠진 구간을 replay 한다.
+"""
+
+
+class Subscription:
+    """구독자 한 명의 수신 큐."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def _offer(self, item: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """다음 항목. timeout 안에 없으면 None."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class HistoryBroadcaster:
+    """새 히스토리 항목을 모든 구독자에게 나눠 준다."""
+
+    def __init__(self, max_queue: int = 256) -> None:
+        self.max_queue = max_queue
+        self._subs: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self) -> Subscription:
+        """현재 이벤트 루프에 묶인 구독을 하나 만든다. (async 코드 안에서 불러야 한다)"""
+        sub = Subscription(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, item)
+            except RuntimeError:
+                # 루프가 이미 닫힌 구독자 (서버 종료 중)
+                self.unsubscribe(sub)
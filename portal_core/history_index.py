@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import List, Optional
+
+"""
+JSONL 히스토리 파일용 줄 단위 바이트 오프셋 인덱스 (v1).
+
+app.py / portal_core.history_store 에서:
+
+    from portal_core.history_index import JsonlOffsetIndex
+
+로 import 해서 사용한다.
+
+역할:
+- 히스토리 파일 옆에 사이드카 인덱스(<파일명>.idx)를 두고, 비어 있지 않은 줄마다 시작 오프셋을 기록
+- 파일이 뒤로만 자랐으면 늘어난 바이트만 스캔해서 오프셋을 이어 붙인다
+- inode 가 바뀌었거나 크기가 줄었으면 (RESET_FLOW.md 의 `: >` 비우기 등) 처음부터 다시 만든다
+- tail(N) 은 마지막 N줄만 seek 해서 읽으므로, 로그가 몇 년치로 쌓여도 비용이 일정하다
+
+사이드카 포맷 (리틀 엔디안):
+    header = magic(8) | inode(Q) | indexed_size(Q) | head_crc(I) | count(Q)
+    body   = line_start_offset(Q) * count
+
+- indexed_size: 마지막 '\\n' 직후까지의 바이트 수. 쓰는 중인(개행 없는) 꼬리 줄은 다음 refresh 때 잡힌다.
+- head_crc: 파일 앞부분 최대 4KB 의 crc32. 비운 뒤 다시 커진 파일을 같은 파일로 착각하지 않기 위한 지문.
+"""
+
+_MAGIC = b"STHIDX01"
+_HEADER = struct.Struct("<8sQQIQ")
+_HEAD_BYTES = 4096
+_SCAN_CHUNK = 64 * 1024
+
+
+def _head_crc(f, size: int) -> int:
+    f.seek(0)
+    return zlib.crc32(f.read(min(size, _HEAD_BYTES)))
+
+
+class JsonlOffsetIndex:
+    """JSONL 파일 한 개에 대한 줄 시작 오프셋 인덱스.
+
+    offsets[i] = i번째 (비어 있지 않은) 줄이 시작하는 바이트 위치
+    """
+
+    def __init__(self, path: str | Path, index_path: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.index_path = index_path or self.path.with_name(self.path.name + ".idx")
+        self.offsets: array = array("Q")
+        self.indexed_size = 0
+        self.inode = 0
+        self.head_crc = 0
+        self._loaded = False
+
+    # ---- 조회 ----
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def read_lines(self, start: int, stop: int) -> List[bytes]:
+        """[start, stop) 범위의 줄을 원본 바이트 그대로 돌려준다 (앞뒤 공백 제거)."""
+        start = max(0, start)
+        stop = min(stop, len(self.offsets))
+        if start >= stop:
+            return []
+
+        begin = self.offsets[start]
+        end = self.offsets[stop] if stop < len(self.offsets) else self.indexed_size
+        try:
+            with self.path.open("rb") as f:
+                f.seek(begin)
+                blob = f.read(end - begin)
+        except FileNotFoundError:
+            return []
+
+        # 연속 구간이라 한 번에 읽은 뒤 오프셋 기준으로 잘라낸다.
+        lines: List[bytes] = []
+        for i in range(start, stop):
+            a = self.offsets[i] - begin
+            b = (self.offsets[i + 1] - begin) if i + 1 < stop else len(blob)
+            line = blob[a:b].strip()
+            if line:
+                lines.append(line)
+        return lines
+
+    def tail(self, n: int) -> List[bytes]:
+        """마지막 n줄만 읽어서 돌려준다. n <= 0 이면 전체."""
+        total = len(self.offsets)
+        if n <= 0:
+            return self.read_lines(0, total)
+        return self.read_lines(total - n, total)
+
+    # ---- 갱신 ----
+
+    def refresh(self) -> None:
+        """원본 파일 상태를 보고 인덱스를 최신으로 맞춘다.
+
+        - 파일 없음 → 빈 인덱스
+        - inode 변경 / 크기 감소 / 앞부분 지문 변경 → 전체 재구축
+        - 크기 증가 → 늘어난 바이트만 스캔
+        """
+        if not self._loaded:
+            self._load_sidecar()
+            self._loaded = True
+
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            if self.offsets or self.indexed_size:
+                self._reset(0, 0)
+            return
+
+        if st.st_size == self.indexed_size and st.st_ino == self.inode:
+            return
+
+        with self.path.open("rb") as f:
+            rebuild = (
+                st.st_ino != self.inode
+                or st.st_size < self.indexed_size
+                or (self.indexed_size and _head_crc(f, self.indexed_size) != self.head_crc)
+            )
+            if rebuild:
+                self._reset(st.st_ino, 0)
+                old_count = 0
+            else:
+                old_count = len(self.offsets)
+
+            self._scan_from(f, self.indexed_size)
+            # 파일이 4KB 미만인 동안에는 지문 범위도 같이 자라므로 매번 다시 계산 (최대 4KB 읽기)
+            self.head_crc = _head_crc(f, self.indexed_size)
+
+        self._write_sidecar(full=rebuild, old_count=old_count)
+
+    def _reset(self, inode: int, head_crc: int) -> None:
+        self.offsets = array("Q")
+        self.indexed_size = 0
+        self.inode = inode
+        self.head_crc = head_crc
+
+    def _scan_from(self, f, pos: int) -> None:
+        """pos 부터 끝까지 읽으면서 완성된 줄(개행으로 끝나는 줄)의 시작 오프셋을 추가한다."""
+        f.seek(pos)
+        line_start = pos
+        carry_blank = True  # 현재 줄에 공백 아닌 글자가 아직 없음
+        while True:
+            chunk = f.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            base = f.tell() - len(chunk)
+            cursor = 0
+            while True:
+                nl = chunk.find(b"\n", cursor)
+                if nl == -1:
+                    if chunk[cursor:].strip():
+                        carry_blank = False
+                    break
+                if not carry_blank or chunk[cursor:nl].strip():
+                    self.offsets.append(line_start)
+                line_start = base + nl + 1
+                carry_blank = True
+                cursor = nl + 1
+        # 개행 없이 끝난 꼬리 줄은 아직 쓰는 중일 수 있으므로 인덱싱하지 않는다.
+        self.indexed_size = line_start
+
+    # ---- 사이드카 파일 ----
+
+    def _load_sidecar(self) -> None:
+        try:
+            with self.index_path.open("rb") as f:
+                head = f.read(_HEADER.size)
+                if len(head) != _HEADER.size:
+                    return
+                magic, inode, size, crc, count = _HEADER.unpack(head)
+                if magic != _MAGIC:
+                    return
+                offsets = array("Q")
+                offsets.frombytes(f.read(count * offsets.itemsize))
+                if len(offsets) != count:
+                    return
+        except (FileNotFoundError, OSError, ValueError):
+            return
+        self.offsets = offsets
+        self.inode = inode
+        self.indexed_size = size
+        self.head_crc = crc
+
+    def _write_sidecar(self, full: bool, old_count: int) -> None:
+        """사이드카를 갱신한다. 평소에는 새 오프셋만 덧붙이고 헤더를 고쳐 쓴다.
+
+        오프셋을 먼저 쓰고 헤더(count)를 나중에 쓰므로, 중간에 죽어도
+        헤더가 가리키는 범위는 항상 온전하다.
+        """
+        header = _HEADER.pack(
+            _MAGIC, self.inode, self.indexed_size, self.head_crc, len(self.offsets)
+        )
+        try:
+            if full or not self.index_path.exists():
+                tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+                with tmp.open("wb") as f:
+                    f.write(header)
+                    self.offsets.tofile(f)
+                os.replace(tmp, self.index_path)
+                return
+
+            with self.index_path.open("r+b") as f:
+                f.seek(_HEADER.size + old_count * self.offsets.itemsize)
+                self.offsets[old_count:].tofile(f)
+                f.truncate()
+                f.seek(0)
+                f.write(header)
+        except OSError:
+            # 사이드카를 못 써도 메모리 인덱스로는 계속 동작한다.
+            pass
@@ -0,0 +1,484 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from portal_core.burned_archive import BurnedArchive
+from portal_core.history_entry import HistoryEntry, dedup_key
+from portal_core.history_store import parse_portal_line, tail_crc
+
+"""
+포털 히스토리 전문 검색 (v1).
+
+app.py 의 /api/history/search 가 이 모듈을 쓴다.
+
+    from portal_core.history_search import HistorySearchIndex
+
+역할:
+- 포털 히스토리(portal_history/*.jsonl) + 불탄방 아카이브를 sqlite 파일 하나에 역색인으로 들고 있는다
+- 한국어는 조사가 붙어서 띄어쓰기로 안 끊기므로, 단어(\\w+) 안의 글자 2-gram / 3-gram 을 색인어로 쓴다
+  ("부감독이" 안에 "부감독" 3-gram 이 있으니 "부감독" 으로 찾힌다)
+- 파일별 (inode, 읽은 위치, 그 직전 crc) 를 같이 저장해서, 재시작해도 늘어난 줄만 추가 색인
+- HistoryWriter 가 쓴 줄은 push() 로 큐에 넣고 전용 indexer 스레드가 색인
+  (writer 스레드는 색인 락을 안 잡는다 → 시작 때 재색인이나 느린 검색이 기록을 막지 않음)
+- 비우기/교체가 보이면 전체를 다시 색인한다 (리셋은 드물다)
+- 검색 때 sync 는 파일 stat(inode, 크기, mtime) / 불탄방 지문이 지난번과 다를 때만
+
+검색:
+- 질의 단어마다 3-gram(두 글자 단어는 2-gram)을 모두 가진 문서만 후보로 → 실제 부분 문자열 확인
+- 2/3-gram BM25 점수 + 질의 전체가 그대로 들어 있으면 가산, 같은 점수면 최신 순
+- 한 글자 질의는 n-gram 이 없으므로 본문 LIKE 스캔 (최신 순)
+"""
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BOOST = 1.5
+SNIPPET_RADIUS = 40
+
+SCHEMA_VERSION = "2"  # 바뀌면 전체 재색인 (2: dedup 키를 다이제스트로)
+
+BURNED_SOURCE = "burned"
+PORTAL_SOURCE = "portal"
+
+_STOP = object()
+
+_TOKEN_RE = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc INTEGER PRIMARY KEY,
+    key BLOB UNIQUE NOT NULL,
+    id TEXT,
+    role TEXT,
+    content TEXT,
+    timestamp TEXT,
+    source TEXT,
+    length INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (gram, doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    consumed INTEGER,
+    anchor INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v TEXT
+);
+"""
+
+
+# ---- 토큰 / n-gram ----
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def ngrams(text: str) -> Counter:
+    """단어 안의 2-gram, 3-gram 빈도. (단어 경계를 넘는 gram 은 만들지 않는다)"""
+    grams: Counter = Counter()
+    for tok in tokens(text):
+        for n in (2, 3):
+            for i in range(len(tok) - n + 1):
+                grams[tok[i:i + n]] += 1
+    return grams
+
+
+def _required_grams(query_tokens: List[str]) -> List[str]:
+    """후보 문서가 반드시 가져야 하는 gram. 세 글자 이상 단어는 3-gram 전부, 두 글자 단어는 그 자체."""
+    req: List[str] = []
+    for tok in query_tokens:
+        if len(tok) >= 3:
+            req.extend(tok[i:i + 3] for i in range(len(tok) - 2))
+        elif len(tok) == 2:
+            req.append(tok)
+    return list(dict.fromkeys(req))
+
+
+def make_snippet(content: str, query_tokens: List[str], radius: int = SNIPPET_RADIUS) -> Tuple[str, List[List[int]]]:
+    """첫 번째로 걸린 단어 주변 본문 + 스니펫 안에서 질의 단어들이 걸린 [시작, 끝] 위치들."""
+    low = normalize(content)
+    hit = min((p for p in (low.find(t) for t in query_tokens) if p >= 0), default=0)
+    start = max(0, hit - radius)
+    stop = min(len(content), hit + radius * 2)
+    snippet = content[start:stop]
+    if start > 0:
+        snippet = "…" + snippet
+    if stop < len(content):
+        snippet = snippet + "…"
+
+    offset = 1 if start > 0 else 0
+    low_snip = low[start:stop]
+    marks: List[List[int]] = []
+    for tok in query_tokens:
+        pos = low_snip.find(tok)
+        while pos != -1:
+            marks.append([pos + offset, pos + offset + len(tok)])
+            pos = low_snip.find(tok, pos + len(tok))
+    marks.sort()
+    return snippet, marks
+
+
+class HistorySearchIndex:
+    """포털 히스토리 + 불탄방 n-gram 역색인 (sqlite 파일 하나)."""
+
+    def __init__(self, db_path: str | Path, portal_paths: List[str], archive: BurnedArchive) -> None:
+        self.db_path = Path(db_path)
+        self.portal_paths = [str(p) for p in portal_paths]
+        self.archive = archive
+        self.ready = False
+
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 마지막 sync 때 본 파일 stat / 불탄방 지문 (같으면 검색 때 sync 를 건너뛴다)
+        self._synced_sig: Optional[tuple] = None
+
+        self._pending: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # ---- 연결 ----
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self, timeout: float = 5.0) -> None:
+        """큐에 남은 push 까지 색인하고 indexer 스레드를 멈춘 뒤 연결을 닫는다."""
+        if self._thread is not None:
+            self._pending.put(_STOP)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---- 색인 ----
+
+    def _signature(self) -> tuple:
+        """포털 파일들 (inode, 크기, mtime) + 불탄방 원본 지문. 파일을 열지 않고 stat 만."""
+        sig = []
+        for path in self.portal_paths:
+            try:
+                st = os.stat(path)
+                sig.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig), json.dumps(self.archive.source_stamp(), ensure_ascii=False)
+
+    def sync(self) -> None:
+        """불탄방/포털 파일 상태를 확인해서 색인을 최신으로 맞춘다."""
+        with self._lock:
+            sig = self._signature()
+            db = self._db()
+            self.archive.ensure_loaded()
+            stamp = json.dumps(self.archive.source_stamp(), ensure_ascii=False)
+            if (
+                self._meta(db, "schema") != SCHEMA_VERSION
+                or self._meta(db, "burned_stamp") != stamp
+                or self._portal_reset(db)
+            ):
+                self._rebuild(db, stamp)
+            else:
+                with db:
+                    for path in self.portal_paths:
+                        self._index_appended(db, path)
+            self._synced_sig = sig
+            self.ready = True
+
+    def _sync_if_changed(self) -> None:
+        # 지문은 sync 전에 잡는다 → 그 사이 붙은 줄이 있으면 다음 검색 때 지문이 달라서 다시 맞춘다
+        if self._synced_sig is None or self._signature() != self._synced_sig:
+            self.sync()
+
+    def _rebuild(self, db: sqlite3.Connection, stamp: str) -> None:
+        with db:
+            db.execute("DELETE FROM postings")
+            db.execute("DELETE FROM docs")
+            db.execute("DELETE FROM files")
+            for item in self.archive.items:
+                self._add_doc(db, item, BURNED_SOURCE)
+            for path in self.portal_paths:
+                self._index_appended(db, path)
+            db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('burned_stamp', ?)", (stamp,))
+            db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('schema', ?)", (SCHEMA_VERSION,))
+
+    def _portal_reset(self, db: sqlite3.Connection) -> bool:
+        """포털 파일이 교체/비우기/잘림 됐는지. (그러면 부분 색인으로는 못 맞춘다)"""
+        for path in self.portal_paths:
+            row = db.execute(
+                "SELECT inode, consumed, anchor FROM files WHERE path = ?", (path,)
+            ).fetchone()
+            if row is None or not row[1]:
+                continue
+            inode, consumed, anchor = row
+            try:
+                with open(path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    if st.st_ino != inode or st.st_size < consumed:
+                        return True
+                    if tail_crc(f, consumed) != anchor:
+                        return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def _index_appended(self, db: sqlite3.Connection, path: str) -> int:
+        """path 에서 지난번 읽은 위치 이후의 완성된 줄들을 색인. 색인한 줄 수를 돌려준다."""
+        row = db.execute("SELECT consumed FROM files WHERE path = ?", (path,)).fetchone()
+        consumed = row[0] if row else 0
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_size <= consumed:
+                    return 0
+                f.seek(consumed)
+                blob = f.read()
+                end = blob.rfind(b"\n") + 1
+                if not end:
+                    return 0
+                consumed += end
+                anchor = tail_crc(f, consumed)
+        except FileNotFoundError:
+            return 0
+
+        count = 0
+        for raw in blob[:end].split(b"\n"):
+            item = parse_portal_line(raw) if raw.strip() else None
+            if item is not None and self._add_doc(db, item, PORTAL_SOURCE):
+                count += 1
+        db.execute(
+            "INSERT OR REPLACE INTO files (path, inode, consumed, anchor) VALUES (?, ?, ?, ?)",
+            (path, st.st_ino, consumed, anchor),
+        )
+        return count
+
+    def _add_doc(self, db: sqlite3.Connection, item: HistoryEntry, source: str) -> bool:
+        content = item.content
+        grams = ngrams(content)
+        cur = db.execute(
+            "INSERT OR IGNORE INTO docs (key, id, role, content, timestamp, source, length)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                dedup_key(item),
+                item.id,
+                item.role,
+                content,
+                item.timestamp,
+                source,
+                sum(grams.values()),
+            ),
+        )
+        if cur.rowcount == 0:
+            # 같은 발화 (mac/pi 중복) → 이미 색인됨
+            return False
+        doc = cur.lastrowid
+        db.executemany(
+            "INSERT INTO postings (gram, doc, tf) VALUES (?, ?, ?)",
+            ((g, doc, tf) for g, tf in grams.items()),
+        )
+        return True
+
+    def push(self, path: str, item: HistoryEntry, start: int, end: int) -> None:
+        """HistoryWriter 가 path 의 [start, end) 에 방금 쓴 한 줄을 색인 큐에 넣는다.
+
+        writer 스레드(app._on_history_commit)에서 불리므로 락을 잡지 않고 넣기만 한다.
+        아직 첫 sync 전이면 버린다 (그 sync 가 파일에서 읽어 온다).
+        """
+        if not self.ready:
+            return
+        self._ensure_started()
+        self._pending.put((path, item, start, end))
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-indexer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._pending.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            # 색인하는 동안(또는 sync 가 락을 잡은 동안) 쌓인 줄은 한 트랜잭션으로
+            while True:
+                try:
+                    nxt = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            try:
+                with self._lock:
+                    db = self._db()
+                    with db:
+                        for path, item, start, end in batch:
+                            self._index_pushed(db, path, item, start, end)
+            except Exception as e:
+                # 색인 실패는 검색만 늦어질 뿐 → 다음 sync 가 파일에서 다시 맞춘다
+                print(f"[history_search] index error: {e}")
+
+    def _index_pushed(self, db: sqlite3.Connection, path: str, item: HistoryEntry, start: int, end: int) -> None:
+        """push 된 한 줄 색인. 색인이 읽은 위치가 정확히 start 였을 때만 위치도 end 로 당긴다.
+
+        (아니면 다음 sync 가 파일에서 다시 읽어서 맞춘다. 같은 발화는 dedup 으로 한 번만 들어간다)
+        """
+        self._add_doc(db, item, PORTAL_SOURCE)
+        row = db.execute(
+            "SELECT consumed, anchor FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        consumed, anchor = row if row else (0, None)
+        if consumed != start:
+            return
+        try:
+            with open(path, "rb") as f:
+                if consumed and tail_crc(f, consumed) != anchor:
+                    return
+                new_anchor = tail_crc(f, end)
+                ino = os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return
+        db.execute(
+            "INSERT OR REPLACE INTO files (path, inode, consumed, anchor) VALUES (?, ?, ?, ?)",
+            (path, ino, end, new_anchor),
+        )
+
+    @staticmethod
+    def _meta(db: sqlite3.Connection, key: str) -> Optional[str]:
+        row = db.execute("SELECT v FROM meta WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # ---- 검색 ----
+
+    def search(self, query: str, limit: int = 20) -> Dict[str, Any]:
+        """질의 → {"query", "total", "took_ms", "hits": [...]}. hits 는 점수 높은 순."""
+        t0 = time.perf_counter()
+        with self._lock:
+            self._sync_if_changed()
+            db = self._db()
+            query_tokens = tokens(query)
+            required = _required_grams(query_tokens)
+            if not query_tokens:
+                rows, scores = [], {}
+            elif not required:
+                rows, scores = self._scan(db, query_tokens, limit)
+            else:
+                rows, scores = self._ranked(db, query, query_tokens, required)
+
+        ordered = sorted(rows, key=lambda r: (scores.get(r[0], 0.0), r[1] or ""), reverse=True)
+        hits = []
+        for doc, msg_id, role, content, ts, source, _ in ordered[:limit]:
+            snippet, marks = make_snippet(content, query_tokens)
+            hits.append({
+                "id": msg_id,
+                "role": role,
+                "timestamp": ts,
+                "source": source,
+                "score": round(scores.get(doc, 0.0), 4),
+                "snippet": snippet,
+                "highlights": marks,
+            })
+        return {
+            "query": query,
+            "total": len(rows),
+            "took_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "hits": hits,
+        }
+
+    _DOC_COLS = "doc, id, role, content, timestamp, source, length"
+
+    def _ranked(
+        self,
+        db: sqlite3.Connection,
+        query: str,
+        query_tokens: List[str],
+        required: List[str],
+    ) -> Tuple[List[tuple], Dict[int, float]]:
+        marks = ",".join("?" * len(required))
+        rows = db.execute(
+            f"SELECT {self._DOC_COLS} FROM docs WHERE doc IN ("
+            f" SELECT doc FROM postings WHERE gram IN ({marks})"
+            f" GROUP BY doc HAVING COUNT(*) = ?)",
+            (*required, len(required)),
+        ).fetchall()
+        # n-gram 이 다 있어도 단어가 그대로 들어 있지 않을 수 있다 (gram 이 흩어진 경우)
+        rows = [r for r in rows if all(t in normalize(r[3]) for t in query_tokens)]
+        if not rows:
+            return [], {}
+
+        grams = list(ngrams(query))
+        n_docs, avg_len = db.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+        avg_len = avg_len or 1.0
+        gm = ",".join("?" * len(grams))
+        df = dict(db.execute(
+            f"SELECT gram, COUNT(*) FROM postings WHERE gram IN ({gm}) GROUP BY gram", grams
+        ).fetchall())
+
+        lengths = {r[0]: r[6] or 1 for r in rows}
+        scores: Dict[int, float] = {doc: 0.0 for doc in lengths}
+        for chunk in _chunks(list(lengths), 500):
+            dm = ",".join("?" * len(chunk))
+            for doc, gram, tf in db.execute(
+                f"SELECT doc, gram, tf FROM postings WHERE gram IN ({gm}) AND doc IN ({dm})",
+                (*grams, *chunk),
+            ):
+                idf = math.log(1 + (n_docs - df[gram] + 0.5) / (df[gram] + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_len)
+                scores[doc] += idf * tf * (BM25_K1 + 1) / norm
+
+        phrase = " ".join(query_tokens)
+        for r in rows:
+            if len(query_tokens) > 1 and phrase in normalize(r[3]):
+                scores[r[0]] *= PHRASE_BOOST
+        return rows, scores
+
+    def _scan(self, db: sqlite3.Connection, query_tokens: List[str], limit: int) -> Tuple[List[tuple], Dict[int, float]]:
+        """한 글자 질의: n-gram 으로는 못 찾으므로 본문을 최신 순으로 훑는다."""
+        like = [f"%{t}%" for t in query_tokens]
+        where = " AND ".join("content LIKE ?" for _ in like)
+        rows = db.execute(
+            f"SELECT {self._DOC_COLS} FROM docs WHERE {where} ORDER BY id DESC LIMIT ?",
+            (*like, max(limit, 1) * 10),
+        ).fetchall()
+        rows = [r for r in rows if all(t in normalize(r[3]) for t in query_tokens)]
+        return rows, {}
+
+
+def _chunks(seq: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
@@ -0,0 +1,529 @@
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from portal_core.burned_archive import BurnedArchive
+from portal_core.history_entry import HistoryEntry, dedup_key
+from portal_core.history_index import JsonlOffsetIndex
+
+"""
+포털 히스토리 저장소 (v1).
+
+app.py 의 _load_history 가 이 모듈을 통해 히스토리를 읽는다.
+
+역할:
+- 히스토리 파일마다 JsonlOffsetIndex(사이드카 .idx)를 하나씩 들고 있다가 요청 때 refresh 만 한다
+- /api/history 의 "최근 limit개" 요청은 각 파일 꼬리에서 필요한 만큼만 seek 해서 디코딩한다
+- 포털 히스토리가 limit 보다 적을 때만 불탄방 아카이브(portal_core.burned_archive, 메모리 상주)를 앞에 붙인다
+- history_version() 은 /api/history 의 ETag, load_history_since() 는 ?since_etag= 델타 응답에 쓴다
+
+결과는 HistoryPage 로 돌려준다. 타임라인이 항상 "불탄방 + 포털" 순서라서,
+어떤 연속 구간이든 불탄방[a:b] + 포털 항목 리스트로 표현된다.
+
+전제:
+- 각 히스토리 파일은 append 순서 ≈ id(타임스탬프) 순서다.
+  그래서 파일별 마지막 N줄만 봐도 "id 기준 최근 N개"를 고를 수 있다.
+"""
+
+
+STREAM_CHUNK = 64 * 1024  # 스트리밍 응답 한 번에 내보내는 크기
+
+
+@dataclass
+class HistoryPage:
+    """타임라인의 연속 구간 = 불탄방 아카이브 [burned_start, burned_stop) + 포털 항목들."""
+
+    archive: BurnedArchive
+    burned_start: int = 0
+    burned_stop: int = 0
+    portal: List[HistoryEntry] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return (self.burned_stop - self.burned_start) + len(self.portal)
+
+    def entries(self) -> List[HistoryEntry]:
+        return self.archive.items[self.burned_start:self.burned_stop] + self.portal
+
+    def items(self) -> List[Dict[str, Any]]:
+        """HistoryItem 모양 dict 리스트. (응답 JSON 은 iter_fragments 로 dict 없이 만든다)"""
+        return [e.as_dict() for e in self.entries()]
+
+    def to_json(self) -> bytes:
+        """응답용 JSON 배열. 불탄방 쪽은 미리 직렬화된 바이트를 그대로 이어 붙인다."""
+        return b"[" + b",".join(self.iter_fragments()) + b"]"
+
+    def iter_fragments(self) -> Iterator[Any]:
+        """항목마다 직렬화된 JSON (bytes 또는 memoryview). 불탄방 → 포털 순."""
+        yield from self.archive.fragments[self.burned_start:self.burned_stop]
+        for it in self.portal:
+            yield it.to_json()
+
+    def iter_json(self, chunk_size: int = STREAM_CHUNK) -> Iterator[bytes]:
+        """to_json 과 같은 JSON 배열을 chunk_size 쯤씩 나눠서 흘려보낸다. (전체 바이트를 한 번에 안 만든다)"""
+        buf = bytearray(b"[")
+        first = True
+        for frag in self.iter_fragments():
+            if not first:
+                buf += b","
+            buf += frag
+            first = False
+            if len(buf) >= chunk_size:
+                yield bytes(buf)
+                buf.clear()
+        buf += b"]"
+        yield bytes(buf)
+
+    def iter_ndjson(self, chunk_size: int = STREAM_CHUNK) -> Iterator[bytes]:
+        """한 줄에 항목 하나 (application/x-ndjson). 받는 쪽이 줄 단위로 바로 처리할 수 있다."""
+        buf = bytearray()
+        for frag in self.iter_fragments():
+            buf += frag
+            buf += b"\n"
+            if len(buf) >= chunk_size:
+                yield bytes(buf)
+                buf.clear()
+        if buf:
+            yield bytes(buf)
+
+
+def burned_tail(archive: BurnedArchive, count: int) -> tuple[int, int]:
+    """불탄방 아카이브의 마지막 count 개 구간 (count <= 0 이면 빈 구간). 같은 id 묶음은 안 가른다."""
+    n = len(archive)
+    return widen_burned(archive, max(0, n - count), n) if count > 0 else (n, n)
+
+
+def widen_burned(archive: BurnedArchive, start: int, stop: int) -> tuple[int, int]:
+    """불탄방 구간 [start, stop) 양 끝이 같은 id 묶음 가운데면 묶음 끝까지 넓힌다. (커서 페이지 규칙 참고)"""
+    items = archive.items
+    n = len(items)
+    while 0 < start < n and items[start - 1].id == items[start].id:
+        start -= 1
+    while start < stop < n and items[stop].id == items[stop - 1].id:
+        stop += 1
+    return start, stop
+
+
+# path(str) → 인덱스. 프로세스 안에서 한 번만 만들고 계속 재사용한다.
+_INDEXES: Dict[str, JsonlOffsetIndex] = {}
+
+
+def get_index(path: str | Path) -> JsonlOffsetIndex:
+    """path 에 대한 오프셋 인덱스를 가져와서 최신 상태로 refresh 해 돌려준다."""
+    key = str(path)
+    idx = _INDEXES.get(key)
+    if idx is None:
+        idx = JsonlOffsetIndex(path)
+        _INDEXES[key] = idx
+    idx.refresh()
+    return idx
+
+
+# ---- 줄 파싱 ----
+
+
+def parse_portal_line(raw: bytes) -> Optional[HistoryEntry]:
+    """포털 히스토리 한 줄 → HistoryEntry. 깨진 줄이면 None.
+
+    id 도 timestamp 도 없는 줄은 예전 dedup 키 모양("|role|본문")을 id 로 쓴다.
+    """
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    role = data.get("role") or "assistant"
+    text = data.get("text") or ""
+    ts = data.get("timestamp") or ""
+    msg_id = data.get("id") or ts or ""
+
+    # 첨부 정보가 있으면 그대로 보존 (attachments 또는 files 키)
+    attachments = None
+    raw_att = data.get("attachments") or data.get("files")
+    if isinstance(raw_att, list):
+        attachments = raw_att
+
+    return HistoryEntry(
+        msg_id or f"|{role}|{text}",
+        role,
+        text,
+        ts,
+        attachments,
+        # 이 발화를 보낸 기기가 붙인 로컬 메시지 id (푸시로 돌아온 자기 발화를 걸러내는 용도)
+        data.get("client_id"),
+    )
+
+
+def _by_id(item: HistoryEntry) -> str:
+    return item.id
+
+
+# ---- 꼬리 읽기 ----
+
+
+def _tail_portal(paths: Iterable[str], limit: int) -> List[HistoryEntry]:
+    """포털 히스토리 파일들의 꼬리만 읽어서 dedup + id 정렬한 최근 limit개.
+
+    파일마다 읽은 창의 첫 id(경계)가 다르므로, 덜 읽은 파일들의 경계 중 가장 늦은 id 보다 뒤만
+    "빠짐없이 읽힌 구간"으로 본다. 그 구간이 limit 개보다 적으면 창을 두 배씩 넓혀 다시 본다.
+    (두 파일에 같은 발화가 겹쳐 있으면 dedup 후 개수가 줄어드는 것도 같은 방식으로 메운다.)
+    """
+    indexes = [get_index(p) for p in paths]
+    total = sum(len(idx) for idx in indexes)
+    window = limit if limit > 0 else total
+
+    while True:
+        items_by_key: Dict[bytes, HistoryEntry] = {}
+        cutoff: Optional[str] = None
+        for idx in indexes:
+            boundary: Optional[str] = None
+            for raw in idx.tail(window):
+                item = parse_portal_line(raw)
+                if item is None:
+                    continue
+                if boundary is None:
+                    boundary = item.id
+                items_by_key[dedup_key(item)] = item
+            if window < len(idx) and boundary is not None:
+                cutoff = boundary if cutoff is None else max(cutoff, boundary)
+
+        if cutoff is None:
+            break
+        # cutoff 와 같은 id 는 창 밖에 같은 id 의 앞줄이 더 있을 수 있으므로 cutoff 뒤만 센다
+        complete = sum(1 for it in items_by_key.values() if it.id > cutoff)
+        if complete >= limit:
+            break
+        window *= 2
+
+    # id 기준으로 오래된 것 → 최신 순 정렬
+    items = sorted(items_by_key.values(), key=_by_id)
+    if limit <= 0 or len(items) <= limit:
+        return items
+    # 맨 앞 항목과 같은 id 인 앞줄까지 (id 가 cutoff 보다 뒤라 묶음 전체가 읽혀 있다)
+    start = len(items) - limit
+    while start > 0 and items[start - 1].id == items[start].id:
+        start -= 1
+    return items[start:]
+
+
+def load_history_tail(
+    portal_paths: List[str],
+    archive: BurnedArchive,
+    limit: int = 400,
+) -> HistoryPage:
+    """불탄방 + 포털 히스토리를 한 타임라인으로 봤을 때 가장 최근 limit개 (아래로 갈수록 최신).
+
+    limit <= 0 이면 전체 타임라인.
+    """
+    portal_items = _tail_portal(portal_paths, limit)
+    if limit > 0 and len(portal_items) >= limit:
+        return HistoryPage(archive, 0, 0, portal_items)
+
+    # 불탄방은 포털 기록 앞쪽(옛 기록)에 붙는다.
+    if limit > 0:
+        start, stop = burned_tail(archive, limit - len(portal_items))
+    else:
+        start, stop = 0, len(archive)
+    return HistoryPage(archive, start, stop, portal_items)
+
+
+# ---- 커서 페이지 (before / after) ----
+#
+# 타임라인 T = 불탄방(파일 순서) + 포털(dedup, id 정렬) 기준으로
+#   before=X → T 에서 id 가 X 인 첫 항목 바로 앞의 limit 개
+#   after=X  → T 에서 id 가 X 인 마지막 항목 바로 뒤의 limit 개
+# X 를 못 찾으면 빈 리스트.
+#
+# 예전 id 는 초 단위 timestamp 라 user/assistant 가 같은 id 를 가질 수 있다.
+# 페이지가 같은 id 묶음을 가르면 다음 before/after 가 묶음의 나머지를 건너뛰므로,
+# 페이지 양 끝은 항상 같은 id 묶음을 통째로 담는다 (그만큼 limit 보다 조금 길어질 수 있음).
+#
+# 전체 타임라인을 만들지 않고, 포털 파일은 오프셋 인덱스로 X 위치를 이분 탐색한 뒤
+# 그 지점부터 블록 단위로 거꾸로(또는 앞으로) 읽는다. 불탄방은 메모리 상주 아카이브에서 바로 자른다.
+
+_REVERSE_BLOCK = 64 * 1024
+
+
+def iter_lines_reverse(path: str | Path, end: int, block_size: int = _REVERSE_BLOCK) -> Iterator[bytes]:
+    """path 의 [0, end) 구간을 끝에서부터 블록 단위로 읽으며, 비어 있지 않은 줄을 거꾸로 내보낸다."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = end
+        rest = b""  # 아직 줄 시작을 못 만난 조각 (블록 경계에 걸친 줄)
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + rest
+            lines = buf.split(b"\n")
+            # 첫 조각은 앞 블록과 이어질 수 있으므로 남겨 둔다.
+            rest = lines[0]
+            for line in reversed(lines[1:]):
+                line = line.strip()
+                if line:
+                    yield line
+        rest = rest.strip()
+        if rest:
+            yield rest
+
+
+def _line_id(idx: JsonlOffsetIndex, i: int) -> Optional[str]:
+    lines = idx.read_lines(i, i + 1)
+    item = parse_portal_line(lines[0]) if lines else None
+    return item.id if item is not None else None
+
+
+def _bisect_ids(idx: JsonlOffsetIndex, target: str, right: bool = False) -> int:
+    """id 정렬된 파일에서 target 이 들어갈 줄 번호 (bisect_left / bisect_right 와 같은 의미).
+
+    깨진 줄은 바로 뒤의 정상 줄 id 로 대신 비교한다.
+    """
+    lo, hi = 0, len(idx)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        probe = mid
+        mid_id = None
+        while probe < hi and mid_id is None:
+            mid_id = _line_id(idx, probe)
+            probe += 1
+        if mid_id is None:
+            hi = mid
+        elif mid_id < target or (right and mid_id == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _iter_portal_forward(idx: JsonlOffsetIndex, start: int, chunk: int = 64) -> Iterator[HistoryEntry]:
+    pos = start
+    while pos < len(idx):
+        for raw in idx.read_lines(pos, pos + chunk):
+            item = parse_portal_line(raw)
+            if item is not None:
+                yield item
+        pos += chunk
+
+
+def _iter_portal_backward(idx: JsonlOffsetIndex, stop: int) -> Iterator[HistoryEntry]:
+    end = idx.offsets[stop] if stop < len(idx) else idx.indexed_size
+    for raw in iter_lines_reverse(idx.path, end):
+        item = parse_portal_line(raw)
+        if item is not None:
+            yield item
+
+
+def _take_unique(items: Iterable[HistoryEntry], limit: int) -> List[HistoryEntry]:
+    """병합된(id 순) 흐름에서 dedup 하면서 limit 개만 꺼낸다. 마지막 항목과 같은 id 는 이어서 다 꺼낸다."""
+    seen: set[bytes] = set()
+    out: List[HistoryEntry] = []
+    for item in items:
+        if len(out) >= limit and item.id != out[-1].id:
+            break
+        key = dedup_key(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(item)
+    return out
+
+
+def load_history_before(
+    portal_paths: List[str],
+    archive: BurnedArchive,
+    before: str,
+    limit: int = 200,
+) -> HistoryPage:
+    """before 커서 바로 앞 limit 개 (오래된 것 → 최신 순)."""
+    indexes = [get_index(p) for p in portal_paths]
+    stops = [_bisect_ids(idx, before) for idx in indexes]
+    in_portal = any(
+        stop < len(idx) and _line_id(idx, stop) == before
+        for idx, stop in zip(indexes, stops)
+    )
+
+    if in_portal:
+        # 각 파일을 커서 지점부터 거꾸로 읽으면서 id 내림차순으로 병합
+        merged = heapq.merge(
+            *(_iter_portal_backward(idx, stop) for idx, stop in zip(indexes, stops)),
+            key=_by_id,
+            reverse=True,
+        )
+        portal_items = _take_unique(merged, limit)
+        portal_items.reverse()
+        # 포털 맨 앞까지 왔으면 그 앞은 불탄방 꼬리
+        start, stop = burned_tail(archive, limit - len(portal_items))
+        return HistoryPage(archive, start, stop, portal_items)
+
+    pos = archive.find_first(before)
+    if pos is None:
+        return HistoryPage(archive)
+    return HistoryPage(archive, *widen_burned(archive, max(0, pos - limit), pos))
+
+
+def load_history_after(
+    portal_paths: List[str],
+    archive: BurnedArchive,
+    after: str,
+    limit: int = 200,
+) -> HistoryPage:
+    """after 커서 바로 뒤 limit 개 (오래된 것 → 최신 순)."""
+    indexes = [get_index(p) for p in portal_paths]
+    starts = [_bisect_ids(idx, after, right=True) for idx in indexes]
+    in_portal = any(
+        start > 0 and _line_id(idx, start - 1) == after
+        for idx, start in zip(indexes, starts)
+    )
+
+    n = len(archive)
+    burned_start = burned_stop = n
+    if not in_portal:
+        pos = archive.find_last(after)
+        if pos is None:
+            return HistoryPage(archive)
+        burned_start, burned_stop = widen_burned(archive, pos + 1, min(n, pos + 1 + limit))
+        if burned_stop - burned_start >= limit:
+            return HistoryPage(archive, burned_start, burned_stop)
+        # 불탄방 끝까지 왔으면 그 뒤는 포털 처음부터
+        starts = [0 for _ in indexes]
+
+    merged = heapq.merge(
+        *(_iter_portal_forward(idx, start) for idx, start in zip(indexes, starts)),
+        key=_by_id,
+    )
+    portal_items = _take_unique(merged, limit - (burned_stop - burned_start))
+    return HistoryPage(archive, burned_start, burned_stop, portal_items)
+
+
+# ---- 버전 (ETag) / 델타 ----
+
+ANCHOR_BYTES = 64  # 완성된 마지막 줄 끝 직전 몇 바이트를 지문으로 쓸지
+
+
+def _file_mark(path: str | Path, block_size: int = 4096) -> tuple[int, int, int]:
+    """(inode, 마지막 완성 줄 끝 오프셋, 그 직전 바이트들의 crc32). 파일이 없으면 (0, 0, 0).
+
+    아직 쓰는 중인 꼬리 줄(개행 없음)은 버전에 넣지 않는다.
+    crc 는 같은 inode 로 비웠다가(`: >`) 다시 자란 파일을 옛 버전과 구분하는 용도.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return 0, 0, 0
+    with f:
+        st = os.fstat(f.fileno())
+        size, ino = st.st_size, st.st_ino
+        end = 0
+        pos = size
+        while pos > 0:
+            read_from = max(0, pos - block_size)
+            f.seek(read_from)
+            block = f.read(pos - read_from)
+            nl = block.rfind(b"\n")
+            if nl != -1:
+                end = read_from + nl + 1
+                break
+            pos = read_from
+        crc = tail_crc(f, end)
+    return ino, end, crc
+
+
+def history_version(portal_paths: List[str], archive: BurnedArchive) -> str:
+    """지금 히스토리 상태의 버전 문자열 (따옴표 없는 ETag 값).
+
+    불탄방 항목 수 + 포털 파일마다 (inode, 완성된 줄 끝 오프셋, 꼬리 crc).
+    파일이 append 로만 자라는 한, 이 값만 있으면 그 뒤에 붙은 줄을 바로 찾을 수 있다.
+    """
+    parts = [f"{len(archive):x}"]
+    for path in portal_paths:
+        ino, end, crc = _file_mark(path)
+        parts.append(f"{ino:x}-{end:x}-{crc:08x}")
+    return "h1." + ".".join(parts)
+
+
+def _parse_version(version: str, n_paths: int) -> Optional[tuple[int, List[tuple[int, int, int]]]]:
+    parts = version.strip().strip('"').split(".")
+    if len(parts) != n_paths + 2 or parts[0] != "h1":
+        return None
+    try:
+        marks = [tuple(int(x, 16) for x in p.split("-")) for p in parts[2:]]
+        burned = int(parts[1], 16)
+    except ValueError:
+        return None
+    if any(len(m) != 3 for m in marks):
+        return None
+    return burned, marks  # type: ignore[return-value]
+
+
+def load_history_since(
+    portal_paths: List[str],
+    archive: BurnedArchive,
+    version: str,
+) -> Optional[List[HistoryEntry]]:
+    """version 이후에 파일 뒤로 붙은 항목들 (id 순, dedup). 델타를 만들 수 없으면 None.
+
+    None 인 경우: 버전 문자열이 깨졌거나, 불탄방이 바뀌었거나,
+    포털 파일이 교체/비우기/잘림(inode·오프셋·꼬리 crc 불일치)된 경우 → 호출자는 전체 페이지로 응답한다.
+    """
+    parsed = _parse_version(version, len(portal_paths))
+    if parsed is None:
+        return None
+    burned, marks = parsed
+    if burned != len(archive):
+        return None
+
+    new_items: List[HistoryEntry] = []
+    for path, (ino, end, crc) in zip(portal_paths, marks):
+        if end == 0:
+            # 그 버전 때 비어 있던 (또는 없던) 파일 → 처음부터 전부 새 항목
+            blob = _read_from(path, 0)
+        else:
+            if _anchor_mismatch(path, ino, end, crc):
+                return None
+            blob = _read_from(path, end)
+        # 개행 없이 끝난 꼬리 줄은 다음 버전으로 미룬다.
+        blob = blob[: blob.rfind(b"\n") + 1]
+        for raw in blob.split(b"\n"):
+            item = parse_portal_line(raw)
+            if item is not None:
+                new_items.append(item)
+
+    new_items.sort(key=_by_id)
+    return _take_unique(new_items, len(new_items))
+
+
+def _read_from(path: str | Path, offset: int) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _anchor_mismatch(path: str | Path, ino: int, end: int, crc: int) -> bool:
+    try:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != ino or st.st_size < end:
+                return True
+            return tail_crc(f, end) != crc
+    except FileNotFoundError:
+        return True
+
+
+def tail_crc(f: BinaryIO, end: int) -> int:
+    """열린 파일 f 에서 end 직전 몇 바이트의 crc32. (같은 inode 로 비워졌다가 다시 자랐는지 확인용)"""
+    start = max(0, end - ANCHOR_BYTES)
+    f.seek(start)
+    return zlib.crc32(f.read(end - start))
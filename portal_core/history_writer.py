@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+"""
+포털 히스토리 그룹 커밋 writer (v1).
+
+app.py 의 _append_turn 등이 이 writer 에 레코드를 넘기고,
+전용 스레드 하나가 모아서 sowon.chat.jsonl 에 쓴다.
+
+    from portal_core.history_writer import HistoryWriter
+
+역할:
+- 여러 요청(포털 탭 여러 개, 텔레그램 등)에서 동시에 들어온 레코드를 한 번의 write 로 묶어서 기록
+- 한 턴(user + assistant)은 한 덩어리로 받아서 한 번의 write 로 쓴다 → 반만 써지는 턴이 없다
+- fsync 정책 (HISTORY_FSYNC 환경 변수)
+    none   : fsync 안 함 (OS 버퍼에 맡김, 가장 빠름)
+    batch  : 묶음(batch)마다 한 번 fsync (기본값)
+    record : 제출 단위(턴/레코드)마다 fsync
+- 쓰다가 죽어서 파일 끝에 개행 없는 조각이나 반쪽 턴(줄 수가 turn_n 보다 적음)이 남으면,
+  다음 시작 때 그 조각과 같은 턴의 앞줄을 잘라낸다
+- 묶음 중간에 쓰기/fsync 가 실패하면 파일에 온전히 들어간 제출까지는 성공으로 (on_commit 도),
+  반쯤 써진 조각은 잘라내고 나머지만 실패로 알린다 → 실패를 받고 다시 보내도 중복 턴이 안 생긴다
+- 큐 깊이 / flush 지연 통계를 stats() 로 보여준다 (/health 에 노출)
+"""
+
+FSYNC_POLICIES = ("none", "batch", "record")
+
+# (경로, 원본 줄 바이트, 시작 오프셋, 끝 오프셋) → 캐시 push / SSE publish 등
+CommitCallback = Callable[[str, bytes, int, int], None]
+
+_STOP = object()
+
+
+class _Pending:
+    __slots__ = ("lines", "future", "enqueued_at")
+
+    def __init__(self, lines: List[bytes]) -> None:
+        self.lines = lines
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class HistoryWriter:
+    """JSONL 히스토리 파일 하나에 대한 그룹 커밋 writer."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        fsync_policy: str = "batch",
+        max_batch: int = 256,
+        on_commit: Optional[CommitCallback] = None,
+    ) -> None:
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy 는 {FSYNC_POLICIES} 중 하나여야 함: {fsync_policy}")
+        self.path = Path(path)
+        self.fsync_policy = fsync_policy
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._in_flight = 0
+
+        # 통계
+        self._batches = 0
+        self._records = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._max_batch_seen = 0
+
+    # ---- 제출 ----
+
+    def submit(self, records: List[Dict[str, Any]]) -> Future:
+        """레코드 묶음(보통 한 턴)을 큐에 넣는다. 파일에 다 써지면(정책에 따라 fsync 까지) 완료되는 Future."""
+        lines = [(json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8") for r in records]
+        pending = _Pending(lines)
+        self._ensure_started()
+        self._queue.put(pending)
+        return pending.future
+
+    def close(self, timeout: float = 5.0) -> None:
+        """큐에 남은 것까지 다 쓰고 스레드를 멈춘다."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._batches or 1
+        return {
+            "fsync": self.fsync_policy,
+            "queue_depth": self._queue.qsize() + self._in_flight,
+            "batches": self._batches,
+            "records": self._records,
+            "errors": self._errors,
+            "max_batch": self._max_batch_seen,
+            "flush_ms_last": round(self._last_flush_ms, 3),
+            "flush_ms_avg": round(self._total_flush_ms / batches, 3),
+            "flush_ms_max": round(self._max_flush_ms, 3),
+        }
+
+    # ---- writer 스레드 ----
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="history-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch: List[_Pending] = [first]
+            # 앞 묶음을 쓰는 동안 쌓인 것들을 기다리지 않고 한꺼번에 가져온다.
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._in_flight = len(batch)
+            self._write_batch(batch)
+            self._in_flight = 0
+        self._close_file()
+
+    def _write_batch(self, batch: List[_Pending]) -> None:
+        t0 = time.perf_counter()
+        start: Optional[int] = None
+        try:
+            f = self._open()
+            start = f.seek(0, os.SEEK_END)
+            if self.fsync_policy == "record":
+                for pending in batch:
+                    _write_all(f, b"".join(pending.lines))
+                    os.fsync(f.fileno())
+            else:
+                _write_all(f, b"".join(line for p in batch for line in p.lines))
+                if self.fsync_policy == "batch":
+                    os.fsync(f.fileno())
+        except Exception as e:
+            # 기록 실패는 제출한 쪽 Future 로만 알린다. (채팅 자체는 막지 않는다)
+            self._errors += 1
+            print(f"[history_writer] write error: {e}")
+            done = self._salvage(batch, start)
+            self._close_file()
+            self._commit(batch[:done], start)
+            for pending in batch[done:]:
+                pending.future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        self._batches += 1
+        self._last_flush_ms = elapsed_ms
+        self._total_flush_ms += elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._max_batch_seen = max(self._max_batch_seen, len(batch))
+        self._commit(batch, start)
+
+    def _salvage(self, batch: List[_Pending], start: Optional[int]) -> int:
+        """실패 뒤 파일에 온전히 들어간 제출 수. 그 뒤에 반쯤 써진 바이트는 잘라낸다.
+
+        fsync 가 실패했어도 파일에 들어간 줄은 들어간 것으로 본다 (실패로 알리면 다시 보내서 중복된다).
+        """
+        if start is None or self._file is None:
+            return 0
+        fd = self._file.fileno()
+        try:
+            size = os.fstat(fd).st_size
+        except OSError:
+            return 0
+        done, pos = 0, start
+        for pending in batch:
+            end = pos + sum(len(line) for line in pending.lines)
+            if end > size:
+                break
+            done, pos = done + 1, end
+        if size > pos:
+            try:
+                os.ftruncate(fd, pos)
+            except OSError as e:
+                # 못 자르면 다음 _open 의 repair_torn_tail 이 끊긴 조각을 정리한다
+                print(f"[history_writer] truncate after error failed: {e}")
+        return done
+
+    def _commit(self, batch: List[_Pending], start: Optional[int]) -> None:
+        """파일에 들어간 제출들: offset 알림(on_commit) → Future 완료."""
+        pos = start or 0
+        for pending in batch:
+            self._records += len(pending.lines)
+            for line in pending.lines:
+                if self.on_commit is not None:
+                    try:
+                        self.on_commit(str(self.path), line, pos, pos + len(line))
+                    except Exception as e:
+                        print(f"[history_writer] on_commit error: {e}")
+                pos += len(line)
+            pending.future.set_result(None)
+
+    # ---- 파일 ----
+
+    def _open(self):
+        """append 핸들을 열어 둔다. 파일이 교체/삭제됐으면 (inode 변경) 다시 연다."""
+        if self._file is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    return self._file
+            except FileNotFoundError:
+                pass
+            self._close_file()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        repair_torn_tail(self.path)
+        # 버퍼 없이: 실패했을 때 파일에 실제로 들어간 만큼을 fstat 으로 알 수 있고,
+        # 닫을 때 남은 버퍼가 잘라낸 뒤에 다시 써지는 일이 없다
+        self._file = self.path.open("ab", buffering=0)
+        return self._file
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+def _write_all(f, data: bytes) -> None:
+    """버퍼 없는 파일은 write 가 일부만 쓰고 돌아올 수 있다 → 다 쓸 때까지."""
+    view = memoryview(data)
+    while view:
+        n = f.write(view)
+        if not n:
+            raise OSError("history write returned 0 bytes")
+        view = view[n:]
+
+
+def repair_torn_tail(path: Path, block: int = 64 * 1024) -> int:
+    """파일 끝의 끊긴 줄 / 반쪽 턴을 잘라낸다. 잘라낸 바이트 수를 돌려준다.
+
+    - 개행 없이 끊긴 마지막 줄은 잘라낸다
+    - 마지막 줄이 여러 줄짜리 턴("turn" 키)의 일부면, 끝에 모인 같은 턴 줄 수를 "turn_n" 과 비교해서
+      모자라면 (user 줄의 개행까지만 써지고 죽은 경우 등) 그 턴의 앞줄까지 같이 잘라낸다
+      (turn_n 이 없는 예전 턴은 마지막 줄이 끊겼을 때만)
+    - 줄 시작은 block 단위로 거꾸로 읽으며 찾는다 (줄이 block 보다 길어도 줄 중간에서 자르지 않음)
+    """
+    try:
+        with path.open("r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return 0
+            f.seek(size - 1)
+            torn = f.read(1) != b"\n"
+
+            # 마지막 줄 [start, end): 끊겼으면 파일 끝까지, 아니면 마지막 개행까지
+            start = _line_start(f, size if torn else size - 1, block)
+            cut = start if torn else size
+            last = _turn_of(_head(f, start, size))
+            if last is not None:
+                turn, count = last[0], last[1]
+                lines, first = 1, start
+                # 끝에 모인 같은 턴 줄들을 거슬러 올라가며 센다
+                while first > 0 and (count is None or lines < count):
+                    prev = _line_start(f, first - 1, block)
+                    info = _turn_of(_head(f, prev, first))
+                    if info is None or info[0] != turn:
+                        break
+                    lines, first = lines + 1, prev
+                if torn or (count is not None and lines < count):
+                    cut = first
+
+            if cut == size:
+                return 0
+            f.truncate(cut)
+            print(f"[history_writer] torn tail repaired: {path} (-{size - cut} bytes)")
+            return size - cut
+    except FileNotFoundError:
+        return 0
+
+
+def _line_start(f, end: int, block: int) -> int:
+    """end 앞에서 마지막 개행 바로 뒤 위치 (= end 가 들어 있는 줄의 시작). 없으면 0."""
+    pos = end
+    while pos > 0:
+        lo = max(0, pos - block)
+        f.seek(lo)
+        i = f.read(pos - lo).rfind(b"\n")
+        if i != -1:
+            return lo + i + 1
+        pos = lo
+    return 0
+
+
+def _head(f, start: int, end: int, n: int = 256) -> bytes:
+    f.seek(start)
+    return f.read(min(n, end - start))
+
+
+_TURN_RE = re.compile(rb'^\{"turn": "([^"]*)"(?:, "turn_n": (\d+))?')
+
+
+def _turn_of(raw: bytes) -> Optional[Tuple[str, Optional[int]]]:
+    """줄 앞부분의 {"turn": "...", "turn_n": N} 값. 턴 레코드는 이 두 키를 맨 앞에 쓰므로 잘린 줄에서도 읽힌다."""
+    m = _TURN_RE.match(raw)
+    if m is None:
+        return None
+    count = int(m.group(2)) if m.group(2) else None
+    return m.group(1).decode("utf-8", "replace"), count
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+"""
+업로드 로컬 → NAS write-behind 복제 (v1).
+
+예전에는 UPLOAD_ROOT 가 NAS(/mnt/sowon_cloud/chat_uploads) 그 자체라서,
+마운트가 느리거나 멈추면 포털/뇌 서버 startup(import 때 mkdir)과 업로드 하나하나가 같이 멈췄다.
+
+이제 업로드는 로컬 디스크(UPLOAD_LOCAL_ROOT)에 받고 바로 응답하고, 이 복제기가 뒤에서 NAS 로 옮긴다.
+
+    copy(rel)          로컬 root/rel 파일을 NAS root/rel 로 (임시 이름 → rename, 이미 같은 크기면 건너뜀)
+    append(rel, line)  NAS root/rel 에 한 줄 덧붙이기 (프로필 .manifest.jsonl — NAS 쪽 예전 줄은 그대로 둔다)
+
+- 작업은 로컬 <root>/.replication.jsonl 에 먼저 적어 두고 → 포털이 재시작돼도 남은 것부터 다시
+- 넣은 순서대로 하나씩 (blob 복사 → 그 blob 을 가리키는 목록 줄 순서가 지켜진다)
+- NAS 가 안 되면 맨 앞 작업을 retry_min 초부터 두 배씩(최대 retry_max 초) 쉬었다가 다시
+- 전용 스레드 하나에서만 NAS 를 만진다 → 마운트가 멈춰도 이 스레드만 멈춘다
+- 다 따라잡으면 journal 을 비운다
+- NAS 루트 자체는 부모(마운트 지점)가 있을 때만 만든다 (마운트가 빠졌을 때 SD 카드에 쌓이지 않게)
+
+    from portal_core.nas_replicator import NasReplicator
+"""
+
+JOURNAL_NAME = ".replication.jsonl"
+CURSOR_NAME = ".replication.cursor"
+COPY_CHUNK = 1024 * 1024
+
+
+class NasReplicator:
+    def __init__(
+        self,
+        local_root: Path,
+        remote_root: Path,
+        retry_min: float = 2.0,
+        retry_max: float = 300.0,
+    ) -> None:
+        self.local_root = local_root
+        self.remote_root = remote_root
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.journal_path = local_root / JOURNAL_NAME
+        self.cursor_path = local_root / CURSOR_NAME
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._next_id = 1
+        self._thread: Optional[threading.Thread] = None
+
+        # 통계
+        self._done = 0
+        self._errors = 0
+        self._last_error: Optional[str] = None
+        self._backoff = 0.0
+        self._last_ok_at: Optional[float] = None
+
+    # ---- 제출 ----
+
+    def copy(self, rel: str) -> None:
+        self._submit({"op": "copy", "rel": rel})
+
+    def append(self, rel: str, line: str) -> None:
+        self._submit({"op": "append", "rel": rel, "line": line})
+
+    def _submit(self, op: Dict[str, Any]) -> None:
+        with self._lock:
+            op = {"id": self._next_id, **op, "at": time.time()}
+            self._next_id += 1
+            # 로컬 journal 에 먼저 (로컬 디스크라 빠름) → 죽어도 다음 시작 때 이어서
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            self._pending.append(op)
+            self._wake.notify()
+
+    # ---- 시작 / 정지 ----
+
+    def start(self) -> None:
+        """journal 에서 못 끝낸 작업을 읽고 복제 스레드를 띄운다."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            done_id = self._read_cursor()
+            for op in self._read_journal():
+                self._next_id = max(self._next_id, op["id"] + 1)
+                if op["id"] > done_id:
+                    self._pending.append(op)
+            self._next_id = max(self._next_id, done_id + 1)
+        if self._pending:
+            print(f"[replicator] resuming {len(self._pending)} pending ops")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="nas-replicator", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """스레드를 멈춘다. 남은 작업은 journal 에 있으니 다음 시작 때 이어서 한다."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        with self._lock:
+            self._wake.notify()
+        # NAS 에서 멈춰 있으면 기다리지 않고 내려간다 (daemon 스레드)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+            oldest = self._pending[0]["at"] if self._pending else None
+        return {
+            "remote_root": str(self.remote_root),
+            "pending": pending,
+            # 가장 오래 기다린 작업이 몇 초째인지 (NAS 가 얼마나 뒤처졌는지)
+            "lag_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "done": self._done,
+            "errors": self._errors,
+            "last_error": self._last_error,
+            "backoff_s": self._backoff,
+            "last_ok_age_s": round(time.time() - self._last_ok_at, 1) if self._last_ok_at else None,
+        }
+
+    # ---- journal ----
+
+    def _read_cursor(self) -> int:
+        try:
+            return int(self.cursor_path.read_text(encoding="utf-8").strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_cursor(self, done_id: int) -> None:
+        tmp = self.cursor_path.with_suffix(".tmp")
+        tmp.write_text(str(done_id), encoding="utf-8")
+        os.replace(tmp, self.cursor_path)
+
+    def _read_journal(self) -> list:
+        ops = []
+        try:
+            with self.journal_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 쓰다 끊긴 마지막 줄 (그 작업은 응답 전에 죽은 것)
+                        continue
+                    if isinstance(op, dict) and isinstance(op.get("id"), int):
+                        ops.append(op)
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def _compact(self, done_id: int) -> None:
+        """다 따라잡았으면 journal 을 비운다 (커서는 남겨서 id 가 이어지게)."""
+        with self._lock:
+            if self._pending:
+                return
+            try:
+                self.journal_path.unlink()
+            except FileNotFoundError:
+                pass
+        self._write_cursor(done_id)
+
+    # ---- 복제 스레드 ----
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                while not self._pending and not self._stop.is_set():
+                    self._wake.wait()
+                if self._stop.is_set():
+                    return
+                op = self._pending[0]
+
+            try:
+                self._apply(op)
+            except Exception as e:
+                # NAS 가 멈췄거나 빠졌다 → 같은 작업을 쉬었다가 다시
+                self._errors += 1
+                self._last_error = f"{op['op']} {op['rel']}: {e}"
+                self._backoff = min(self.retry_max, self._backoff * 2 or self.retry_min)
+                print(f"[replicator] {self._last_error} (retry in {self._backoff:.1f}s)")
+                self._stop.wait(self._backoff)
+                continue
+
+            self._backoff = 0.0
+            self._done += 1
+            self._last_ok_at = time.time()
+            with self._lock:
+                self._pending.popleft()
+                caught_up = not self._pending
+            try:
+                if caught_up:
+                    self._compact(op["id"])
+                else:
+                    self._write_cursor(op["id"])
+            except OSError as e:
+                # 커서를 못 남기면 재시작 때 한 번 더 할 뿐 (copy 는 건너뛰고, 목록 줄은 중복돼도 마지막 줄이 이김)
+                print(f"[replicator] cursor write error: {e}")
+
+    def _remote_dir(self, rel: str) -> Path:
+        if not self.remote_root.is_dir():
+            # 마운트 지점(부모)이 있을 때만 루트를 만든다.
+            self.remote_root.mkdir(exist_ok=True)
+        target = self.remote_root / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        rel = op["rel"]
+        if op["op"] == "copy":
+            src = self.local_root / rel
+            if not src.is_file():
+                # 로컬에서 이미 지워진 것 → 할 일 없음
+                return
+            dst = self._remote_dir(rel)
+            size = src.stat().st_size
+            try:
+                if dst.stat().st_size == size:
+                    return
+            except FileNotFoundError:
+                pass
+            tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+            try:
+                with src.open("rb") as fin, tmp.open("wb") as fout:
+                    shutil.copyfileobj(fin, fout, COPY_CHUNK)
+                    fout.flush()
+                    os.fsync(fout.fileno())
+                os.replace(tmp, dst)
+            except BaseException:
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+                raise
+        elif op["op"] == "append":
+            dst = self._remote_dir(rel)
+            with dst.open("a", encoding="utf-8") as f:
+                f.write(op["line"])
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            print(f"[replicator] unknown op skipped: {op}")
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # 없으면 gzip 만
+    brotli = None
+
+"""
+포털 정적 파일(portal/) 캐시 친화 서빙 (v1).
+
+chat.html(80KB 가까이) / index.html / style.css / 배경 JPEG 를 그냥 StaticFiles 로 내보내서
+폰에서 페이지를 열 때마다 캐시 정책 없이 전부 다시 받았다. 여기서는 startup 때 한 번:
+
+- portal/ 아래 파일을 전부 읽어서 내용 해시(ETag) 를 만들고
+- HTML / CSS 안의 로컬 참조(href / src / url(...))를 지문 붙은 이름으로 바꿔 쓴다
+      style.css            → style.3f2a9c1b7d.css
+      backgrounds/a.jpg    → backgrounds/a.81c0e2d4aa.jpg
+- 텍스트(html/css/js/json/svg)는 gzip(+ brotli 모듈이 있으면 br) 으로 미리 압축해 둔다
+
+응답:
+- 지문 붙은 URL → 1년 immutable (내용이 바뀌면 이름이 바뀐다)
+- 원래 이름 (chat.html 처럼 주소창에 치는 것) → no-cache + ETag → 다시 열 때는 304 한 번
+- Accept-Encoding 에 따라 br / gzip / 원본
+
+파일이 바뀌면 (개발 중 수정 등) check_interval 초마다 한 번 stat 해서 다시 만든다.
+/uploads 처럼 큰 파일은 file_response() 로: Range(206) 는 FileResponse 가, If-None-Match(304) 는 여기서.
+
+    from portal_core.static_assets import StaticAssets, file_response
+"""
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".webmanifest"}
+# 안의 참조를 지문 이름으로 바꿔 쓰는 파일 (js 는 문자열 조립이 많아 건드리지 않는다)
+REWRITABLE = {".html", ".css"}
+MIN_COMPRESS_BYTES = 512
+FINGERPRINT_LEN = 10
+
+_REF_RE = re.compile(
+    r"""(?P<attr>(?:href|src)\s*=\s*["'])(?P<a>[^"']+)(?=["'])"""
+    r"""|(?P<fn>url\(\s*["']?)(?P<u>[^"')]+)(?=["']?\s*\))"""
+)
+_EXTERNAL = ("http:", "https:", "data:", "blob:", "mailto:", "//", "#")
+
+
+class Asset(NamedTuple):
+    rel: str
+    data: bytes
+    gzip: Optional[bytes]
+    br: Optional[bytes]
+    etag: str
+    media_type: str
+    fingerprinted: str
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 헤더에 etag(따옴표 없이)가 있는지. 압축본 꼬리표(-gzip/-br)와 W/ 는 무시."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    cache_control: str,
+    media_type: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None,
+) -> Response:
+    """디스크 파일 응답: Range 요청은 FileResponse 가 206 으로, 같은 ETag 면 304.
+
+    NAS 에 있을 수 있는 파일은 stat_result 를 스레드에서 미리 구해서 넘길 것 (여기서 stat 하면 이벤트 루프가 멈춘다).
+    """
+    if stat_result is None:
+        stat_result = os.stat(path)
+    response = FileResponse(path, media_type=media_type, stat_result=stat_result, headers={"Cache-Control": cache_control})
+    etag = response.headers["etag"]
+    if etag_matches(request.headers.get("if-none-match"), etag.strip('"')):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return response
+
+
+def _fingerprint_name(rel: str, digest: str) -> str:
+    p = PurePosixPath(rel)
+    return str(p.with_name(f"{p.stem}.{digest[:FINGERPRINT_LEN]}{p.suffix}"))
+
+
+def _compress(data: bytes, suffix: str) -> Tuple[Optional[bytes], Optional[bytes]]:
+    if suffix not in COMPRESSIBLE or len(data) < MIN_COMPRESS_BYTES:
+        return None, None
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    br = brotli.compress(data, quality=11) if brotli is not None else None
+    # 줄지 않으면 원본만
+    return (gz if len(gz) < len(data) else None), (br if br is not None and len(br) < len(data) else None)
+
+
+def _route_path(scope) -> str:
+    # Mount 아래에서 마운트 경로를 뺀 나머지 (StaticFiles 와 같은 방식)
+    path = scope["path"]
+    root = scope.get("root_path", "")
+    if root and path.startswith(root):
+        return path[len(root):]
+    return path
+
+
+class StaticAssets:
+    """portal/ 디렉터리 하나를 메모리에 올려서 내보내는 ASGI 앱 (/static, /portal 에 같이 마운트)."""
+
+    def __init__(self, directory: Path, prefixes: Iterable[str] = ("/static", "/portal"), check_interval: float = 2.0) -> None:
+        self.directory = directory
+        self.prefixes = tuple(p.rstrip("/") + "/" for p in prefixes)
+        self.check_interval = check_interval
+        self._assets: Dict[str, Asset] = {}
+        # 지문 이름 → Asset. 다시 만들어도 예전 지문은 남겨 둔다 (이미 열린 페이지가 참조할 수 있음)
+        self._fingerprinted: Dict[str, Asset] = {}
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._build_lock = threading.Lock()
+
+    # ---- 만들기 ----
+
+    def _scan(self) -> tuple:
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            # .DS_Store / .git 등 점으로 시작하는 것은 내보내지 않는다
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if name.startswith("."):
+                    continue
+                path = Path(dirpath) / name
+                st = path.stat()
+                files.append((path.relative_to(self.directory).as_posix(), st.st_mtime_ns, st.st_size))
+        return tuple(files)
+
+    def _resolve(self, ref: str, base_dir: str, known: Dict[str, Asset]) -> Optional[Tuple[str, str]]:
+        """참조 문자열 → (경로 부분, 가리키는 asset rel). 로컬 asset 이 아니면 None."""
+        if ref.startswith(_EXTERNAL) or "${" in ref:
+            return None
+        path = re.split(r"[?#]", ref, maxsplit=1)[0]
+        if not path:
+            return None
+        if path.startswith("/"):
+            rel = next((path[len(p):] for p in self.prefixes if path.startswith(p)), None)
+        else:
+            rel = posixpath.normpath(posixpath.join(base_dir, path))
+        if rel is None or rel.startswith("..") or rel not in known:
+            return None
+        return path, rel
+
+    def _rewrite(self, text: str, rel: str, known: Dict[str, Asset]) -> str:
+        base_dir = posixpath.dirname(rel)
+
+        def repl(m: re.Match) -> str:
+            prefix = m.group("attr") or m.group("fn")
+            ref = m.group("a") if m.group("attr") else m.group("u")
+            hit = self._resolve(ref.strip(), base_dir, known)
+            if hit is None:
+                return m.group(0)
+            path, target = hit
+            # 마지막 이름만 지문 이름으로 (상대/절대 모양은 그대로)
+            new_name = PurePosixPath(known[target].fingerprinted).name
+            new_path = path[: len(path) - len(PurePosixPath(path).name)] + new_name
+            return prefix + ref.strip().replace(path, new_path, 1)
+
+        return _REF_RE.sub(repl, text)
+
+    def build(self) -> None:
+        """portal/ 전체를 다시 읽고 (참조 바꿔 쓰기 → 해시 → 압축) 교체한다."""
+        with self._build_lock:
+            signature = self._scan()
+            rels = [rel for rel, _, _ in signature]
+            # 참조 당하는 것(이미지/js) → css → html 순서로 만들어야 지문이 확정된다
+            order = {".css": 1, ".html": 2}
+            rels.sort(key=lambda r: order.get(PurePosixPath(r).suffix.lower(), 0))
+
+            assets: Dict[str, Asset] = {}
+            for rel in rels:
+                suffix = PurePosixPath(rel).suffix.lower()
+                data = (self.directory / rel).read_bytes()
+                if suffix in REWRITABLE:
+                    try:
+                        data = self._rewrite(data.decode("utf-8"), rel, assets).encode("utf-8")
+                    except UnicodeDecodeError:
+                        pass
+                digest = hashlib.sha256(data).hexdigest()
+                gz, br = _compress(data, suffix)
+                media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+                assets[rel] = Asset(rel, data, gz, br, digest[:16], media_type, _fingerprint_name(rel, digest))
+
+            self._assets = assets
+            self._fingerprinted.update({a.fingerprinted: a for a in assets.values()})
+            self._signature = signature
+
+    async def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        signature = await asyncio.to_thread(self._scan)
+        if signature != self._signature:
+            await asyncio.to_thread(self.build)
+
+    def stats(self) -> Dict[str, object]:
+        assets = list(self._assets.values())
+        return {
+            "assets": len(assets),
+            "bytes": sum(len(a.data) for a in assets),
+            "gzip_bytes": sum(len(a.gzip or a.data) for a in assets),
+            "br": brotli is not None,
+        }
+
+    # ---- 서빙 ----
+
+    async def response(self, request: Request, path: str) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return Response(status_code=405, headers={"Allow": "GET, HEAD"})
+        await self._refresh()
+
+        rel = path.lstrip("/")
+        if rel == "" or rel.endswith("/"):
+            rel += "index.html"
+        asset, cache = self._fingerprinted.get(rel), IMMUTABLE
+        if asset is None:
+            asset, cache = self._assets.get(rel), REVALIDATE
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        body, encoding = asset.data, None
+        accept = request.headers.get("accept-encoding", "")
+        if asset.br is not None and "br" in accept:
+            body, encoding = asset.br, "br"
+        elif asset.gzip is not None and "gzip" in accept:
+            body, encoding = asset.gzip, "gzip"
+
+        # 압축본마다 다른 표현이므로 ETag 도 구분한다 (비교는 etag_matches 가 꼬리표를 떼고)
+        headers = {"ETag": f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"', "Cache-Control": cache}
+        if asset.gzip is not None or asset.br is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=asset.media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        request = Request(scope, receive)
+        response = await self.response(request, _route_path(scope))
+        await response(scope, receive, send)
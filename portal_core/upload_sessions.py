@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from portal_core import upload_stream
+
+"""
+이어 올리기(resumable) 업로드 세션 (v1).
+
+폰에서 큰 동영상을 올리다 Wi-Fi 가 끊기면 /api/upload 한 방짜리 multipart 는 처음부터 다시였다.
+세션 방식은:
+
+    1) create(name, size, ...)          → upload_id (세션 정보는 디스크에)
+    2) write(upload_id, offset, 본문)    → 지금까지 받은 바이트 수 (offset 은 받은 크기와 같아야 함)
+    3) 끊기면 status(upload_id)          → offset 부터 다시 write
+    4) finish(upload_id)                 → ReceivedFile (SHA-256 포함) → BlobStore.put 으로 제자리에
+
+- 받은 바이트는 staging_dir/sessions/<id>.part 에 바로 붙여 쓴다 → 조각 중간에 끊겨도 거기까지는 남는다
+- 받은 크기(offset)는 .part 파일 크기 그 자체 → 포털이 재시작돼도 이어서 받을 수 있다
+- SHA-256 은 받으면서 메모리에서 이어 계산하고, 재시작 등으로 끊겼으면 finish 때 파일을 다시 읽는다
+- 세션 하나에 동시에 두 write 는 안 받는다 (UploadSessionBusy)
+
+    from portal_core.upload_sessions import UploadSessionStore
+"""
+
+SESSION_DIR = "sessions"
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSessionNotFound(Exception):
+    """없는(끝났거나 지워진) 세션."""
+
+
+class UploadSessionBusy(Exception):
+    """같은 세션에 다른 write/finish 가 진행 중."""
+
+
+class UploadOffsetMismatch(Exception):
+    """보낸 offset 이 서버가 받은 크기와 다름. .offset 부터 다시 보내면 된다."""
+
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"offset 은 {offset} 이어야 함")
+        self.offset = offset
+
+
+class UploadSessionIncomplete(Exception):
+    """아직 다 안 받았는데 finish."""
+
+    def __init__(self, offset: int, size: int) -> None:
+        super().__init__(f"{size} 바이트 중 {offset} 바이트만 받음")
+        self.offset = offset
+
+
+class UploadChecksumMismatch(Exception):
+    """클라이언트가 알려 준 SHA-256 과 받은 내용이 다름 (세션은 지운다)."""
+
+
+class UploadSessionStore:
+    def __init__(
+        self,
+        staging_dir: Path,
+        max_bytes: int,
+        client_chunk: int = 8 * 1024 * 1024,
+        chunk_size: int = upload_stream.UPLOAD_CHUNK,
+    ) -> None:
+        self.dir = staging_dir / SESSION_DIR
+        self.max_bytes = max_bytes
+        # 클라이언트에게 권하는 PUT 한 번 크기 (끊기면 최대 이만큼 다시 보냄)
+        self.client_chunk = client_chunk
+        # 디스크에 모아서 쓰는 단위
+        self.chunk_size = chunk_size
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # upload_id → (받은 만큼 이어 계산한 해시, 그 해시가 덮는 바이트 수)
+        self._hashers: Dict[str, Tuple[Any, int]] = {}
+
+    # ---- 경로 / 메타 ----
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}.json"
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}{upload_stream.PART_SUFFIX}"
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        if not _ID_RE.match(upload_id or ""):
+            raise UploadSessionNotFound(upload_id)
+        try:
+            with self._meta_path(upload_id).open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            raise UploadSessionNotFound(upload_id)
+
+    def _received(self, upload_id: str) -> int:
+        try:
+            return self._part_path(upload_id).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        lock = self._locks.get(upload_id)
+        if lock is None:
+            lock = self._locks[upload_id] = asyncio.Lock()
+        if lock.locked():
+            raise UploadSessionBusy(upload_id)
+        return lock
+
+    def _forget(self, upload_id: str) -> None:
+        self._locks.pop(upload_id, None)
+        self._hashers.pop(upload_id, None)
+
+    def _view(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        return {**meta, "offset": self._received(meta["upload_id"]), "chunk_size": self.client_chunk}
+
+    # ---- 세션 ----
+
+    def create(
+        self,
+        name: str,
+        size: int,
+        content_type: Optional[str],
+        upload_profile: str,
+        sha256: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if size < 0:
+            raise upload_stream.UploadFormError("size 가 음수")
+        if size > self.max_bytes:
+            raise upload_stream.UploadTooLarge(f"{name}: {self.max_bytes} 바이트 초과")
+        meta = {
+            "upload_id": uuid.uuid4().hex,
+            "name": name,
+            "size": size,
+            "type": content_type,
+            "upload_profile": upload_profile,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._part_path(meta["upload_id"]).touch()
+        # 메타는 임시 파일 → rename (반쯤 쓴 json 이 안 보이게)
+        tmp = self._meta_path(meta["upload_id"]).with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._meta_path(meta["upload_id"]))
+        self._hashers[meta["upload_id"]] = (hashlib.sha256(), 0)
+        return self._view(meta)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        return self._view(self._load(upload_id))
+
+    async def write(self, upload_id: str, offset: int, stream: AsyncIterator[bytes]) -> int:
+        """offset 부터 본문을 붙여 쓴다. 끊겨도 받은 데까지는 남긴다. 새 offset 을 돌려준다."""
+        meta = self._load(upload_id)
+        async with self._lock(upload_id):
+            received = self._received(upload_id)
+            if offset != received:
+                raise UploadOffsetMismatch(received)
+
+            hasher, covered = self._hashers.get(upload_id, (None, -1))
+            if covered != received:
+                # 재시작 뒤 등 → 해시는 finish 때 파일에서 다시
+                hasher = None
+            size = meta["size"]
+            f = await asyncio.to_thread(self._part_path(upload_id).open, "ab")
+            buf = bytearray()
+            try:
+                async for chunk in stream:
+                    if received + len(buf) + len(chunk) > size:
+                        raise upload_stream.UploadTooLarge(f"{meta['name']}: 선언한 크기 {size} 초과")
+                    buf += chunk
+                    if len(buf) >= self.chunk_size:
+                        data = bytes(buf)
+                        buf.clear()
+                        await asyncio.to_thread(self._append, f, hasher, data)
+                        received += len(data)
+            finally:
+                # 조각 중간에 끊겼어도 받은 만큼은 붙여 둔다 (다음 offset 이 여기서부터)
+                if buf:
+                    self._append(f, hasher, bytes(buf))
+                    received += len(buf)
+                f.close()
+                if hasher is not None:
+                    self._hashers[upload_id] = (hasher, received)
+                else:
+                    self._hashers.pop(upload_id, None)
+            return received
+
+    @staticmethod
+    def _append(f, hasher, data: bytes) -> None:
+        f.write(data)
+        f.flush()
+        if hasher is not None:
+            hasher.update(data)
+
+    async def finish(self, upload_id: str, field: str = "files") -> Tuple[Dict[str, Any], upload_stream.ReceivedFile]:
+        """다 받은 세션 → (세션 메타, ReceivedFile). 메타 파일은 지우고 .part 는 호출한 쪽이 commit/discard 한다."""
+        meta = self._load(upload_id)
+        async with self._lock(upload_id):
+            received = self._received(upload_id)
+            if received != meta["size"]:
+                raise UploadSessionIncomplete(received, meta["size"])
+
+            hasher, covered = self._hashers.get(upload_id, (None, -1))
+            if covered == received:
+                sha256 = hasher.hexdigest()
+            else:
+                sha256 = await asyncio.to_thread(self._hash_file, self._part_path(upload_id))
+
+            part = self._part_path(upload_id)
+            if meta.get("sha256") and meta["sha256"] != sha256:
+                await asyncio.to_thread(self._remove, upload_id)
+                raise UploadChecksumMismatch(f"{meta['name']}: sha256 {sha256} != {meta['sha256']}")
+
+            self._meta_path(upload_id).unlink(missing_ok=True)
+        self._forget(upload_id)
+        return meta, upload_stream.ReceivedFile(field, meta["name"], meta.get("type"), part, received, sha256)
+
+    def _hash_file(self, path: Path) -> str:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            while True:
+                block = f.read(self.chunk_size)
+                if not block:
+                    break
+                h.update(block)
+        return h.hexdigest()
+
+    def _remove(self, upload_id: str) -> None:
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self._part_path(upload_id).unlink(missing_ok=True)
+        self._forget(upload_id)
+
+    async def abort(self, upload_id: str) -> None:
+        self._load(upload_id)
+        async with self._lock(upload_id):
+            await asyncio.to_thread(self._remove, upload_id)
+
+    def sweep(self, max_age: float = 7 * 24 * 3600) -> int:
+        """마지막으로 받은 지 max_age 초 지난 세션 정리 (폰이 영영 안 돌아온 것). 지운 세션 수."""
+        removed = 0
+        cutoff = time.time() - max_age
+        try:
+            metas = list(self.dir.glob("*.json"))
+        except OSError:
+            return 0
+        for meta in metas:
+            upload_id = meta.stem
+            part = self._part_path(upload_id)
+            try:
+                last = part.stat().st_mtime if part.exists() else meta.stat().st_mtime
+                if last < cutoff:
+                    self._remove(upload_id)
+                    removed += 1
+            except OSError:
+                continue
+        # 메타 없이 남은 .part (finish 뒤 옮기다 죽은 것 등)
+        for part in self.dir.glob(f"*{upload_stream.PART_SUFFIX}"):
+            try:
+                if not self._meta_path(part.stem).exists() and part.stat().st_mtime < cutoff:
+                    part.unlink()
+            except OSError:
+                continue
+        return removed
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+"""
+/api/upload 스트리밍 수신 (v1).
+
+예전에는 Starlette 가 파일 전체를 임시 파일로 받아 둔 다음 `await uf.read()` 로
+통째로 메모리에 올려서 NAS 에 한 번에 썼다 → 폰 동영상 하나가 1GB Pi 메모리에 그대로 앉았다.
+
+여기서는 요청 본문(multipart/form-data)을 request.stream() 에서 바로 파싱해서:
+
+- 파일 파트는 staging_dir(업로드 루트와 같은 파일시스템) 아래 임시 파일(.part)로
+  chunk_size 씩 모아서 쓴다 (쓰기 + SHA-256 은 워커 스레드에서)
+- max_bytes 를 넘는 순간 멈추고 UploadTooLarge (임시 파일은 지운다)
+- 다 받은 파일만 commit() 에서 os.replace 로 제자리에 옮긴다 → 반쯤 쓴 파일이 보이지 않는다
+
+파일 하나를 얼마나 크게 올려도 메모리는 chunk_size + 요청 조각 하나 정도로 일정하다.
+
+    from portal_core.upload_stream import receive_multipart, UploadTooLarge, UploadFormError
+"""
+
+UPLOAD_CHUNK = 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+PART_SUFFIX = ".part"
+
+
+class UploadFormError(Exception):
+    """multipart 본문이 깨졌거나 모양이 이상한 경우."""
+
+
+class UploadTooLarge(Exception):
+    """파일 하나가 max_bytes 를 넘은 경우."""
+
+
+class ReceivedFile(NamedTuple):
+    field: str
+    filename: str
+    content_type: Optional[str]
+    temp_path: Path
+    size: int
+    sha256: str
+
+
+class _IncomingFile:
+    """받는 중인 파일 하나: 임시 파일 + 쓰기 버퍼 + 해시."""
+
+    def __init__(self, staging_dir: Path, field: str, filename: str, content_type: Optional[str]) -> None:
+        fd, path = tempfile.mkstemp(prefix=".upload-", suffix=PART_SUFFIX, dir=staging_dir)
+        self._f = os.fdopen(fd, "wb")
+        self.path = Path(path)
+        self.field = field
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> int:
+        self._buf += data
+        self.size += len(data)
+        return len(self._buf)
+
+    def take(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+    # ---- 워커 스레드에서 ----
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self._f.write(data)
+
+    def finish(self, data: bytes) -> ReceivedFile:
+        self.write(data)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        return ReceivedFile(
+            self.field, self.filename, self.content_type, self.path, self.size, self._hash.hexdigest()
+        )
+
+    def discard(self) -> None:
+        try:
+            self._f.close()
+        except OSError:
+            pass
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def _header_params(value: bytes) -> Dict[bytes, bytes]:
+    return parse_options_header(value)[1]
+
+
+async def receive_multipart(
+    headers,
+    stream: AsyncIterator[bytes],
+    staging_dir: Path,
+    max_bytes: int,
+    chunk_size: int = UPLOAD_CHUNK,
+) -> tuple[Dict[str, str], List[ReceivedFile]]:
+    """multipart 본문을 흘려 받으면서 파일은 임시 파일로, 나머지 필드는 문자열로.
+
+    실패하면(크기 초과/깨진 본문/끊김) 그때까지 만든 임시 파일은 모두 지운다.
+    성공하면 돌려받은 ReceivedFile.temp_path 를 commit() 하거나 discard() 해야 한다.
+    """
+    content_type, params = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadFormError("multipart/form-data 요청이 아님")
+
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    # 파서 콜백은 동기라서, 이벤트만 모아 두고 요청 조각마다 아래 루프에서 처리한다.
+    events: List[tuple] = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        events.append(("header", bytes(header_field).lower(), bytes(header_value)))
+        header_field.clear()
+        header_value.clear()
+
+    callbacks = {
+        "on_part_begin": lambda: events.append(("begin",)),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("headers_done",)),
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end",)),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+
+    fields: Dict[str, str] = {}
+    received: List[ReceivedFile] = []
+    part_headers: Dict[bytes, bytes] = {}
+    current: Optional[_IncomingFile] = None
+    field_name: Optional[str] = None
+    field_buf = bytearray()
+
+    try:
+        async for chunk in stream:
+            try:
+                parser.write(chunk)
+            except Exception as e:
+                raise UploadFormError(f"multipart 파싱 오류: {e}") from e
+
+            for ev in events:
+                kind = ev[0]
+                if kind == "begin":
+                    part_headers = {}
+                    current, field_name = None, None
+                    field_buf.clear()
+                elif kind == "header":
+                    part_headers[ev[1]] = ev[2]
+                elif kind == "headers_done":
+                    disp = _header_params(part_headers.get(b"content-disposition", b""))
+                    name = disp.get(b"name", b"").decode("utf-8", "replace")
+                    if b"filename" in disp:
+                        filename = disp[b"filename"].decode("utf-8", "replace")
+                        ctype = part_headers.get(b"content-type")
+                        current = _IncomingFile(
+                            staging_dir, name, filename, ctype.decode("latin-1") if ctype else None
+                        )
+                    else:
+                        field_name = name
+                elif kind == "data":
+                    if current is not None:
+                        if current.size + len(ev[1]) > max_bytes:
+                            raise UploadTooLarge(f"{current.filename}: {max_bytes} 바이트 초과")
+                        if current.feed(ev[1]) >= chunk_size:
+                            await asyncio.to_thread(current.write, current.take())
+                    else:
+                        field_buf.extend(ev[1])
+                        if len(field_buf) > MAX_FIELD_BYTES:
+                            raise UploadFormError(f"필드 {field_name} 가 너무 김")
+                elif kind == "end":
+                    if current is not None:
+                        done = current
+                        current = None
+                        received.append(await asyncio.to_thread(done.finish, done.take()))
+                    elif field_name is not None:
+                        fields[field_name] = field_buf.decode("utf-8", "replace")
+                        field_name = None
+            events.clear()
+
+        parser.finalize()
+        if current is not None:
+            raise UploadFormError("본문이 파일 중간에서 끝남")
+    except BaseException:
+        # 크기 초과 / 깨진 본문 / 클라이언트 끊김(취소) 모두 임시 파일 정리
+        if current is not None:
+            await asyncio.to_thread(current.discard)
+        for f in received:
+            discard(f)
+        raise
+
+    return fields, received
+
+
+# ---- 제자리로 옮기기 / 버리기 ----
+
+
+def commit(received: ReceivedFile, target: Path) -> Path:
+    """임시 파일을 target 으로 원자적으로 옮긴다 (같은 이름이 있으면 바꿔치기)."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(received.temp_path, target)
+    try:
+        # 이름 바꾼 것까지 디스크에 (NAS 에 따라 디렉터리 fsync 가 안 될 수 있음 → 무시)
+        dir_fd = os.open(target.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return target
+
+
+def discard(received: ReceivedFile) -> None:
+    try:
+        received.temp_path.unlink()
+    except OSError:
+        pass
+
+
+def sweep_stale_parts(staging_dir: Path, max_age: float = 24 * 3600) -> int:
+    """프로세스가 죽어서 남은 오래된 .part 파일 정리. 지운 개수."""
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(staging_dir.glob(f".upload-*{PART_SUFFIX}"))
+    except OSError:
+        return 0
+    for p in entries:
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,170 @@
+"""
+bench_chat_ttft.py
+
+채팅 첫 토큰 시간(TTFT) 벤치마크 (/api/chat vs /api/chat/stream).
+
+- 임시 작업 폴더에서 director(main.py, DIRECTOR_MODEL_BACKEND=fake)와 포털(app.py)을 같이 띄운다.
+  가짜 모델은 --ttft 초 뒤 첫 조각, 이후 --chunk-delay 초마다 한 조각씩 낸다. (Gemini 키/네트워크 필요 없음)
+- 같은 질문을 두 방식으로 --rounds 번씩 보낸다.
+    chat   : /api/chat        → 응답 전체가 와야 화면에 뭔가 뜬다 (TTFT = 전체 시간)
+    stream : /api/chat/stream → 첫 {"delta"} 줄이 온 시각이 TTFT
+- p50/p95 를 출력하고, 히스토리가 턴마다 2줄(user + assistant)씩만 늘었는지도 확인한다.
+  (스트림은 done 이후에만 기록)
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_chat_ttft.py --rounds 10 --ttft 0.8 --chunk-delay 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+async def _serve(app, port: int) -> tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _one_chat(client: httpx.AsyncClient, text: str) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    r = await client.post("/api/chat", json={"messages": [{"role": "user", "content": text}]})
+    r.raise_for_status()
+    total = time.perf_counter() - t0
+    return total, total
+
+
+async def _one_stream(client: httpx.AsyncClient, text: str) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    first = None
+    done = False
+    payload = {"messages": [{"role": "user", "content": text}]}
+    async with client.stream("POST", "/api/chat/stream", json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            msg = json.loads(line)
+            if "error" in msg:
+                raise RuntimeError(msg["error"])
+            if "delta" in msg and first is None:
+                first = time.perf_counter() - t0
+            if msg.get("done"):
+                done = True
+    if not done or first is None:
+        raise RuntimeError("stream ended without delta/done")
+    return first, time.perf_counter() - t0
+
+
+async def _history_etag(client: httpx.AsyncClient) -> str:
+    r = await client.get("/api/history", params={"limit": 1})
+    r.raise_for_status()
+    return r.headers["ETag"].strip('"')
+
+
+async def _history_added(client: httpx.AsyncClient, since: str) -> int:
+    r = await client.get("/api/history", params={"since_etag": since})
+    r.raise_for_status()
+    return len(r.json())
+
+
+def _report(label: str, ttft: list[float], total: list[float]) -> None:
+    print(f"[ttft] {label:6s} n={len(ttft):3d}"
+          f"  ttft p50={statistics.median(ttft) * 1000:7.1f} ms  p95={_percentile(ttft, 0.95) * 1000:7.1f} ms"
+          f"  total p50={statistics.median(total) * 1000:7.1f} ms")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import main as director_main
+    from director_core import recent_context
+
+    # 벤치 대화가 실제 recent_context.json 에 섞이지 않게 임시 폴더로 돌린다.
+    recent_context.STORAGE_DIR = Path.cwd() / "director_storage"
+    recent_context.STORAGE_PATH = recent_context.STORAGE_DIR / "recent_context.json"
+    director_main._contexts = recent_context.RecentContextSessions(recent_context.STORAGE_DIR)
+
+    director, director_task = await _serve(director_main.app, args.director_port)
+
+    import app as portal
+
+    portal_server, portal_task = await _serve(portal.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+
+    async with httpx.AsyncClient(base_url=base, timeout=None) as client:
+        since = await _history_etag(client)
+        results = {"chat": ([], []), "stream": ([], [])}
+        for i in range(args.rounds):
+            for label, fn in (("chat", _one_chat), ("stream", _one_stream)):
+                ttft, total = await fn(client, f"벤치 {i} 오늘 촬영 장면 정리해줘")
+                results[label][0].append(ttft)
+                results[label][1].append(total)
+        # 기록은 writer 스레드가 하므로 잠깐 기다렸다가 센다.
+        await asyncio.sleep(0.3)
+        added = await _history_added(client, since)
+
+    for label, (ttft, total) in results.items():
+        _report(label, ttft, total)
+    expected = args.rounds * 2 * 2
+    print(f"[ttft] history +{added} lines (expected {expected}: 턴마다 user + assistant)")
+
+    for server in (portal_server, director):
+        server.should_exit = True
+    await asyncio.gather(portal_task, director_task)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="채팅 첫 토큰 시간(TTFT) 벤치마크")
+    parser.add_argument("--rounds", type=int, default=10, help="방식별 요청 수")
+    parser.add_argument("--ttft", type=float, default=0.8, help="가짜 모델 첫 조각 지연(초)")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="가짜 모델 조각 사이 지연(초)")
+    parser.add_argument("--reply-chars", type=int, default=400, help="가짜 모델 응답 글자 수")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--director-port", type=int, default=8898)
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="bench_ttft_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    # akashic/ 는 링크하지 않고 원본만 복사 → startup 때 만드는 컴파일본도 임시 폴더에 생긴다
+    (workdir / "akashic").mkdir()
+    for src in (ROOT / "akashic").glob("burned_room_*.jsonl"):
+        shutil.copy2(src, workdir / "akashic" / src.name)
+    os.chdir(workdir)
+    os.environ["DIRECTOR_CORE_URL"] = f"http://127.0.0.1:{args.director_port}"
+    os.environ["DIRECTOR_MODEL_BACKEND"] = "fake"
+    os.environ["FAKE_MODEL_TTFT"] = str(args.ttft)
+    os.environ["FAKE_MODEL_CHUNK_DELAY"] = str(args.chunk_delay)
+    os.environ["FAKE_MODEL_REPLY_CHARS"] = str(args.reply_chars)
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(ROOT / "director_server_v1"))
+    print(f"[ttft] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
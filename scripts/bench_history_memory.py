@@ -0,0 +1,170 @@
+"""
+bench_history_memory.py
+
+히스토리 로드 메모리 벤치마크 (예전 방식 vs 지금 방식).
+
+- 임시 폴더에 포털 히스토리 두 벌(sowon.chat.jsonl / sowon.chat.mac.jsonl, 절반은 겹치는 발화)을 만든다.
+- 자식 프로세스를 따로 띄워서 각각 한 가지 방식으로 전체 히스토리를 메모리에 올린다.
+    before : 예전 _load_history 방식 ("id|role|본문" 문자열 dedup 키 + 항목마다 pydantic HistoryItem)
+    after  : 지금 HistoryCache 방식 (16바이트 다이제스트 dedup 키 + 튜플 기반 HistoryEntry)
+- tracemalloc 최고치 / 로드 후 남은 양, 그리고 프로세스 최대 RSS(ru_maxrss)를 출력한다.
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_history_memory.py --messages 20000 --chars 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_SYLLABLES = "가나다라마바사아자차카타파하소원부감독촬영편집장면이야기오늘내일정리"
+
+
+def _make_history(workdir: Path, messages: int, chars: int, seed: int = 7) -> list[str]:
+    """포털 히스토리 파일 두 개를 만든다. mac 쪽은 절반이 pi 쪽과 같은 발화(중복)."""
+    rng = random.Random(seed)
+    hist = workdir / "portal_history"
+    hist.mkdir(parents=True, exist_ok=True)
+    pi_path = hist / "sowon.chat.jsonl"
+    mac_path = hist / "sowon.chat.mac.jsonl"
+    with pi_path.open("w", encoding="utf-8") as pi, mac_path.open("w", encoding="utf-8") as mac:
+        for i in range(messages):
+            ts = f"2025-12-{1 + i // 86400:02d}T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}"
+            text = "".join(rng.choice(_SYLLABLES) for _ in range(chars))
+            line = json.dumps(
+                {"id": ts, "role": "user" if i % 2 == 0 else "assistant", "text": text, "timestamp": ts},
+                ensure_ascii=False,
+            )
+            pi.write(line + "\n")
+            if i % 2 == 0:
+                mac.write(line + "\n")
+    return [str(pi_path), str(mac_path)]
+
+
+# ---- before: 예전 _load_history 포털 부분 그대로 ----
+
+
+def _load_before(paths: list[str]) -> list:
+    from pydantic import BaseModel
+
+    class HistoryItem(BaseModel):
+        id: str
+        role: str
+        content: str
+        timestamp: str
+        attachments: Optional[list[dict]] = None
+
+    items_by_key: dict[str, HistoryItem] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                data = json.loads(line)
+                role = data.get("role") or "assistant"
+                text = data.get("text") or ""
+                ts = data.get("timestamp") or ""
+                msg_id = data.get("id") or ts or ""
+                key = f"{msg_id}|{role}|{text}"
+                items_by_key[key] = HistoryItem(
+                    id=msg_id or key, role=role, content=text, timestamp=ts, attachments=None
+                )
+    # 예전 코드는 dedup 사전을 들고 있는 채로 정렬 리스트를 만든다.
+    return [items_by_key, sorted(items_by_key.values(), key=lambda x: x.id)]
+
+
+# ---- after: 지금 HistoryCache ----
+
+
+def _load_after(paths: list[str]) -> object:
+    from portal_core.burned_archive import BurnedArchive
+    from portal_core.history_cache import HistoryCache
+
+    archive = BurnedArchive([], Path(tempfile.mkdtemp()) / "empty.compiled.json")
+    archive.load()
+    cache = HistoryCache(paths, archive)
+    cache.sync()
+    return cache
+
+
+def _child(mode: str, paths: list[str]) -> None:
+    sys.path.insert(0, str(ROOT))
+    # import 비용은 양쪽 공통이므로 측정에서 뺀다.
+    import pydantic  # noqa: F401
+    import portal_core.history_cache  # noqa: F401
+
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    held = _load_before(paths) if mode == "before" else _load_after(paths)
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # 맥은 바이트 단위
+        rss_kb //= 1024
+    print(json.dumps({
+        "mode": mode,
+        "load_s": elapsed,
+        "peak_mb": peak / 2**20,
+        "retained_mb": current / 2**20,
+        "maxrss_mb": rss_kb / 1024,
+        "kept": held is not None,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="히스토리 로드 메모리 벤치마크")
+    parser.add_argument("--messages", type=int, default=20000, help="pi 쪽 발화 수 (mac 쪽은 절반이 중복)")
+    parser.add_argument("--chars", type=int, default=600, help="발화당 글자 수")
+    parser.add_argument("--child", choices=("before", "after"), help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.paths)
+        return
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_memory_"))
+    paths = _make_history(workdir, args.messages, args.chars)
+    size_mb = sum(os.path.getsize(p) for p in paths) / 2**20
+    print(f"[memory] workdir: {workdir}  files={size_mb:.1f} MB  messages={args.messages}")
+
+    results = {}
+    for mode in ("before", "after"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--paths", *paths],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+
+    for mode in ("before", "after"):
+        r = results[mode]
+        print(f"[memory] {mode:6s} load={r['load_s']:.2f}s  peak={r['peak_mb']:.1f} MB"
+              f"  retained={r['retained_mb']:.1f} MB  maxrss={r['maxrss_mb']:.1f} MB")
+    b, a = results["before"], results["after"]
+    print(f"[memory] peak {a['peak_mb'] / b['peak_mb']:.0%} of before,"
+          f" retained {a['retained_mb'] / b['retained_mb']:.0%},"
+          f" maxrss {a['maxrss_mb'] / b['maxrss_mb']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
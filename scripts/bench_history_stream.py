@@ -0,0 +1,137 @@
+"""
+bench_history_stream.py
+
+/api/history/stream (SSE) 푸시 채널 벤치마크.
+
+- 임시 작업 폴더에서 포털(app.py)을 uvicorn 으로 띄운다. (실제 portal_history 는 건드리지 않음)
+- SSE 구독자 N명을 동시에 붙인 뒤, 히스토리 writer 로 M건을 일정 간격으로 쓴다.
+- 각 구독자가 각 항목을 받기까지 걸린 시간(쓰기 → 수신)을 모아서 p50/p95/max 를 출력한다.
+- 마지막에 한 구독자를 끊었다가 Last-Event-ID 로 다시 붙여서 빠진 항목이 replay 되는지도 확인한다.
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_history_stream.py --subscribers 8 --events 200 --interval 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+async def _subscriber(base: str, expected: int, sent_at: dict, latencies: list, ready: asyncio.Event,
+                      last_id: str | None = None) -> tuple[int, str | None]:
+    """스트림을 열고 expected 개를 받을 때까지 읽는다. (받은 개수, 마지막 id)"""
+    headers = {"Last-Event-ID": last_id} if last_id else {}
+    got = 0
+    seen_id = last_id
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream("GET", f"{base}/api/history/stream", headers=headers) as resp:
+            ready.set()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                item = json.loads(line[len("data: "):])
+                now = time.perf_counter()
+                if item["content"] in sent_at:
+                    latencies.append(now - sent_at[item["content"]])
+                seen_id = item["id"]
+                got += 1
+                if got >= expected:
+                    break
+    return got, seen_id
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import app as portal
+
+    config = uvicorn.Config(portal.app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base = f"http://127.0.0.1:{args.port}"
+
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+
+    readies = [asyncio.Event() for _ in range(args.subscribers)]
+    subs = [
+        asyncio.create_task(_subscriber(base, args.events, sent_at, latencies, ev))
+        for ev in readies
+    ]
+    await asyncio.gather(*(ev.wait() for ev in readies))
+    await asyncio.sleep(0.2)
+
+    t0 = time.perf_counter()
+    for i in range(args.events):
+        text = f"bench {i}"
+        sent_at[text] = time.perf_counter()
+        portal._history_writer.submit([portal._history_record("user" if i % 2 == 0 else "assistant", text)])
+        await asyncio.sleep(args.interval)
+    results = await asyncio.wait_for(asyncio.gather(*subs), timeout=60)
+    elapsed = time.perf_counter() - t0
+
+    delivered = sum(n for n, _ in results)
+    print(f"[stream] subscribers={args.subscribers} events={args.events} delivered={delivered}"
+          f" ({delivered / (args.subscribers * args.events):.0%})")
+    print(f"[stream] wall={elapsed:.2f}s  throughput={delivered / elapsed:.0f} msg/s")
+    ms = [x * 1000 for x in latencies]
+    print(f"[stream] latency ms  p50={statistics.median(ms):.2f}  p95={_percentile(ms, 0.95):.2f}"
+          f"  max={max(ms):.2f}")
+
+    # 재접속 replay 확인: 중간 id 로 다시 붙어서 나머지를 다 받는지
+    history = portal._load_history(limit=args.events)
+    resume_from = history[len(history) // 2].id
+    missing = len(history) - len(history) // 2 - 1
+    ev = asyncio.Event()
+    got, _ = await asyncio.wait_for(
+        _subscriber(base, missing, {}, [], ev, last_id=resume_from), timeout=30
+    )
+    print(f"[stream] resume from Last-Event-ID: replayed {got}/{missing}")
+
+    server.should_exit = True
+    await serve_task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE 히스토리 푸시 벤치마크")
+    parser.add_argument("--subscribers", type=int, default=8)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01, help="쓰기 간격(초)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="bench_stream_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    os.chdir(workdir)
+    sys.path.insert(0, str(ROOT))
+    print(f"[stream] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
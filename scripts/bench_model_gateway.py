@@ -0,0 +1,202 @@
+"""
+bench_model_gateway.py
+
+director 모델 호출 동시성 벤치마크 (느린 가짜 모델로 /chat 여러 개를 한꺼번에).
+
+- 임시 작업 폴더에서 director(main.py, DIRECTOR_MODEL_BACKEND=fake)만 띄운다. (Gemini 키/네트워크 필요 없음)
+  director 는 자기 이벤트 루프를 가진 별도 스레드에서 돌고, 부하/프로브 클라이언트는 메인 루프에 있다
+  → director 루프가 멈추면 /health 응답 시간에 그대로 보인다.
+  가짜 모델은 응답 하나에 대략 --ttft 초 (+ 조각 지연) 걸린다.
+- --parallel 개의 /chat (또는 --stream 이면 /chat/stream) 을 동시에 보내면서
+  /health 를 --probe-interval 초마다 찔러서 응답 시간을 잰다.
+- 두 방식을 차례로 돌린다:
+    inline  : 예전 /chat 처럼 async def 안에서 generate_content 를 바로 부름 (이벤트 루프가 멈춤)
+    gateway : director_core.model_gateway 스레드풀 (MODEL_MAX_CONCURRENCY 개까지 겹쳐서)
+  (--stream 은 gateway 만: 예전 /chat/stream 도 이미 스레드풀에서 돌았다)
+- 시작 전에 빈 응답(안전 필터처럼 텍스트 없는 조각만) /chat/stream 이 done 줄로 끝나는지 확인한다.
+- 먼저 요청 하나를 혼자 보내서 한 번 걸리는 시간을 재고,
+  전체 시간 / 요청 하나 평균 / 겹친 정도(요청 수 × 혼자 시간 ÷ 전체 시간, 1 이면 줄 서서 하나씩) /
+  /health 최대 지연 을 출력한다.
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_model_gateway.py --parallel 8 --workers 4 --ttft 1.0
+
+    # 기록해 둔 응답(지연 포함)으로 매번 똑같이: 한 번 record, 그 뒤로는 replay
+    DIRECTOR_MODEL_BACKEND=cassette MODEL_CASSETTE=/tmp/gw.jsonl MODEL_CASSETTE_MODE=record \
+        MODEL_CASSETTE_INNER=fake python scripts/bench_model_gateway.py
+    DIRECTOR_MODEL_BACKEND=cassette MODEL_CASSETTE=/tmp/gw.jsonl MODEL_CASSETTE_TIMING=1 \
+        python scripts/bench_model_gateway.py
+
+    (cassette 키에는 최근 대화 맥락이 들어간다 → 실행마다 빈 임시 맥락 폴더에서 시작하고,
+     record 때와 같은 --parallel / --stream 으로 돌려야 재생이 맞는다)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _serve(app, port: int) -> tuple[uvicorn.Server, threading.Thread]:
+    """app 을 자기 이벤트 루프가 있는 스레드에서 띄운다 (벤치 클라이언트 루프와 따로)."""
+    # inline 은 루프가 몇 초씩 멈추므로 keep-alive 를 넉넉히 (안 그러면 멈춘 사이 연결이 끊긴다)
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=300)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name=f"director-{port}", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit(f"[gateway] director 가 :{port} 에서 안 떴음")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _stop(server: uvicorn.Server, thread: threading.Thread) -> None:
+    server.should_exit = True
+    thread.join()
+
+
+async def _one(client: httpx.AsyncClient, i: int, stream: bool) -> float:
+    payload = {"messages": [{"role": "user", "content": f"벤치 {i} 오늘 촬영 장면 정리해줘"}], "channel": "bench", "user_id": str(i)}
+    t0 = time.perf_counter()
+    if stream:
+        async with client.stream("POST", "/chat/stream", json=payload) as r:
+            r.raise_for_status()
+            async for _ in r.aiter_lines():
+                pass
+    else:
+        r = await client.post("/chat", json=payload)
+        r.raise_for_status()
+    return time.perf_counter() - t0
+
+
+async def _probe(client: httpx.AsyncClient, interval: float, stop: asyncio.Event, out: list) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        r = await client.get("/health")
+        r.raise_for_status()
+        out.append(time.perf_counter() - t0)
+        await asyncio.sleep(interval)
+
+
+async def _check_empty_stream() -> None:
+    """텍스트 없는 스트림도 {"done": true, "reply": "", "seq": ...} 로 끝나야 한다."""
+    import main as director_main
+    from director_core.fake_model import FakeStreamingModel
+    from director_core.model_gateway import ModelGateway
+
+    empty = FakeStreamingModel(ttft=0, chunk_delay=0, empty_rate=1.0)
+    saved = director_main._gateway
+    director_main._gateway = ModelGateway(lambda name: empty, default_model=director_main.GEMINI_MODEL, max_workers=1)
+    director_main._gateway.start()
+    try:
+        payload = {"messages": [{"role": "user", "content": "빈 응답 확인"}], "channel": "bench", "user_id": "empty"}
+        transport = httpx.ASGITransport(app=director_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://director") as client:
+            r = await client.post("/chat/stream", json=payload)
+        r.raise_for_status()
+        lines = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    finally:
+        director_main._gateway.close()
+        director_main._gateway = saved
+    last = lines[-1] if lines else {}
+    if not (last.get("done") and last.get("reply") == "" and isinstance(last.get("seq"), int)):
+        raise SystemExit(f"[gateway] 빈 응답 스트림이 done 으로 안 끝남: {lines}")
+    print(f"[gateway] 빈 응답 스트림 OK: {last}")
+
+
+async def _round(label: str, args: argparse.Namespace, port: int) -> None:
+    import main as director_main
+    from director_core.model_gateway import ModelGateway
+
+    gateway = ModelGateway(director_main._model_factory, default_model=director_main.GEMINI_MODEL, max_workers=args.workers)
+    if label == "inline":
+        # 예전 /chat: async def 안에서 blocking generate_content 를 바로
+        async def generate(contents, model=None, **kwargs):
+            return gateway.model(model).generate_content(contents, **kwargs)
+
+        gateway.generate = generate
+    director_main._gateway = gateway
+
+    server, thread = await asyncio.to_thread(_serve, director_main.app, port)
+    probes: list[float] = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        single = await _one(client, -1, args.stream)
+        stop = asyncio.Event()
+        prober = asyncio.create_task(_probe(client, args.probe_interval, stop, probes))
+        t0 = time.perf_counter()
+        durations = await asyncio.gather(*(_one(client, i, args.stream) for i in range(args.parallel)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await prober
+        stats = (await client.get("/health")).json()["model_gateway"]
+
+    await asyncio.to_thread(_stop, server, thread)
+
+    print(
+        f"[gateway] {label:7s} 요청 {args.parallel}개  전체 {wall:6.2f} s  "
+        f"요청 평균 {statistics.mean(durations):5.2f} s  겹침 x{args.parallel * single / wall:4.1f}  "
+        f"/health 최대 {max(probes) * 1000:7.1f} ms (n={len(probes)})"
+    )
+    # errors: 모델 호출 실패 수 (/chat 은 오류 문구로 200 을 주므로 cassette 재생이 빗나갔는지는 여기서 본다)
+    print(f"[gateway] {label:7s} peak_in_flight={stats['peak_in_flight']} errors={stats['errors']} latency={stats['latency']}")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    from director_core import recent_context
+    import main as director_main
+
+    # 벤치 대화가 실제 recent_context.json 에 섞이지 않게, 또 cassette 재생 키가 맞도록
+    # 실행마다 비어 있는 임시 폴더(새 workdir 아래)에서 시작한다.
+    recent_context.STORAGE_DIR = Path.cwd() / "director_storage"
+    if recent_context.STORAGE_DIR.exists() and any(recent_context.STORAGE_DIR.iterdir()):
+        raise SystemExit(f"[gateway] 맥락 폴더가 비어 있지 않음: {recent_context.STORAGE_DIR}")
+    recent_context.STORAGE_PATH = recent_context.STORAGE_DIR / "recent_context.json"
+    director_main._contexts = recent_context.RecentContextSessions(recent_context.STORAGE_DIR)
+
+    await _check_empty_stream()
+    labels = ("gateway",) if args.stream else ("inline", "gateway")
+    for i, label in enumerate(labels):
+        await _round(label, args, args.port + i)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="director 모델 호출 동시성 벤치마크")
+    parser.add_argument("--parallel", type=int, default=8, help="동시에 보낼 요청 수")
+    parser.add_argument("--workers", type=int, default=4, help="게이트웨이 스레드풀 크기 (MODEL_MAX_CONCURRENCY)")
+    parser.add_argument("--ttft", type=float, default=1.0, help="가짜 모델 첫 조각 지연(초)")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="가짜 모델 조각 사이 지연(초)")
+    parser.add_argument("--stream", action="store_true", help="/chat 대신 /chat/stream")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="/health 찌르는 간격(초)")
+    parser.add_argument("--port", type=int, default=8899)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_gateway_"))
+    os.chdir(workdir)
+    # 기본은 fake. DIRECTOR_MODEL_BACKEND=cassette (+ MODEL_CASSETTE*) 를 주면 기록해 둔 응답으로 (model_backends.py)
+    os.environ.setdefault("DIRECTOR_MODEL_BACKEND", "fake")
+    os.environ["FAKE_MODEL_TTFT"] = str(args.ttft)
+    os.environ["FAKE_MODEL_CHUNK_DELAY"] = str(args.chunk_delay)
+    sys.path.insert(0, str(ROOT / "director_server_v1"))
+    print(f"[gateway] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
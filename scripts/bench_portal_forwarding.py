@@ -0,0 +1,152 @@
+"""
+bench_portal_forwarding.py
+
+/api/chat 포워딩이 이벤트 루프를 막지 않는지 보는 벤치마크.
+
+- 임시 작업 폴더에서 포털(app.py)과 가짜 director(응답을 --delay 초 늦게 주는 /chat)를 같이 띄운다.
+  둘 다 자기 이벤트 루프를 가진 별도 스레드에서 돌고, 재는 클라이언트는 메인 루프에 있다
+  → 포털 루프가 멈추면 /api/history 지연에 그대로 보인다.
+- 불탄방 원본은 임시 폴더로 복사해서 쓴다 (컴파일본이 저장소 akashic/ 에 생기지 않게).
+- 먼저 아무 채팅 없이 /api/history 지연을 잰다 (idle).
+- 그다음 느린 /api/chat 요청 --chats 개를 동시에 걸어 둔 채로 /api/history 지연을 다시 잰다 (busy).
+- 두 구간의 p50/p95/max 를 비교해서 출력한다. (busy 가 idle 과 비슷하게 평평해야 정상)
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_portal_forwarding.py --chats 8 --delay 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+def _fake_director(delay: float) -> FastAPI:
+    fake = FastAPI()
+
+    @fake.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @fake.post("/chat")
+    async def chat(body: dict):
+        await asyncio.sleep(delay)
+        return {"reply": f"echo: {body['messages'][-1]['content']}"}
+
+    return fake
+
+
+def _serve(app, port: int) -> tuple[uvicorn.Server, threading.Thread]:
+    """app 을 자기 이벤트 루프가 있는 스레드에서 띄운다 (벤치 클라이언트 루프와 따로)."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name=f"server-{port}", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit(f"[forward] :{port} 서버가 안 떴음")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _stop(server: uvicorn.Server, thread: threading.Thread) -> None:
+    server.should_exit = True
+    thread.join()
+
+
+async def _probe_history(client: httpx.AsyncClient, seconds: float, interval: float) -> list[float]:
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        r = await client.get("/api/history", params={"limit": 50})
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def _report(label: str, ms: list[float]) -> None:
+    print(f"[forward] {label:5s} n={len(ms):4d}  p50={statistics.median(ms):7.2f} ms"
+          f"  p95={_percentile(ms, 0.95):7.2f} ms  max={max(ms):7.2f} ms")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    director = await asyncio.to_thread(_serve, _fake_director(args.delay), args.director_port)
+
+    import app as portal
+
+    portal_server = await asyncio.to_thread(_serve, portal.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+
+    async with httpx.AsyncClient(base_url=base, timeout=None) as client:
+        await client.get("/api/history", params={"limit": 50})  # 워밍업
+        idle = await _probe_history(client, args.delay * 0.8, args.interval)
+
+        async def one_chat(i: int) -> float:
+            t0 = time.perf_counter()
+            r = await client.post("/api/chat", json={"messages": [{"role": "user", "content": f"bench {i}"}]})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+        chats = [asyncio.create_task(one_chat(i)) for i in range(args.chats)]
+        await asyncio.sleep(0.1)
+        busy = await _probe_history(client, args.delay * 0.8, args.interval)
+        chat_times = await asyncio.gather(*chats)
+
+    _report("idle", idle)
+    _report("busy", busy)
+    print(f"[forward] chats={args.chats} delay={args.delay}s  chat wall max={max(chat_times):.2f}s"
+          f"  (동시 한도 {portal.DIRECTOR_MAX_CONCURRENCY}개)")
+
+    for server, thread in (portal_server, director):
+        await asyncio.to_thread(_stop, server, thread)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="포털 → director 비동기 포워딩 벤치마크")
+    parser.add_argument("--chats", type=int, default=8, help="동시에 걸어 둘 느린 채팅 요청 수")
+    parser.add_argument("--delay", type=float, default=3.0, help="가짜 director 응답 지연(초)")
+    parser.add_argument("--interval", type=float, default=0.02, help="/api/history 찌르는 간격(초)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--director-port", type=int, default=8898)
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="bench_forward_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    # akashic/ 는 링크하지 않고 원본만 복사 → startup 때 만드는 컴파일본도 임시 폴더에 생긴다
+    (workdir / "akashic").mkdir()
+    for src in (ROOT / "akashic").glob("burned_room_*.jsonl"):
+        shutil.copy2(src, workdir / "akashic" / src.name)
+    os.chdir(workdir)
+    os.environ["DIRECTOR_CORE_URL"] = f"http://127.0.0.1:{args.director_port}"
+    sys.path.insert(0, str(ROOT))
+    print(f"[forward] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
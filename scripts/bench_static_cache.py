@@ -0,0 +1,135 @@
+"""
+bench_static_cache.py
+
+포털 페이지 다시 열기 비용 벤치마크 (/portal/chat.html, /portal/ 등).
+
+- 임시 작업 폴더에서 포털(app.py)을 띄우고, 브라우저처럼 페이지 하나를 연다.
+  HTML → 그 안의 href / src / url(...) 로컬 참조 → CSS 안의 url(...) 까지 따라가며 받는다.
+- 간단한 브라우저 캐시를 흉내 낸다:
+    Cache-Control 에 immutable / max-age 가 있으면 → 다음 번엔 요청 자체를 안 보냄
+    ETag 가 있으면 → 다음 번엔 If-None-Match 로 다시 확인 (304 면 본문 없음)
+    둘 다 없으면 → 다음 번에도 전부 다시 받음
+- 처음 열기 / 다시 열기(--repeats 번) 의 요청 수 · 본문 바이트 · 304 수를 출력한다.
+  (예전 StaticFiles 마운트였다면 다시 열 때 304 가 돌았지만 미리 압축도 지문도 없었다)
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/bench_static_cache.py --page /portal/chat.html --repeats 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+REF_RE = re.compile(r"""(?:href|src)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+)["']?\s*\)""")
+LOCAL_PREFIXES = ("/static/", "/portal/")
+
+
+def _refs(base: str, text: str) -> list:
+    out = []
+    for m in REF_RE.finditer(text):
+        ref = (m.group(1) or m.group(2)).strip()
+        if "${" in ref or ref.startswith(("data:", "blob:", "#")):
+            continue
+        path = urlparse(urljoin(base, ref)).path
+        if path.startswith(LOCAL_PREFIXES) and path not in out:
+            out.append(path)
+    return out
+
+
+async def _load(client: httpx.AsyncClient, page: str, cache: dict) -> dict:
+    """페이지 하나 열기. cache: path → ("fresh"|etag)."""
+    stats = {"requests": 0, "bytes": 0, "not_modified": 0, "from_cache": 0, "missing": 0}
+    queue, seen = [page], set()
+    while queue:
+        path = queue.pop(0)
+        if path in seen:
+            continue
+        seen.add(path)
+        cached = cache.get(path)
+        if cached == "fresh":
+            stats["from_cache"] += 1
+            text = cache.get(("text", path))
+        else:
+            headers = {"accept-encoding": "br, gzip"}
+            if cached:
+                headers["if-none-match"] = cached
+            r = await client.get(path, headers=headers)
+            stats["requests"] += 1
+            # 전송된(압축된) 본문 크기
+            stats["bytes"] += int(r.headers.get("content-length") or 0)
+            if r.status_code == 304:
+                stats["not_modified"] += 1
+                text = cache.get(("text", path))
+            elif r.status_code == 200:
+                control = r.headers.get("cache-control", "")
+                if "immutable" in control or "max-age" in control:
+                    cache[path] = "fresh"
+                elif r.headers.get("etag"):
+                    cache[path] = r.headers["etag"]
+                ctype = r.headers.get("content-type", "")
+                text = r.text if ctype.startswith(("text/html", "text/css")) else None
+                cache[("text", path)] = text
+            else:
+                stats["missing"] += 1
+                text = None
+        if text:
+            queue.extend(_refs(path, text))
+    return stats
+
+
+def _print(label: str, s: dict) -> None:
+    print(
+        f"[static] {label:<8} 요청 {s['requests']:3d}  본문 {s['bytes'] / 1024:8.1f} KB  "
+        f"304 {s['not_modified']:2d}  캐시에서 {s['from_cache']:2d}  없음 {s['missing']}"
+    )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import app as portal
+
+    async with portal.lifespan(portal.app):
+        transport = httpx.ASGITransport(app=portal.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://portal") as client:
+            cache: dict = {}
+            _print("처음", await _load(client, args.page, cache))
+            for i in range(args.repeats):
+                _print(f"다시 {i + 1}", await _load(client, args.page, cache))
+        print(f"[static] {portal._static_assets.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="포털 페이지 다시 열기 비용 벤치마크")
+    parser.add_argument("--page", default="/portal/chat.html", help="열어 볼 페이지 경로")
+    parser.add_argument("--repeats", type=int, default=3, help="다시 열기 횟수")
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="bench_static_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    # akashic/ 는 링크하지 않고 원본만 복사 → startup 때 만드는 컴파일본도 임시 폴더에 생긴다
+    (workdir / "akashic").mkdir()
+    for src in (ROOT / "akashic").glob("burned_room_*.jsonl"):
+        shutil.copy2(src, workdir / "akashic" / src.name)
+    os.chdir(workdir)
+    os.environ.setdefault("UPLOAD_LOCAL_ROOT", str(workdir / "uploads"))
+    sys.path.insert(0, str(ROOT))
+    print(f"[static] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+bench_upload_memory.py
+
+/api/upload 메모리 벤치마크 (파일 크기별 최고 메모리).
+
+- 임시 작업 폴더에서 포털(app.py)을 띄우고, --sizes 크기(MB)의 파일을 하나씩 올린다.
+  클라이언트도 본문을 조각조각 만들어 보내므로 벤치 자체는 파일을 메모리에 들고 있지 않는다.
+- 업로드마다 포털 프로세스의 tracemalloc 최고치를 재고, 응답의 sha256/size 를 직접 계산한 값과 비교한다.
+- 마지막으로 --limit-mb 보다 큰 파일을 보내서 413 이 오고 임시 파일(.part)이 안 남는지 확인한다.
+- 올린 파일은 UPLOAD_ROOT/<--profile>/ 아래에 생기고, 끝나면 지운다.
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    UPLOAD_MAX_BYTES=$((600*1024*1024)) python scripts/bench_upload_memory.py --sizes 10 100 500 --limit-mb 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+BOUNDARY = "benchboundary7f3a"
+PIECE = 256 * 1024
+
+
+def _piece(i: int) -> bytes:
+    # 크기만 맞으면 되므로 조각마다 조금씩 다른 바이트
+    return bytes([i % 251]) * PIECE
+
+
+def _expected(size: int) -> str:
+    h = hashlib.sha256()
+    sent, i = 0, 0
+    while sent < size:
+        block = _piece(i)[: size - sent]
+        h.update(block)
+        sent += len(block)
+        i += 1
+    return h.hexdigest()
+
+
+async def _body(name: str, size: int, profile: str):
+    # upload_profile 을 파일 뒤에 보낸다 (app.js 와 같은 순서)
+    yield (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"{name}\"\r\n"
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode()
+    sent, i = 0, 0
+    while sent < size:
+        block = _piece(i)[: size - sent]
+        yield block
+        sent += len(block)
+        i += 1
+    yield (
+        f"\r\n--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"upload_profile\"\r\n\r\n"
+        f"{profile}\r\n--{BOUNDARY}--\r\n"
+    ).encode()
+
+
+async def _upload(client: httpx.AsyncClient, name: str, size: int, profile: str) -> httpx.Response:
+    return await client.post(
+        "/api/upload",
+        content=_body(name, size, profile),
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+
+
+async def _serve(app, port: int) -> tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import app as portal
+
+    server, task = await _serve(portal.app, args.port)
+    saved: list[Path] = []
+    tracemalloc.start()
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+        for mb in args.sizes:
+            size = int(mb * 1024 * 1024)
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            t0 = time.perf_counter()
+            r = await _upload(client, f"bench_{mb}mb.mp4", size, args.profile)
+            elapsed = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            r.raise_for_status()
+            info = r.json()["files"][0]
+            saved.append(Path(info["server_path"]))
+            ok = info["size"] == size and info["sha256"] == _expected(size)
+            print(f"[upload] {mb:7.1f} MB  {elapsed:6.2f}s  {mb / elapsed:6.1f} MB/s"
+                  f"  peak +{(peak - base) / 2**20:6.2f} MB  sha256/size {'ok' if ok else 'MISMATCH'}")
+
+        if args.limit_mb:
+            size = int((args.limit_mb + 1) * 1024 * 1024)
+            r = await _upload(client, "bench_too_big.mp4", size, args.profile)
+            leftovers = list(portal.UPLOAD_STAGING_DIR.glob(".upload-*.part"))
+            print(f"[upload] {args.limit_mb + 1:7.1f} MB  → HTTP {r.status_code}  남은 .part {len(leftovers)}개")
+
+    tracemalloc.stop()
+    for p in saved:
+        p.unlink(missing_ok=True)
+    server.should_exit = True
+    await task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="/api/upload 메모리 벤치마크")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[10, 100, 500], help="올릴 파일 크기들 (MB)")
+    parser.add_argument("--limit-mb", type=float, default=0,
+                        help="UPLOAD_MAX_BYTES 와 같은 값(MB)을 주면 그보다 큰 파일로 413 확인")
+    parser.add_argument("--profile", default="bench_upload", help="저장할 업로드 프로필 폴더")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="bench_upload_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    # akashic/ 는 링크하지 않고 원본만 복사 → startup 때 만드는 컴파일본도 임시 폴더에 생긴다
+    (workdir / "akashic").mkdir()
+    for src in (ROOT / "akashic").glob("burned_room_*.jsonl"):
+        shutil.copy2(src, workdir / "akashic" / src.name)
+    os.chdir(workdir)
+    sys.path.insert(0, str(ROOT))
+    print(f"[upload] workdir: {workdir}")
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
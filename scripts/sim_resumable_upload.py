@@ -0,0 +1,191 @@
+"""
+sim_resumable_upload.py
+
+이어 올리기 업로드(/api/upload/sessions) 끊김 시뮬레이션.
+
+- 임시 작업 폴더에서 포털(app.py)을 띄우고, --size-mb 크기의 임시 파일을 chat.html 과 같은 순서로 올린다.
+  (세션 만들기 → PUT ?offset= 조각들 → 끊기면 GET 으로 offset 확인 → 이어서 → complete)
+- PUT 마다 --drop 확률로 조각의 아무 지점에서 연결을 끊는다 (폰 Wi-Fi 가 끊긴 것처럼).
+- --restart-every N 이면 N 번 끊길 때마다 포털을 내렸다 다시 띄운다 (세션이 디스크에서 살아남는지).
+- 끝나면 보낸 총 바이트 / 끊긴 횟수 / "처음부터 다시" 방식이었다면 보냈을 바이트를 비교하고,
+  응답의 sha256 / size 를 직접 계산한 값과 맞춰 본다.
+- 올린 blob 은 끝나면 지운다.
+
+사용법 (Pi / 맥 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python scripts/sim_resumable_upload.py --size-mb 64 --drop 0.4 --restart-every 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+PIECE = 256 * 1024
+
+
+class _Dropped(Exception):
+    pass
+
+
+def _make_file(path: Path, size: int) -> str:
+    h = hashlib.sha256()
+    with path.open("wb") as f:
+        left = size
+        while left:
+            block = os.urandom(min(left, 1024 * 1024))
+            f.write(block)
+            h.update(block)
+            left -= len(block)
+    return h.hexdigest()
+
+
+async def _body(path: Path, start: int, end: int, cut_at: int | None, sent: list):
+    # cut_at 바이트를 보낸 뒤 예외 → httpx 가 연결을 끊는다
+    with path.open("rb") as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            n = min(PIECE, end - pos)
+            if cut_at is not None and pos + n > cut_at:
+                n = cut_at - pos
+                if n:
+                    yield f.read(n)
+                    sent[0] += n
+                    await asyncio.sleep(0.05)  # 서버가 받아 갈 시간
+                raise _Dropped()
+            yield f.read(n)
+            sent[0] += n
+            pos += n
+
+
+async def _server_offset(client: httpx.AsyncClient, upload_id: str) -> int:
+    r = await client.get(f"/api/upload/sessions/{upload_id}")
+    r.raise_for_status()
+    return r.json()["offset"]
+
+
+async def _serve(app, port: int) -> tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _stop(server: uvicorn.Server, task: asyncio.Task) -> None:
+    server.should_exit = True
+    await task
+
+
+async def _run(args: argparse.Namespace, workdir: Path) -> None:
+    import app as portal
+    from portal_core.upload_sessions import UploadSessionStore
+
+    rng = random.Random(args.seed)
+    src = workdir / "sim_upload.bin"
+    size = int(args.size_mb * 1024 * 1024)
+    expected = _make_file(src, size)
+
+    server, task = await _serve(portal.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    sent = [0]
+    drops = 0
+    restarts = 0
+    from_zero = size  # 끊길 때마다 처음부터 다시 보냈다면
+    t0 = time.perf_counter()
+
+    # 재시작 뒤 죽은 연결을 다시 쓰지 않도록 keep-alive 없이
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base, timeout=None, limits=limits) as client:
+        r = await client.post("/api/upload/sessions", json={
+            "name": "sim_upload.mp4", "size": size, "type": "video/mp4", "upload_profile": args.profile,
+        })
+        r.raise_for_status()
+        session = r.json()
+        upload_id, chunk = session["upload_id"], session["chunk_size"]
+        offset = session["offset"]
+
+        while offset < size:
+            end = min(size, offset + chunk)
+            cut_at = rng.randrange(offset, end) if rng.random() < args.drop else None
+            try:
+                r = await client.put(
+                    f"/api/upload/sessions/{upload_id}", params={"offset": offset},
+                    content=_body(src, offset, end, cut_at, sent),
+                )
+            except (_Dropped, httpx.TransportError):
+                drops += 1
+                from_zero += cut_at if cut_at is not None else offset
+                if args.restart_every and drops % args.restart_every == 0:
+                    # 포털 재시작: 메모리(이어 계산하던 해시 등)는 사라지고 디스크의 세션만 남는다
+                    await _stop(server, task)
+                    portal._upload_sessions = UploadSessionStore(
+                        portal.UPLOAD_STAGING_DIR, portal.UPLOAD_MAX_BYTES, client_chunk=portal.UPLOAD_SESSION_CHUNK
+                    )
+                    server, task = await _serve(portal.app, args.port)
+                    restarts += 1
+                offset = await _server_offset(client, upload_id)
+                continue
+            if r.status_code == 409:
+                # 끊긴 PUT 을 서버가 아직 정리 중이거나 offset 이 어긋남 → 잠깐 뒤 받은 데부터
+                await asyncio.sleep(0.05)
+                offset = await _server_offset(client, upload_id)
+                continue
+            r.raise_for_status()
+            offset = r.json()["offset"]
+
+        r = await client.post(f"/api/upload/sessions/{upload_id}/complete")
+        r.raise_for_status()
+        info = r.json()
+
+    elapsed = time.perf_counter() - t0
+    ok = info["size"] == size and info["sha256"] == expected
+    print(f"[resume] {args.size_mb:.1f} MB  {elapsed:6.2f}s  끊김 {drops}번  재시작 {restarts}번")
+    print(f"[resume] 보낸 바이트 {sent[0] / 2**20:8.1f} MB  (파일의 {100 * sent[0] / max(1, size):5.1f}%)")
+    print(f"[resume] 처음부터 다시였다면 {from_zero / 2**20:8.1f} MB  (파일의 {100 * from_zero / max(1, size):5.1f}%)")
+    print(f"[resume] sha256/size {'ok' if ok else 'MISMATCH'}  남은 세션 {len(list(portal._upload_sessions.dir.glob('*.json')))}개")
+
+    Path(info["server_path"]).unlink(missing_ok=True)
+    await _stop(server, task)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="이어 올리기 업로드 끊김 시뮬레이션")
+    parser.add_argument("--size-mb", type=float, default=64, help="올릴 파일 크기 (MB)")
+    parser.add_argument("--drop", type=float, default=0.4, help="PUT 하나가 중간에 끊길 확률")
+    parser.add_argument("--restart-every", type=int, default=3, help="N 번 끊길 때마다 포털 재시작 (0 = 안 함)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--profile", default="sim_resumable", help="저장할 업로드 프로필 폴더")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    # app.py 는 cwd 기준 상대 경로(portal_history/, akashic/, portal/)를 쓰므로 임시 폴더에서 띄운다.
+    workdir = Path(tempfile.mkdtemp(prefix="sim_resume_"))
+    (workdir / "portal").symlink_to(ROOT / "portal")
+    # akashic/ 는 링크하지 않고 원본만 복사 → startup 때 만드는 컴파일본도 임시 폴더에 생긴다
+    (workdir / "akashic").mkdir()
+    for src in (ROOT / "akashic").glob("burned_room_*.jsonl"):
+        shutil.copy2(src, workdir / "akashic" / src.name)
+    os.chdir(workdir)
+    sys.path.insert(0, str(ROOT))
+    print(f"[resume] workdir: {workdir}")
+
+    asyncio.run(_run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
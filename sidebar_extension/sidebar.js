@@ -19,19 +19,53 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  // 포털이 백그라운드에서 찍어 둔 상태 스냅샷 (+ 최근 5분 지연 p50/p95, load_pct)
+  const PORTAL_HEALTH_URL = "https://sowon.mooo.com/health/detail";
+
+  function formatMs(ms) {
+    if (typeof ms !== "number") return "-";
+    return ms >= 1000 ? (ms / 1000).toFixed(1) + "s" : Math.round(ms) + "ms";
+  }
+
   async function pingStudioStatus() {
-    // 일단 health 엔드포인트는 나중에 다시 맞추고,
-    // 지금은 그냥 항상 ONLINE으로만 표시해두자.
+    let data;
+    try {
+      const res = await fetch(PORTAL_HEALTH_URL, { cache: "no-store" });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      data = await res.json();
+    } catch (err) {
+      console.error(err);
+      setStudioStatus("OFFLINE", "offline", "포털 응답 없음");
+      if (nowStatusText) {
+        nowStatusText.textContent = "포털에 닿지 않아. 잠깐 뒤에 다시 확인할게.";
+      }
+      return;
+    }
+
+    const coreOk = data.director_core_status === "ok";
+    const latency = data.latency || {};
+    // 체감 속도는 스트림 첫 조각 → 없으면 한 번에 받는 /chat → 없으면 헬스 프로브
+    const lat =
+      (latency["/chat/stream#ttft"] && latency["/chat/stream#ttft"].n && latency["/chat/stream#ttft"]) ||
+      (latency["/chat"] && latency["/chat"].n && latency["/chat"]) ||
+      latency.director_probe ||
+      {};
+    const summary = `p50 ${formatMs(lat.p50_ms)} · p95 ${formatMs(lat.p95_ms)}`;
 
-    setStudioStatus("ONLINE", "online", "수동 체크");
+    setStudioStatus(coreOk ? "ONLINE" : "ISSUE", coreOk ? "online" : "issue", summary);
 
     if (nowStatusText) {
-      nowStatusText.textContent = "health 경로는 나중에 맞추고, 지금은 대화에만 집중하면 돼.";
+      const age = typeof data.age_s === "number" ? `${Math.round(data.age_s)}초 전 확인` : "확인 중";
+      const req = data.director_requests || {};
+      nowStatusText.textContent = coreOk
+        ? `부감독 뇌 정상 (${age}) · 처리 중 ${req.in_flight || 0} / 대기 ${req.waiting || 0}`
+        : `부감독 뇌 상태: ${data.director_core_status} (${age})`;
     }
 
     if (loadPercent && loadBarFill) {
-      loadPercent.textContent = "0%";
-      loadBarFill.style.width = "0%";
+      const pct = typeof data.load_pct === "number" ? data.load_pct : 0;
+      loadPercent.textContent = pct + "%";
+      loadBarFill.style.width = pct + "%";
     }
   }
 
@@ -69,6 +103,8 @@ document.addEventListener("DOMContentLoaded", () => {
   const chatHint = document.getElementById("chatHint");
 
   const DIRECTOR_API_URL = "https://sowon.mooo.com/director_core/analyze";
+  // 포털 스트리밍 채팅 (NDJSON: {"delta"} 여러 줄 → {"done", "reply"}). 안 되면 위 analyze 로 한 번에 받는다.
+  const PORTAL_CHAT_STREAM_URL = "https://sowon.mooo.com/api/chat/stream";
 
   function appendMessage(role, text, options = {}) {
     if (!chatLog) return;
@@ -172,6 +208,57 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  async function streamFromPortal(text, onDelta) {
+    const res = await fetch(PORTAL_CHAT_STREAM_URL, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        messages: [{ role: "user", content: text }],
+        // 뇌 서버 맥락은 포털 채팅과 따로 (사이드바 대화가 포털 대화 창을 밀어내지 않게)
+        channel: "chrome_sidebar",
+        user_id: "sowon",
+      }),
+    });
+
+    if (!res.ok || !res.body) {
+      throw new Error(`HTTP ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let full = "";
+
+    try {
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let nl;
+        while ((nl = buffer.indexOf("\n")) >= 0) {
+          const line = buffer.slice(0, nl).trim();
+          buffer = buffer.slice(nl + 1);
+          if (!line) continue;
+
+          const msg = JSON.parse(line);
+          if (msg.error) throw new Error(msg.error);
+          if (typeof msg.delta === "string") {
+            full += msg.delta;
+            onDelta(full);
+          } else if (msg.done) {
+            return (typeof msg.reply === "string" ? msg.reply : full).trim();
+          }
+        }
+      }
+    } finally {
+      reader.cancel().catch(() => {});
+    }
+    throw new Error("stream closed before done");
+  }
+
   if (chatForm && chatInput) {
     chatForm.addEventListener("submit", async (e) => {
       e.preventDefault();
@@ -187,15 +274,46 @@ document.addEventListener("DOMContentLoaded", () => {
       setSendingState(true);
       const typingMsg = appendMessage("assistant", "", { typing: true });
 
-      // 백엔드 호출
-      const reply = await sendToDirector(text);
+      const removeTyping = () => {
+        if (typingMsg && typingMsg.parentNode) {
+          typingMsg.parentNode.removeChild(typingMsg);
+        }
+      };
+
+      // 백엔드 호출: 포털 스트림으로 받으면서 말풍선을 키우고, 실패하면 예전 analyze 로 한 번에
+      let streamMsg = null;
+      let reply;
+      try {
+        reply = await streamFromPortal(text, (partial) => {
+          if (!streamMsg) {
+            removeTyping();
+            streamMsg = appendMessage("assistant", partial, { meta: "입력 중…" });
+            return;
+          }
+          const body = streamMsg.querySelector(".st-chat-text");
+          if (body) body.textContent = partial;
+          chatLog.scrollTop = chatLog.scrollHeight;
+        });
+      } catch (err) {
+        console.error(err);
+        if (streamMsg && streamMsg.parentNode) {
+          streamMsg.parentNode.removeChild(streamMsg);
+        }
+        streamMsg = null;
+        reply = await sendToDirector(text);
+      }
 
       // 타이핑 제거
-      if (typingMsg && typingMsg.parentNode) {
-        typingMsg.parentNode.removeChild(typingMsg);
-      }
+      removeTyping();
 
-      appendMessage("assistant", reply, { meta: "곧 방금" });
+      if (streamMsg) {
+        const body = streamMsg.querySelector(".st-chat-text");
+        const meta = streamMsg.querySelector(".st-chat-meta");
+        if (body) body.textContent = reply;
+        if (meta) meta.textContent = "곧 방금";
+      } else {
+        appendMessage("assistant", reply, { meta: "곧 방금" });
+      }
       setSendingState(false);
     });
 
@@ -0,0 +1,45 @@
+"""
+compile_burned_archive.py
+
+불탄방 아카이브(akashic/burned_room_*.jsonl)를 포털이 바로 쓸 수 있는 형태로 미리 컴파일하는 툴.
+
+결과물 (app.py 의 BURNED_COMPILED_FILE 기준):
+- akashic/burned_room.compiled.json      : /api/history 응답 모양 그대로 직렬화된 항목 JSON 배열
+- akashic/burned_room.compiled.idx.json  : 원본 지문 + 항목별 [id, 시작, 끝] 바이트 오프셋 표
+
+포털은 startup 때 이 파일을 한 번만 읽는다. 원본이 바뀌었거나 컴파일본이 없으면
+포털이 알아서 다시 만들기 때문에, 이 툴은 배포 전에 미리 구워 두고 싶을 때만 돌리면 된다.
+
+사용법 (맥/라즈베리 공통, venv 활성화 후):
+
+    cd ~/spacetiming-studio
+    python tools/compile_burned_archive.py
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from portal_core.burned_archive import BurnedArchive  # noqa: E402
+
+
+def main() -> None:
+    # app.py 와 같은 상대 경로를 쓰므로 프로젝트 루트에서 실행한다.
+    os.chdir(ROOT)
+    from app import BURNED_COMPILED_FILE, BURNED_HISTORY_FILES
+
+    archive = BurnedArchive(BURNED_HISTORY_FILES, BURNED_COMPILED_FILE)
+    count = archive.write_compiled()
+    size = archive.compiled_path.stat().st_size
+    print(f"[compile] 소스: {', '.join(BURNED_HISTORY_FILES)}")
+    print(f"[compile] 항목 {count}개 → {archive.compiled_path} ({size / 1024:.0f} KB)")
+    print(f"[compile] 오프셋 표 → {archive.index_path}")
+
+
+if __name__ == "__main__":
+    main()
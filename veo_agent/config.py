@@ -3,4 +3,12 @@ import os
 # 한 곳에서만 모델/키 관리하게 하려고 분리해둔 설정 파일
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-GEMINI_MODEL_TEXT = "gemini-2.0-flash"  # 나중에 모델 바뀌면 여기만 수정하면 됨
\ No newline at end of file
+GEMINI_MODEL_TEXT = "gemini-2.0-flash"  # 나중에 모델 바뀌면 여기만 수정하면 됨
+
+# 모델 백엔드: gemini (기본) / fake (가짜 JSON 응답) / cassette (기록/재생) → model_backend.py
+VEO_MODEL_BACKEND = os.getenv("VEO_MODEL_BACKEND", "gemini").strip().lower()
+VEO_MODEL_CASSETTE = os.getenv("VEO_MODEL_CASSETTE", os.path.join(os.path.dirname(__file__), "model_cassette.jsonl"))
+VEO_MODEL_CASSETTE_MODE = os.getenv("VEO_MODEL_CASSETTE_MODE", "replay").strip().lower()
+# fake 백엔드 (director 의 FAKE_MODEL_* 와는 따로)
+VEO_FAKE_LATENCY = float(os.getenv("VEO_FAKE_LATENCY", "0.3"))
+VEO_FAKE_FAIL_RATE = float(os.getenv("VEO_FAKE_FAIL_RATE", "0"))
@@ -1,21 +1,29 @@
 from typing import Tuple
 import json
 
-from google import genai
 from config import GEMINI_API_KEY, GEMINI_MODEL_TEXT
+import model_backend
 
 _client = None
 
 
-def _get_client() -> genai.Client:
+def _get_client():
     global _client
     if _client is None:
         if not GEMINI_API_KEY:
             raise RuntimeError("GEMINI_API_KEY 환경변수가 설정되지 않았어.")
+        # google.genai 는 실제로 부를 때만 import (fake / cassette 재생은 패키지 없이도 돈다)
+        from google import genai
+
         _client = genai.Client(api_key=GEMINI_API_KEY)
     return _client
 
 
+def _gemini_text(prompt: str, model: str) -> str:
+    result = _get_client().models.generate_content(model=model, contents=prompt)
+    return result.text or ""
+
+
 def _extract_json_block(text: str) -> str:
     start = text.find("{")
     end = text.rfind("}")
@@ -25,8 +33,6 @@ def _extract_json_block(text: str) -> str:
 
 
 def generate_veo_prompts_sync(title: str, plan: str) -> Tuple[str, str]:
-    client = _get_client()
-
     system_prompt = (
         "You are an expert cinematic director and prompt writer for Google Veo.\n"
         "The channel tone is dreamy, calm, cosmic, ASMR-friendly.\n"
@@ -50,11 +56,9 @@ Requirements:
 Return them as JSON with keys "main_prompt" and "teaser_prompt".
 '''
 
-    result = client.models.generate_content(
-        model=GEMINI_MODEL_TEXT,
-        contents=system_prompt + "\n\n" + user_prompt,
-    )
-    text = (result.text or "").strip()
+    text = model_backend.generate_text(
+        system_prompt + "\n\n" + user_prompt, GEMINI_MODEL_TEXT, live=_gemini_text
+    ).strip()
 
     try:
         block = _extract_json_block(text)
@@ -32,6 +32,20 @@ def is_gemini_available() -> bool:
 
 GEMINI_MODEL_NAME = "gemini-2.5-flash"  # 필요시 변경
 
+# 진짜 / 가짜 / 기록·재생 백엔드 고르기 (VEO_MODEL_BACKEND, model_backend.py)
+import model_backend
+
+# 모델 이름마다 GenerativeModel 하나를 재사용
+_models = {}
+
+
+def _gemini_text(prompt: str, model_name: str) -> str:
+    model = _models.get(model_name)
+    if model is None:
+        model = _models[model_name] = genai.GenerativeModel(model_name)
+    response = model.generate_content([{"role": "user", "parts": [prompt]}])
+    return response.text if hasattr(response, "text") else str(response)
+
 
 # -----------------------------
 # Pydantic 모델
@@ -122,7 +136,7 @@ def call_gemini_for_prompts(title: str, plan: Optional[str]) -> dict:
     - 기본적으로 JSON 응답을 기대
     - 실패 시 전체 텍스트를 main_prompt로 사용
     """
-    if not is_gemini_available():
+    if model_backend.needs_live() and not is_gemini_available():
         raise RuntimeError(
             "부감독에게 맡기기를 눌렀을 때 GEMINI_API_KEY 환경변수가 설정되어 있지 않아. 로컬 환경변수 설정을 확인해줘."
         )
@@ -150,12 +164,7 @@ Write cinematic prompts that match this director's style:
 - Clear visual progression
 """
 
-    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-    response = model.generate_content(
-        [{"role": "user", "parts": [system_prompt + "\n\n" + user_prompt]}]
-    )
-
-    text = response.text if hasattr(response, "text") else str(response)
+    text = model_backend.generate_text(system_prompt + "\n\n" + user_prompt, GEMINI_MODEL_NAME, live=_gemini_text)
 
     # JSON 파싱 시도
     main_prompt = text
@@ -185,6 +194,7 @@ def health_check():
         "status": "ok",
         "episodes_dir": str(EPISODES_DIR),
         "gemini_available": is_gemini_available(),
+        "model_backend": model_backend.VEO_MODEL_BACKEND,
     }
 
 
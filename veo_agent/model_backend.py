@@ -0,0 +1,117 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict, List
+
+from config import (
+    VEO_FAKE_FAIL_RATE,
+    VEO_FAKE_LATENCY,
+    VEO_MODEL_BACKEND,
+    VEO_MODEL_CASSETTE,
+    VEO_MODEL_CASSETTE_MODE,
+)
+
+"""
+Veo 프롬프트 생성용 모델 백엔드 (텍스트 한 번 → 텍스트 하나).
+
+main.py(google.generativeai) 와 flow_agent.py(google.genai) 가 쓰는 SDK 는 다르지만
+둘 다 "프롬프트 → 텍스트" 하나라서, 실제 호출(live)은 각자 넘기고 여기서 백엔드만 고른다.
+
+    text = generate_text(prompt, model_name, live=_call_gemini)
+
+VEO_MODEL_BACKEND:
+- gemini   (기본) live 그대로
+- fake     키/네트워크 없이 main_prompt / teaser_prompt JSON 을 만들어 준다 (프롬프트가 같으면 항상 같은 응답)
+    VEO_FAKE_LATENCY      응답 하나까지 지연(초, 기본 0.3)
+    VEO_FAKE_FAIL_RATE    일부러 실패할 확률 (기본 0, 프롬프트 해시로 정해짐)
+- cassette VEO_MODEL_CASSETTE(JSONL) 기록/재생
+    VEO_MODEL_CASSETTE_MODE=record → live 를 부르고 한 줄 append
+    VEO_MODEL_CASSETTE_MODE=replay → (모델 이름 + 프롬프트) 같은 기록을 돌려줌, 없으면 LookupError
+
+백엔드 / 모드 이름이 틀리면 (오타 등) import 때 ValueError — 조용히 실제 Gemini 로 가지 않게.
+"""
+
+BACKENDS = ("gemini", "fake", "cassette")
+CASSETTE_MODES = ("record", "replay")
+
+if VEO_MODEL_BACKEND not in BACKENDS:
+    raise ValueError(f"VEO_MODEL_BACKEND 는 {BACKENDS} 중 하나: {VEO_MODEL_BACKEND!r}")
+if VEO_MODEL_CASSETTE_MODE not in CASSETTE_MODES:
+    raise ValueError(f"VEO_MODEL_CASSETTE_MODE 는 {CASSETTE_MODES} 중 하나: {VEO_MODEL_CASSETTE_MODE!r}")
+
+_lock = threading.Lock()
+_cassette: Dict[str, List[str]] = {}
+_cassette_loaded = False
+
+
+def needs_live() -> bool:
+    """실제 Gemini 호출이 필요한 설정인지 (키 확인용)."""
+    if VEO_MODEL_BACKEND == "fake":
+        return False
+    if VEO_MODEL_BACKEND == "cassette":
+        return VEO_MODEL_CASSETTE_MODE == "record"
+    return True
+
+
+def _key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _fake(prompt: str, model: str) -> str:
+    digest = _key(prompt, model)
+    time.sleep(VEO_FAKE_LATENCY)
+    # 해시 앞 8자리로 0~1 값을 만들어 실패 여부를 정한다 (같은 프롬프트면 늘 같은 결과)
+    if int(digest[:8], 16) / 0xFFFFFFFF < VEO_FAKE_FAIL_RATE:
+        raise RuntimeError("fake model: 주입된 실패")
+    tail = " ".join(prompt.split()[-24:])
+    return json.dumps(
+        {
+            "main_prompt": f"(fake {digest[:8]}) slow moonlit dolly through a quiet cosmic room. {tail}",
+            "teaser_prompt": f"(fake {digest[:8]}) one warm glowing moment, gentle push-in.",
+        },
+        ensure_ascii=False,
+    )
+
+
+def _load_cassette() -> None:
+    global _cassette_loaded
+    if _cassette_loaded:
+        return
+    try:
+        with open(VEO_MODEL_CASSETTE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                _cassette.setdefault(rec["key"], []).append(rec["text"])
+    except FileNotFoundError:
+        pass
+    _cassette_loaded = True
+
+
+def _cassette_call(prompt: str, model: str, live: Callable[[str, str], str]) -> str:
+    key = _key(prompt, model)
+    with _lock:
+        _load_cassette()
+        if VEO_MODEL_CASSETTE_MODE == "replay":
+            texts = _cassette.get(key)
+            if not texts:
+                raise LookupError(f"cassette 에 이 프롬프트 기록이 없음 (key {key[:12]})")
+            return texts[0]
+    text = live(prompt, model)
+    with _lock:
+        with open(VEO_MODEL_CASSETTE, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "model": model, "text": text}, ensure_ascii=False) + "\n")
+        _cassette.setdefault(key, []).append(text)
+    return text
+
+
+def generate_text(prompt: str, model: str, live: Callable[[str, str], str]) -> str:
+    """live(prompt, model) → 텍스트. VEO_MODEL_BACKEND 에 따라 진짜 / 가짜 / 기록·재생."""
+    if VEO_MODEL_BACKEND == "fake":
+        return _fake(prompt, model)
+    if VEO_MODEL_BACKEND == "cassette":
+        return _cassette_call(prompt, model, live)
+    return live(prompt, model)